@@ -112,6 +112,39 @@ DATABASES = {
     }
 }
 
+# Cache
+# https://docs.djangoproject.com/en/6.0/topics/cache/
+# Memória local por processo: funciona offline, sem serviço externo.
+# Em produção com vários workers, trocar por FileBasedCache/Redis mantendo a mesma API.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'amazonia-marketing',
+    },
+    # Vitrine (catalogo.py): a versão do catálogo precisa ser vista por todos os
+    # processos (web, run_worker, comandos), senão uma invalidação feita no
+    # worker não chega aos servidores web. Em produção, prefira Redis/Memcached.
+    'vitrine': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache', 'vitrine'),
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+    # Resumo do painel do produtor (estatisticas.py): versão por produtor
+    # invalidada por signals em qualquer processo, então também compartilhado
+    'resumos': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache', 'resumos'),
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+    # Consultas de CNPJ (cnpj.py): em arquivo para sobreviver a reinícios
+    # e ser compartilhado entre os processos da mesma máquina
+    'cnpj': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache', 'cnpj'),
+        'OPTIONS': {'MAX_ENTRIES': 100000},
+    },
+}
+
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
 
@@ -157,6 +190,18 @@ MEDIA_URL = '/media/'
 # Endereço físico do meu computador - > fotos serão guardadas na pasta media
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Vitrine pública: quantidade de produtos por página (paginação por cursor)
+VITRINE_ITENS_POR_PAGINA = 24
+
+# Tempo máximo (segundos) de uma página da vitrine no cache.
+# A invalidação real é feita por signals a cada alteração de produto/certificação.
+VITRINE_CACHE_TIMEOUT = 60 * 15
+VITRINE_CACHE_ALIAS = 'vitrine'
+
+# Resumo do painel do produtor no cache (também invalidado por signals)
+RESUMO_PRODUTOR_CACHE_TIMEOUT = 60 * 10
+RESUMO_PRODUTOR_CACHE_ALIAS = 'resumos'
+
 # Configurações de Upload de Arquivos
 FILE_UPLOAD_MAX_MEMORY_SIZE = 5242880  # 5MB em bytes
 
@@ -172,6 +217,51 @@ ALLOWED_UPLOAD_MIME_TYPES = [
     'image/png',
 ]
 
+# Upload em partes (retomável) de documentos de certificação (ver uploads.py)
+UPLOAD_PARTE_TAMANHO = 1024 * 1024  # 1MB por parte
+UPLOAD_DOCUMENTO_MAX_SIZE = 50 * 1024 * 1024  # 50MB por documento
+UPLOAD_SESSAO_VALIDADE = 60 * 60 * 24  # segundos sem receber partes até a sessão ser descartada
+
+# Fila de tarefas em segundo plano, no próprio banco (ver tarefas.py)
+# Worker: python manage.py run_worker
+TAREFAS_SINCRONAS = False  # True: executa logo após o commit, na própria requisição (sem worker)
+TAREFAS_WORKERS = 4  # threads por processo de worker
+TAREFAS_MAX_TENTATIVAS = 5
+TAREFAS_BACKOFF_BASE = 10  # segundos; dobra a cada nova tentativa
+TAREFAS_BACKOFF_MAXIMO = 60 * 60
+TAREFAS_TEMPO_LIMITE = 60 * 30  # tarefa 'executando' há mais tempo que isso volta para a fila
+TAREFAS_RETENCAO_DIAS = 7  # tarefas concluídas são apagadas depois disso
+
+# Armazenamento do carrinho (ver carrinho.py)
+# CarrinhoBanco: tabelas Carrinho/ItemCarrinho; CarrinhoSessao: na sessão, gravado só no checkout
+# (combine com SESSION_ENGINE em cache ou signed_cookies para não escrever no banco)
+CARRINHO_BACKEND = 'plataforma_certificacao.carrinho.CarrinhoBanco'
+
+# Reservas de estoque do checkout (ver estoque.py)
+# Vencidas são liberadas por: python manage.py liberar_reservas
+ESTOQUE_RESERVA_VALIDADE = 60 * 60  # segundos para pagar o pedido antes de as unidades voltarem ao estoque
+# (a sessão de pagamento do Stripe só abre com 30 min ou mais de reserva: mantenha acima disso)
+
+# Eventos do webhook do Stripe: gravados na chegada e aplicados pelo worker (ver payments/eventos.py)
+STRIPE_EVENTOS_MAX_TENTATIVAS = 8  # falhas até o evento ficar com status 'erro'
+
+# Consulta de CNPJ na ReceitaWS (ver cnpj.py)
+CNPJ_API_URL = 'https://receitaws.com.br/v1/cnpj/{cnpj}'
+CNPJ_API_TIMEOUT = 10  # segundos (leitura da resposta)
+CNPJ_API_TIMEOUT_CONEXAO = 3  # segundos para abrir a conexão
+CNPJ_API_CONEXOES = 10  # conexões keep-alive mantidas no pool da sessão
+CNPJ_API_CONEXOES_ASYNC = 100  # conexões simultâneas do cliente assíncrono (ASGI)
+CNPJ_CACHE_ALIAS = 'cnpj'
+CNPJ_CACHE_TTL_ENCONTRADO = 60 * 60 * 24 * 7  # 7 dias
+CNPJ_CACHE_TTL_NAO_ENCONTRADO = 60 * 60  # 1 hora: pode ser um CNPJ recém-aberto
+CNPJ_DISJUNTOR_FALHAS = 5  # falhas seguidas da API até suspender as consultas
+CNPJ_DISJUNTOR_ESPERA = 60  # segundos com as consultas suspensas antes de testar de novo
+CNPJ_MODO_DEGRADADO = True  # API fora: aceita CNPJ com dígitos válidos e verifica depois (fila)
+CNPJ_VERIFICACAO_ATRASO = 60 * 5  # segundos até a primeira verificação adiada
+# Verificação em lote (manage.py verificar_cnpjs)
+CNPJ_CONSULTA = 'plataforma_certificacao.cnpj.consultar_cnpj'  # troque por um stub para testar sem a API
+CNPJ_API_POR_MINUTO = 3  # limite da API pública da ReceitaWS
+
 # ============================================
 # Configuração de Autenticação Customizada
 # ============================================
@@ -1,5 +1,6 @@
 from django.contrib import admin
-from .models import Pagamento
+from .eventos import reprocessar
+from .models import EventoStripe, Pagamento
 
 @admin.register(Pagamento)
 class PagamentoAdmin(admin.ModelAdmin):
@@ -27,3 +28,19 @@ class PagamentoAdmin(admin.ModelAdmin):
     def has_delete_permission(self, request):
         return False
 
+
+@admin.register(EventoStripe)
+class EventoStripeAdmin(admin.ModelAdmin):
+    list_display = ('pk', 'event_id', 'tipo', 'pedido_id', 'status', 'tentativas', 'criado_stripe', 'processado_em')
+    list_filter = ('status', 'tipo')
+    search_fields = ('event_id', 'pedido_id', 'ultimo_erro')
+    readonly_fields = (
+        'event_id', 'tipo', 'pedido_id', 'criado_stripe', 'payload', 'tentativas', 'ultimo_erro',
+        'recebido_em', 'processado_em',
+    )
+    actions = ['reprocessar_eventos']
+
+    @admin.action(description='Reprocessar eventos com erro ou ignorados')
+    def reprocessar_eventos(self, request, queryset):
+        quantidade = reprocessar(queryset)
+        self.message_user(request, f'{quantidade} evento(s) devolvido(s) à fila.')
@@ -0,0 +1,193 @@
+"""
+Eventos do webhook do Stripe: gravados na chegada, processados pela fila.
+
+O webhook (views.webhook_stripe) só confere a assinatura, grava o evento
+(EventoStripe, event_id único) e responde 200. Nenhuma consulta a pedido ou
+pagamento na requisição: a resposta tem tempo constante e picos de eventos
+não prendem os workers web. Reenvio do Stripe com o mesmo event_id não é
+gravado nem processado de novo.
+
+O processamento roda no worker (python manage.py run_worker), na tarefa
+'stripe.processar_eventos':
+- eventos do mesmo pedido são aplicados em ordem (criado_stripe, pk);
+  falhou um, os seguintes do pedido esperam a nova tentativa dele;
+- cada evento é aplicado numa transação: o status só vira 'processado'
+  junto com as alterações do pedido/pagamento;
+- pagamento aprovado depois do vencimento da reserva, com o estoque já
+  vendido: o pedido é cancelado e o Pagamento fica 'estorno_pendente'
+  (Django Admin, filtro por status);
+- pedido ou pagamento inexistente: o evento fica 'ignorado' (antes a view
+  respondia 404 e o Stripe reenviava);
+- depois de STRIPE_EVENTOS_MAX_TENTATIVAS falhas o evento vira 'erro' e
+  deixa de segurar os seguintes. Django Admin: ação "Reprocessar".
+"""
+
+import logging
+import traceback
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from plataforma_certificacao import estoque
+from plataforma_certificacao.models import Pedido
+from plataforma_certificacao.tarefas import enfileirar, tarefa
+
+from .models import EventoStripe, Pagamento
+
+
+logger = logging.getLogger(__name__)
+
+
+def _pedido_do_evento(dados):
+    pedido_id = (dados['data']['object'].get('metadata') or {}).get('pedido_id')
+    return int(pedido_id) if str(pedido_id or '').isdigit() else None
+
+
+def _agendar(evento):
+    enfileirar(
+        'stripe.processar_eventos', evento.pedido_id, evento.pk,
+        max_tentativas=settings.STRIPE_EVENTOS_MAX_TENTATIVAS,
+    )
+
+
+def registrar(dados):
+    """
+    Grava o evento (payload já verificado, como dict) e agenda o processamento.
+    Retorna (evento, criado); criado=False para evento já recebido.
+    """
+    with transaction.atomic():
+        evento, criado = EventoStripe.objects.get_or_create(
+            event_id=dados['id'],
+            defaults={
+                'tipo': dados['type'],
+                'pedido_id': _pedido_do_evento(dados),
+                'criado_stripe': datetime.fromtimestamp(dados['created'], tz=dt_timezone.utc),
+                'payload': dados,
+            },
+        )
+        if criado:
+            _agendar(evento)
+    return evento, criado
+
+
+def reprocessar(eventos):
+    """Devolve eventos com erro (ou ignorados) para a fila, com as tentativas zeradas."""
+    reprocessados = 0
+    with transaction.atomic():
+        for evento in eventos.exclude(status__in=['pendente', 'processado']):
+            EventoStripe.objects.filter(pk=evento.pk).update(status='pendente', tentativas=0, ultimo_erro='')
+            _agendar(evento)
+            reprocessados += 1
+    return reprocessados
+
+
+# ============================================================================
+# PROCESSAMENTO
+# ============================================================================
+
+def _checkout_concluido(sessao):
+    pedido = Pedido.objects.filter(pk=sessao['metadata'].get('pedido_id')).first()
+    pagamento = Pagamento.objects.filter(pedido=pedido).first() if pedido else None
+    if pagamento is None:
+        return False
+
+    pagamento.stripe_payment_intent_id = sessao.get('payment_intent')
+    pagamento.data_pagamento = timezone.now()
+    pagamento.detalhes_resposta = sessao
+
+    # Unidades reservadas no checkout passam a ser definitivas. Reserva já
+    # vencida e estoque vendido a outro pedido: o pedido não é pago (sem venda
+    # acima do estoque) e o pagamento fica para estorno.
+    if not estoque.confirmar(pedido):
+        pagamento.status = 'estorno_pendente'
+        pagamento.save()
+        Pedido.objects.filter(pk=pedido.pk).update(status='cancelado')
+        logger.warning(
+            'Pagamento %s do pedido %s aprovado sem estoque (reserva vencida): estorno pendente.',
+            pagamento.pk, pedido.pk,
+        )
+        return True
+
+    pagamento.status = 'aprovado'
+    pagamento.save()
+
+    pedido.status = 'pago'
+    pedido.data_pagamento = timezone.now()
+    pedido.save()
+    return True
+
+
+def _checkout_expirado(sessao):
+    # Sessão de pagamento abandonada: devolve as unidades reservadas
+    pedido = Pedido.objects.filter(pk=sessao['metadata'].get('pedido_id')).first()
+    if pedido is None:
+        return False
+    estoque.cancelar_pedido(pedido)
+    return True
+
+
+def _cobranca_recusada(cobranca):
+    pagamento = Pagamento.objects.filter(stripe_payment_intent_id=cobranca['payment_intent']).first()
+    if pagamento is None:
+        return False
+    pagamento.status = 'rejeitado'
+    pagamento.detalhes_resposta = cobranca
+    pagamento.save()
+    return True
+
+
+TRATADORES = {
+    'checkout.session.completed': _checkout_concluido,
+    'checkout.session.expired': _checkout_expirado,
+    'charge.failed': _cobranca_recusada,
+}
+
+
+def aplicar(evento):
+    """
+    Aplica um evento pendente numa transação. Retorna False se outro worker
+    já o aplicou. Exceção do tratador: nada é gravado e o evento segue pendente.
+    """
+    with transaction.atomic():
+        # Só quem muda o status de 'pendente' aplica o evento (trava a linha até o commit)
+        if not EventoStripe.objects.filter(pk=evento.pk, status='pendente').update(
+            status='processado', processado_em=timezone.now(),
+        ):
+            return False
+        tratador = TRATADORES.get(evento.tipo)
+        if tratador is None or not tratador(evento.payload['data']['object']):
+            EventoStripe.objects.filter(pk=evento.pk).update(status='ignorado')
+    return True
+
+
+@tarefa('stripe.processar_eventos')
+def processar_eventos(pedido_id, evento_id):
+    """
+    Aplica, em ordem, os eventos pendentes do pedido (ou só `evento_id`, se o
+    evento não é de um pedido). Falha de um evento interrompe os seguintes e
+    levanta a exceção para a fila tentar de novo; as tentativas do evento
+    contam só na tarefa agendada para ele.
+    """
+    if pedido_id is None:
+        pendentes = EventoStripe.objects.filter(pk=evento_id, status='pendente')
+    else:
+        pendentes = EventoStripe.objects.filter(pedido_id=pedido_id, status='pendente')
+
+    for evento in pendentes.order_by('criado_stripe', 'pk'):
+        try:
+            aplicar(evento)
+        except Exception:
+            if evento.pk != evento_id:
+                # Falha de um evento anterior conta só na tarefa dele
+                raise
+            tentativas = evento.tentativas + 1
+            esgotadas = tentativas >= settings.STRIPE_EVENTOS_MAX_TENTATIVAS
+            EventoStripe.objects.filter(pk=evento.pk, status='pendente').update(
+                tentativas=tentativas,
+                ultimo_erro=traceback.format_exc(),
+                status='erro' if esgotadas else 'pendente',
+            )
+            if not esgotadas:
+                raise
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.10 on 2026-10-18 02:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EventoStripe',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('event_id', models.CharField(max_length=255, unique=True, verbose_name='ID do Evento')),
+                ('tipo', models.CharField(max_length=100, verbose_name='Tipo')),
+                ('pedido_id', models.PositiveIntegerField(blank=True, db_index=True, null=True, verbose_name='Pedido')),
+                ('criado_stripe', models.DateTimeField(verbose_name='Criado no Stripe')),
+                ('payload', models.JSONField(default=dict, verbose_name='Payload')),
+                ('status', models.CharField(choices=[('pendente', 'Pendente'), ('processado', 'Processado'), ('ignorado', 'Ignorado'), ('erro', 'Erro (tentativas esgotadas)')], default='pendente', max_length=20)),
+                ('tentativas', models.PositiveIntegerField(default=0)),
+                ('ultimo_erro', models.TextField(blank=True)),
+                ('recebido_em', models.DateTimeField(auto_now_add=True)),
+                ('processado_em', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Evento do Stripe',
+                'verbose_name_plural': 'Eventos do Stripe',
+                'ordering': ['criado_stripe', 'pk'],
+                'indexes': [models.Index(fields=['status', 'criado_stripe'], name='payments_ev_status_a19a28_idx')],
+            },
+        ),
+    ]
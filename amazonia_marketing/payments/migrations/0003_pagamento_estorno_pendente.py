@@ -0,0 +1,18 @@
+# Generated by Django 5.2.10 on 2026-10-18 02:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0002_eventostripe'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='pagamento',
+            name='status',
+            field=models.CharField(choices=[('pendente', 'Pendente'), ('processando', 'Processando'), ('aprovado', 'Aprovado'), ('rejeitado', 'Rejeitado'), ('cancelado', 'Cancelado'), ('estorno_pendente', 'Estorno pendente (sem estoque)')], default='pendente', max_length=20),
+        ),
+    ]
@@ -9,6 +9,7 @@ class Pagamento(models.Model):
         ('aprovado', 'Aprovado'),
         ('rejeitado', 'Rejeitado'),
         ('cancelado', 'Cancelado'),
+        ('estorno_pendente', 'Estorno pendente (sem estoque)'),
     )
     
     METODO_CHOICES = (
@@ -41,3 +42,40 @@ class Pagamento(models.Model):
     
     def __str__(self):
         return f'Pagamento {self.pk} - Pedido {self.pedido.pk} - {self.status}'
+
+
+class EventoStripe(models.Model):
+    """
+    Evento recebido pelo webhook do Stripe, gravado antes de qualquer processamento
+    (ver payments/eventos.py). event_id único: reenvios do Stripe não são reprocessados.
+    """
+    STATUS_CHOICES = (
+        ('pendente', 'Pendente'),
+        ('processado', 'Processado'),
+        ('ignorado', 'Ignorado'),
+        ('erro', 'Erro (tentativas esgotadas)'),
+    )
+
+    event_id = models.CharField(max_length=255, unique=True, verbose_name='ID do Evento')
+    tipo = models.CharField(max_length=100, verbose_name='Tipo')
+    pedido_id = models.PositiveIntegerField(blank=True, null=True, db_index=True, verbose_name='Pedido')
+    criado_stripe = models.DateTimeField(verbose_name='Criado no Stripe')
+    payload = models.JSONField(default=dict, verbose_name='Payload')
+
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pendente')
+    tentativas = models.PositiveIntegerField(default=0)
+    ultimo_erro = models.TextField(blank=True)
+
+    recebido_em = models.DateTimeField(auto_now_add=True)
+    processado_em = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        ordering = ['criado_stripe', 'pk']
+        verbose_name = 'Evento do Stripe'
+        verbose_name_plural = 'Eventos do Stripe'
+        indexes = [
+            models.Index(fields=['status', 'criado_stripe']),
+        ]
+
+    def __str__(self):
+        return f'{self.tipo} {self.event_id} - {self.status}'
@@ -1,3 +1,148 @@
+import json
+import time
+from datetime import timedelta
+from unittest import mock
+
 from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from plataforma_certificacao.models import Pedido, Produtos, ReservaEstoque, Tarefa, UsuarioBase
+from plataforma_certificacao.tarefas import processar_disponiveis
+
+from . import eventos
+from .models import EventoStripe, Pagamento
+
+
+def evento_stripe(event_id, tipo, objeto, criado=None):
+    return {
+        'id': event_id,
+        'type': tipo,
+        'created': criado or int(time.time()),
+        'data': {'object': objeto},
+    }
+
+
+@mock.patch('payments.views.stripe.Webhook.construct_event')
+class WebhookStripeTest(TestCase):
+    """O webhook só grava o evento; o worker aplica em ordem, uma vez por event_id."""
+
+    @classmethod
+    def setUpTestData(cls):
+        usuario = UsuarioBase.objects.create_user(
+            email='empresa@teste.com', password='senha-forte-123', nome='Empresa', tipo='empresa',
+        )
+        cls.pedido = Pedido.objects.create(
+            usuario=usuario, total='10.00', status='pendente',
+            endereco_entrega='Rua A, 1', cidade_entrega='Belém', estado_entrega='PA',
+            cep_entrega='66000-000', telefone_contato='(91) 99999-9999',
+        )
+        Pagamento.objects.create(pedido=cls.pedido, usuario=usuario, valor='10.00', stripe_session_id='cs_1')
+
+    def enviar(self, dados):
+        return self.client.post(
+            reverse('payments:webhook_stripe'), json.dumps(dados), content_type='application/json',
+            HTTP_STRIPE_SIGNATURE='assinatura',
+        )
+
+    def concluido(self, event_id, pedido_id, criado=None):
+        return evento_stripe(event_id, 'checkout.session.completed', {
+            'id': 'cs_1', 'payment_intent': 'pi_1', 'metadata': {'pedido_id': str(pedido_id)},
+        }, criado)
+
+    def test_evento_repetido_e_gravado_e_processado_uma_vez(self, _verificar):
+        for _ in range(3):
+            self.assertEqual(self.enviar(self.concluido('evt_1', self.pedido.pk)).status_code, 200)
+        self.assertEqual(EventoStripe.objects.count(), 1)
+        self.assertEqual(Tarefa.objects.count(), 1)
+        self.pedido.refresh_from_db()
+        self.assertEqual(self.pedido.status, 'pendente')  # nada aplicado na requisição
+
+        processar_disponiveis('teste')
+        self.pedido.refresh_from_db()
+        self.assertEqual(self.pedido.status, 'pago')
+        self.assertEqual(EventoStripe.objects.get().status, 'processado')
+
+    def test_pedido_inexistente_responde_200_e_ignora(self, _verificar):
+        self.assertEqual(self.enviar(self.concluido('evt_1', 999999)).status_code, 200)
+        processar_disponiveis('teste')
+        self.assertEqual(EventoStripe.objects.get().status, 'ignorado')
+
+    def test_falha_segura_os_eventos_seguintes_do_pedido(self, _verificar):
+        agora = int(time.time())
+        self.enviar(self.concluido('evt_1', self.pedido.pk, agora))
+        self.enviar(evento_stripe('evt_2', 'checkout.session.expired', {
+            'id': 'cs_1', 'metadata': {'pedido_id': str(self.pedido.pk)},
+        }, agora + 1))
+
+        with mock.patch.dict(eventos.TRATADORES, {'checkout.session.completed': mock.Mock(side_effect=RuntimeError)}):
+            processar_disponiveis('teste')
+        self.assertEqual(
+            list(EventoStripe.objects.values_list('event_id', 'status', 'tentativas')),
+            [('evt_1', 'pendente', 1), ('evt_2', 'pendente', 0)],
+        )
+
+        Tarefa.objects.update(executar_em=timezone.now())  # vence a espera da nova tentativa
+        processar_disponiveis('teste')
+        self.assertEqual(set(EventoStripe.objects.values_list('status', flat=True)), {'processado'})
+        self.pedido.refresh_from_db()
+        self.assertEqual(self.pedido.status, 'pago')  # expirada depois do pagamento não cancela
+
+    def test_pagamento_apos_reserva_vencida_sem_estoque_nao_vende(self, _verificar):
+        produtor = UsuarioBase.objects.create_user(
+            email='produtor@teste.com', password='senha-forte-123', nome='Produtor', tipo='produtor',
+        )
+        produto = Produtos.objects.create(
+            nome='Produto', preco='10.00', status_estoque='disponivel', quantidade_estoque=0, usuario=produtor,
+        )
+        # liberar_reservas já cancelou o pedido; a unidade devolvida foi vendida a outro comprador
+        Pedido.objects.filter(pk=self.pedido.pk).update(status='cancelado')
+        ReservaEstoque.objects.create(
+            pedido=self.pedido, produto=produto, quantidade=1, status='liberada', expira_em=timezone.now(),
+        )
+
+        with self.assertLogs('payments.eventos', 'WARNING'):
+            self.enviar(self.concluido('evt_1', self.pedido.pk))
+            processar_disponiveis('teste')
+        self.pedido.refresh_from_db()
+        produto.refresh_from_db()
+        self.assertEqual(self.pedido.status, 'cancelado')
+        self.assertEqual(Pagamento.objects.get(pedido=self.pedido).status, 'estorno_pendente')
+        self.assertEqual(produto.quantidade_estoque, 0)
+        self.assertEqual(EventoStripe.objects.get().status, 'processado')
+
+
+class CriarSessaoPagamentoTest(TestCase):
+    """A sessão do Stripe nunca dura mais que a reserva de estoque do pedido."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = UsuarioBase.objects.create_user(
+            email='empresa@teste.com', password='senha-forte-123', nome='Empresa', tipo='empresa',
+        )
+        produto = Produtos.objects.create(
+            nome='Produto', preco='10.00', status_estoque='disponivel', quantidade_estoque=5, usuario=cls.usuario,
+        )
+        cls.pedido = Pedido.objects.create(
+            usuario=cls.usuario, total='10.00', status='pendente',
+            endereco_entrega='Rua A, 1', cidade_entrega='Belém', estado_entrega='PA',
+            cep_entrega='66000-000', telefone_contato='(91) 99999-9999',
+        )
+        cls.reserva = ReservaEstoque.objects.create(
+            pedido=cls.pedido, produto=produto, quantidade=1, expira_em=timezone.now(),
+        )
+
+    @mock.patch('payments.views.stripe.checkout.Session.create')
+    def test_nao_abre_sessao_com_menos_de_30_minutos_de_reserva(self, criar_sessao):
+        criar_sessao.return_value = mock.Mock(id='cs_1', url='https://checkout.stripe.com/cs_1')
+        self.client.force_login(self.usuario)
+        url = reverse('payments:criar_sessao', args=[self.pedido.pk])
+
+        ReservaEstoque.objects.filter(pk=self.reserva.pk).update(expira_em=timezone.now() + timedelta(minutes=20))
+        self.assertRedirects(self.client.get(url), reverse('ver_carrinho'), fetch_redirect_response=False)
+        criar_sessao.assert_not_called()
 
-# Create your tests here.
+        expira_em = timezone.now() + timedelta(minutes=50)
+        ReservaEstoque.objects.filter(pk=self.reserva.pk).update(expira_em=expira_em)
+        self.client.get(url)
+        self.assertEqual(criar_sessao.call_args.kwargs['expires_at'], int(expira_em.timestamp()))
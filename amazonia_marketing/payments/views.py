@@ -1,3 +1,5 @@
+from datetime import timedelta
+
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.http import JsonResponse
@@ -5,14 +7,19 @@ from django.views.decorators.csrf import csrf_exempt
 from django.utils import timezone
 from django.conf import settings
 from django.contrib import messages
+from django.db.models import Min
 import stripe
 import json
 
 from plataforma_certificacao.models import Pedido, ItemPedido
+from . import eventos
 from .models import Pagamento
 
 stripe.api_key = settings.STRIPE_SECRET_KEY
 
+# Menor validade de sessão de checkout aceita pelo Stripe (expires_at)
+PRAZO_MINIMO_SESSAO = timedelta(minutes=30)
+
 
 @login_required(login_url='login')
 def criar_sessao_pagamento(request, pedido_id):
@@ -21,6 +28,26 @@ def criar_sessao_pagamento(request, pedido_id):
     """
     pedido = get_object_or_404(Pedido, pk=pedido_id, usuario=request.user)
     
+    if pedido.status == 'cancelado':
+        # Reservas de estoque já liberadas (prazo de pagamento vencido)
+        messages.error(request, 'Este pedido expirou sem pagamento. Faça um novo pedido.')
+        return redirect('ver_carrinho')
+    
+    # A sessão do Stripe expira junto com a reserva de estoque. O Stripe exige
+    # no mínimo 30 min: com menos que isso a sessão duraria mais que a reserva
+    # (pagamento de unidades já devolvidas), então não abre uma sessão nova.
+    opcoes_sessao = {}
+    reserva_expira_em = pedido.reservas.filter(status='ativa').aggregate(primeira=Min('expira_em'))['primeira']
+    if reserva_expira_em:
+        if reserva_expira_em - timezone.now() < PRAZO_MINIMO_SESSAO:
+            messages.error(
+                request,
+                'A reserva deste pedido vence em menos de 30 minutos e não é possível abrir um novo pagamento. '
+                'Conclua o pagamento já iniciado ou faça um novo pedido depois do vencimento.',
+            )
+            return redirect('ver_carrinho')
+        opcoes_sessao['expires_at'] = int(reserva_expira_em.timestamp())
+    
     try:
         itens = ItemPedido.objects.filter(pedido=pedido)
         
@@ -47,8 +74,9 @@ def criar_sessao_pagamento(request, pedido_id):
             customer_email=request.user.email,
             metadata={
                 'pedido_id': pedido_id,
-                'usuario_id': request.user.id,
-            }
+                'usuario_id': request.user.pk,
+            },
+            **opcoes_sessao,
         )
         
         pagamento, created = Pagamento.objects.get_or_create(
@@ -104,13 +132,14 @@ def pagamento_cancelado(request, pedido_id):
 @csrf_exempt
 def webhook_stripe(request):
     """
-    Webhook para receber eventos de pagamento do Stripe
+    Webhook para receber eventos de pagamento do Stripe.
+    Confere a assinatura, grava o evento e responde 200 na hora (ver eventos.py).
     """
     payload = request.body
     sig_header = request.META.get('HTTP_STRIPE_SIGNATURE')
     
     try:
-        event = stripe.Webhook.construct_event(
+        stripe.Webhook.construct_event(
             payload, sig_header, settings.STRIPE_WEBHOOK_SECRET
         )
     except ValueError:
@@ -118,39 +147,8 @@ def webhook_stripe(request):
     except stripe.error.SignatureVerificationError:
         return JsonResponse({'error': 'Invalid signature'}, status=400)
     
-    # Processar eventos de pagamento
-    if event['type'] == 'checkout.session.completed':
-        session = event['data']['object']
-        pedido_id = session['metadata'].get('pedido_id')
-        
-        try:
-            pedido = Pedido.objects.get(pk=pedido_id)
-            pagamento = Pagamento.objects.get(pedido=pedido)
-            
-            pagamento.status = 'aprovado'
-            pagamento.stripe_payment_intent_id = session.get('payment_intent')
-            pagamento.data_pagamento = timezone.now()
-            pagamento.detalhes_resposta = session
-            pagamento.save()
-            
-            pedido.status = 'pago'
-            pedido.data_pagamento = timezone.now()
-            pedido.save()
-            
-        except (Pedido.DoesNotExist, Pagamento.DoesNotExist):
-            return JsonResponse({'error': 'Order not found'}, status=404)
-    
-    elif event['type'] == 'charge.failed':
-        session = event['data']['object']
-        payment_intent_id = session['payment_intent']
-        
-        try:
-            pagamento = Pagamento.objects.get(stripe_payment_intent_id=payment_intent_id)
-            pagamento.status = 'rejeitado'
-            pagamento.detalhes_resposta = session
-            pagamento.save()
-        except Pagamento.DoesNotExist:
-            pass
+    # Só grava o evento; o worker aplica ao pedido/pagamento (eventos.py)
+    eventos.registrar(json.loads(payload))
     
     return JsonResponse({'status': 'success'}, status=200)
 
@@ -5,8 +5,10 @@ from django.utils.html import format_html
 from .models import (
     UsuarioBase, ProdutorProfile, EmpresaProfile, AdminAuditorProfile,
     Certificacoes, Produtos, Carrinho, ItemCarrinho, Pedido, ItemPedido,
-    Marketplace, UsuariosLegado
+    Marketplace, UsuariosLegado, Tarefa, ReservaEstoque
 )
+from .carrinho import anotar_totais
+from .tarefas import reenfileirar
 
 
 # ============================================================================
@@ -123,14 +125,14 @@ class CertificacoesAdmin(admin.ModelAdmin):
 
 @admin.register(Produtos)
 class ProdutosAdmin(admin.ModelAdmin):
-    list_display = ('nome', 'usuario', 'preco', 'status_estoque', 'data_criacao')
+    list_display = ('nome', 'usuario', 'preco', 'status_estoque', 'quantidade_estoque', 'data_criacao')
     list_filter = ('status_estoque', 'data_criacao')
     search_fields = ('nome', 'usuario__nome')
     readonly_fields = ('data_criacao', 'data_atualizacao')
     
     fieldsets = (
         ('Informações Básicas', {'fields': ('nome', 'descricao', 'usuario')}),
-        ('Preço e Estoque', {'fields': ('preco', 'status_estoque')}),
+        ('Preço e Estoque', {'fields': ('preco', 'status_estoque', 'quantidade_estoque')}),
         ('Imagem', {'fields': ('imagem',)}),
         ('Datas', {'fields': ('data_criacao', 'data_atualizacao')}),
     )
@@ -148,15 +150,26 @@ class ItemCarrinhoInline(admin.TabularInline):
 
 @admin.register(Carrinho)
 class CarrinhoAdmin(admin.ModelAdmin):
-    list_display = ('id', 'usuario', 'ativo', 'total_itens', 'data_atualizacao')
+    list_display = ('id', 'usuario', 'ativo', 'total_itens', 'valor_total', 'data_atualizacao')
     list_filter = ('ativo', 'data_criacao')
     search_fields = ('usuario__nome', 'usuario__email')
     readonly_fields = ('data_criacao', 'data_atualizacao')
+    list_select_related = ('usuario',)
     inlines = [ItemCarrinhoInline]
     
+    def get_queryset(self, request):
+        # Totais anotados na consulta da lista (sem uma consulta por carrinho)
+        return anotar_totais(super().get_queryset(request))
+    
     def total_itens(self, obj):
-        return obj.itens.count()
+        return obj.get_quantidade_itens()
     total_itens.short_description = 'Quantidade de Itens'
+    total_itens.admin_order_field = 'quantidade_itens_carrinho'
+    
+    def valor_total(self, obj):
+        return obj.get_total()
+    valor_total.short_description = 'Valor Total'
+    valor_total.admin_order_field = 'total_carrinho'
 
 
 class ItemPedidoInline(admin.TabularInline):
@@ -166,13 +179,24 @@ class ItemPedidoInline(admin.TabularInline):
     readonly_fields = ('preco_unitario',)
 
 
+class ReservaEstoqueInline(admin.TabularInline):
+    """Reservas de estoque do pedido (somente leitura: alteradas por estoque.py)"""
+    model = ReservaEstoque
+    extra = 0
+    can_delete = False
+    readonly_fields = ('produto', 'quantidade', 'status', 'expira_em', 'criada_em')
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+
 @admin.register(Pedido)
 class PedidoAdmin(admin.ModelAdmin):
     list_display = ('pk', 'usuario', 'data_pedido', 'total', 'status')
     list_filter = ('status', 'data_pedido')
     search_fields = ('usuario__nome', 'usuario__email')
     readonly_fields = ('data_pedido', 'id_transacao_pagamento')
-    inlines = [ItemPedidoInline]
+    inlines = [ItemPedidoInline, ReservaEstoqueInline]
     
     fieldsets = (
         ('Informações do Pedido', {'fields': ('usuario', 'status', 'total')}),
@@ -223,3 +247,20 @@ class UsuariosLegadoAdmin(admin.ModelAdmin):
         """Desabilita exclusão de usuários legado"""
         return False
 
+
+# ============================================================================
+# ADMIN PARA A FILA DE TAREFAS
+# ============================================================================
+
+@admin.register(Tarefa)
+class TarefaAdmin(admin.ModelAdmin):
+    list_display = ('id', 'nome', 'status', 'tentativas', 'max_tentativas', 'executar_em', 'concluida_em', 'worker')
+    list_filter = ('status', 'nome')
+    search_fields = ('nome', 'ultimo_erro')
+    readonly_fields = ('criada_em', 'iniciada_em', 'concluida_em', 'worker', 'tentativas', 'ultimo_erro')
+    actions = ['reenfileirar_mortas']
+
+    @admin.action(description='Reenfileirar tarefas mortas selecionadas')
+    def reenfileirar_mortas(self, request, queryset):
+        quantidade = reenfileirar(queryset)
+        self.message_user(request, f'{quantidade} tarefa(s) devolvida(s) à fila.')
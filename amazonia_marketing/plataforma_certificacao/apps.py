@@ -15,3 +15,8 @@ class PlataformaCertificacaoConfig(AppConfig):
                 Group.objects.get_or_create(name=nome)
 
         post_migrate.connect(criar_grupos, sender=self)
+
+        # Registra os receivers (cache da vitrine, índice de busca, facetas, etc.)
+        from . import signals  # noqa: F401
+        # Registra as tarefas da fila (para o run_worker encontrá-las)
+        from . import cnpj, imagens  # noqa: F401
@@ -0,0 +1,144 @@
+"""
+Armazenamento deduplicado (endereçado por conteúdo) dos documentos
+de certificações e empresas.
+
+Cada upload é gravado em uma pasta temporária enquanto o SHA-256 é calculado;
+o nome definitivo é o próprio hash (ex.: certificacoes/<sha256>.pdf). Se o mesmo
+conteúdo já existe, o temporário é descartado e nada novo é gravado: o mesmo
+PDF anexado a várias certificações ocupa o disco uma única vez.
+
+Cada arquivo tem uma linha em BlobDocumento com o número de referências:
+- +1 a cada gravação pelo storage (_save);
+- -1 quando a linha que apontava para ele é apagada ou troca de arquivo
+  (signals.py -> liberar_documento).
+Ao chegar a zero, o arquivo é removido do disco. Arquivos antigos (anteriores
+a este storage, sem linha em BlobDocumento) continuam funcionando e nunca
+são apagados por aqui.
+"""
+
+import hashlib
+import os
+import posixpath
+import tempfile
+
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.db.models import F
+
+
+PASTA_TEMPORARIA = 'tmp_uploads'
+TAMANHO_BLOCO = 64 * 1024
+
+
+class ArmazenamentoDeduplicado(FileSystemStorage):
+    """FileSystemStorage que grava cada conteúdo uma única vez, sob o seu hash."""
+
+    def get_available_name(self, name, max_length=None):
+        # O nome definitivo é o hash do conteúdo (ver _save): nunca gera sufixos
+        return name
+
+    def _gravar_temporario(self, content):
+        """Copia o conteúdo para a pasta temporária calculando o hash. Retorna (caminho, sha256)."""
+        pasta = self.path(PASTA_TEMPORARIA)
+        os.makedirs(pasta, exist_ok=True)
+        sha256 = hashlib.sha256()
+        descritor, caminho = tempfile.mkstemp(dir=pasta)
+        try:
+            with os.fdopen(descritor, 'wb') as destino:
+                for bloco in content.chunks(TAMANHO_BLOCO):
+                    sha256.update(bloco)
+                    destino.write(bloco)
+        except BaseException:
+            os.remove(caminho)
+            raise
+        return caminho, sha256.hexdigest()
+
+    def _save(self, name, content):
+        from .models import BlobDocumento
+
+        pasta, nome_original = posixpath.split(name)
+        extensao = os.path.splitext(nome_original)[1].lower()
+
+        # O mesmo arquivo enviado salvo em várias linhas (ex.: autodeclaração múltipla)
+        # não é relido: o hash fica guardado no próprio objeto do upload
+        temporario = None
+        sha256 = getattr(content, '_sha256_armazenamento', None)
+        if sha256 is None:
+            temporario, sha256 = self._gravar_temporario(content)
+
+        nome_final = posixpath.join(pasta, sha256 + extensao)
+        try:
+            with transaction.atomic():
+                blob, criado = BlobDocumento.objects.select_for_update().get_or_create(
+                    nome=nome_final,
+                    defaults={'sha256': sha256, 'tamanho': content.size},
+                )
+                # Linha nova: grava mesmo que o arquivo exista (pode ser um blob
+                # recém-liberado cuja remoção do disco ainda está pendente)
+                if criado or not self.exists(nome_final):
+                    if temporario is None:
+                        temporario, _ = self._gravar_temporario(content)
+                    caminho_final = self.path(nome_final)
+                    os.makedirs(os.path.dirname(caminho_final), exist_ok=True)
+                    os.replace(temporario, caminho_final)
+                    temporario = None
+                    if self.file_permissions_mode is not None:
+                        os.chmod(caminho_final, self.file_permissions_mode)
+                BlobDocumento.objects.filter(pk=blob.pk).update(referencias=F('referencias') + 1)
+        finally:
+            if temporario is not None:
+                os.remove(temporario)
+
+        content._sha256_armazenamento = sha256
+        return nome_final
+
+    def delete(self, name):
+        """
+        Blob ainda referenciado não é apagado (as referências são liberadas
+        pelos signals quando a linha muda ou é excluída).
+        """
+        if documento_em_uso(name):
+            return
+        super().delete(name)
+
+
+armazenamento = ArmazenamentoDeduplicado()
+
+
+def armazenamento_documentos():
+    """Storage dos FileFields de documentos (callable: as migrations guardam só a referência)."""
+    return armazenamento
+
+
+def documento_em_uso(nome):
+    """True se o arquivo ainda tem referências contadas em BlobDocumento."""
+    from .models import BlobDocumento
+
+    return BlobDocumento.objects.filter(nome=nome, referencias__gt=0).exists()
+
+
+def liberar_documento(nome):
+    """Remove uma referência ao arquivo; apaga-o do disco quando não sobra nenhuma."""
+    from .models import BlobDocumento
+
+    if not nome:
+        return
+    with transaction.atomic():
+        blob = BlobDocumento.objects.select_for_update().filter(nome=nome).first()
+        if blob is None:
+            # Arquivo anterior ao armazenamento deduplicado: não é contado
+            return
+        if blob.referencias > 1:
+            BlobDocumento.objects.filter(pk=blob.pk).update(referencias=F('referencias') - 1)
+            return
+        blob.delete()
+        transaction.on_commit(lambda: _apagar_se_sem_referencias(nome))
+
+
+def _apagar_se_sem_referencias(nome):
+    from .models import BlobDocumento
+
+    # Um novo upload do mesmo conteúdo pode ter recriado o blob depois do commit
+    if not BlobDocumento.objects.filter(nome=nome).exists():
+        FileSystemStorage.delete(armazenamento, nome)
+
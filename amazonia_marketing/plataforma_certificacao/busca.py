@@ -0,0 +1,230 @@
+"""
+Busca de produtos do marketplace.
+Índice invertido próprio (tabela IndiceBusca), sem serviço externo: funciona em SQLite e MySQL.
+
+Indexa nome, descrição, cidade/estado do produtor e o status de certificação.
+Os termos são normalizados para português: minúsculos, sem acento e sem stopwords,
+então "Açaí do Pará" encontra "acai para". Todos os termos da busca usam
+casamento por prefixo ("casta" encontra "castanha"), com bônus para o termo exato.
+"""
+
+import re
+import unicodedata
+
+from django.db import transaction
+from django.db.models import Case, Exists, F, FloatField, IntegerField, Max, OuterRef, Q, Sum, Value, When
+
+from .models import Produtos, Certificacoes, ProdutorProfile, IndiceBusca
+
+
+# Peso de cada campo na relevância do resultado
+PESOS = {
+    'nome': 5.0,
+    'certificacao': 2.0,
+    'localizacao': 2.0,
+    'descricao': 1.0,
+}
+
+# Termo exato vale mais que um termo que apenas começa com o texto buscado
+BONUS_EXATO = 1.0
+FATOR_PREFIXO = 0.5
+
+LIMITE_RESULTADOS = 48
+TAMANHO_MAXIMO_TERMO = 60
+
+# "para" fica de fora de propósito: sem acento ele também é o estado do Pará
+STOPWORDS = {
+    'a', 'ao', 'aos', 'as', 'com', 'da', 'das', 'de', 'do', 'dos', 'e', 'em',
+    'na', 'nas', 'no', 'nos', 'o', 'os', 'ou', 'pela', 'pelo', 'por',
+    'que', 'se', 'sem', 'um', 'uma', 'uns', 'umas',
+}
+
+# Permite buscar pelo nome do estado além da sigla (ex.: "para" ou "pa")
+NOMES_ESTADOS = {
+    'AC': 'Acre', 'AL': 'Alagoas', 'AP': 'Amapá', 'AM': 'Amazonas', 'BA': 'Bahia',
+    'CE': 'Ceará', 'DF': 'Distrito Federal', 'ES': 'Espírito Santo', 'GO': 'Goiás',
+    'MA': 'Maranhão', 'MT': 'Mato Grosso', 'MS': 'Mato Grosso do Sul',
+    'MG': 'Minas Gerais', 'PA': 'Pará', 'PB': 'Paraíba', 'PR': 'Paraná',
+    'PE': 'Pernambuco', 'PI': 'Piauí', 'RJ': 'Rio de Janeiro',
+    'RN': 'Rio Grande do Norte', 'RS': 'Rio Grande do Sul', 'RO': 'Rondônia',
+    'RR': 'Roraima', 'SC': 'Santa Catarina', 'SP': 'São Paulo', 'SE': 'Sergipe',
+    'TO': 'Tocantins',
+}
+
+# Termos adicionados a produtos com certificação aprovada
+TERMOS_CERTIFICADO = 'certificado selo'
+
+
+# ============================================================================
+# NORMALIZAÇÃO DE TEXTO
+# ============================================================================
+
+def normalizar(texto):
+    """Minúsculas e sem acentos: 'Açaí' -> 'acai'."""
+    decomposto = unicodedata.normalize('NFKD', str(texto or ''))
+    sem_acento = ''.join(c for c in decomposto if not unicodedata.combining(c))
+    return sem_acento.lower()
+
+
+def extrair_termos(texto):
+    """Lista de termos indexáveis de um texto (sem stopwords e sem duplicar)."""
+    termos = []
+    for termo in re.findall(r'[a-z0-9]+', normalizar(texto)):
+        if termo in STOPWORDS or len(termo) < 2:
+            continue
+        termo = termo[:TAMANHO_MAXIMO_TERMO]
+        if termo not in termos:
+            termos.append(termo)
+    return termos
+
+
+# ============================================================================
+# INDEXAÇÃO
+# ============================================================================
+
+def termos_do_produto(produto, perfil=None, certificado=False):
+    """Dicionário termo -> peso para um produto."""
+    campos = {
+        'nome': produto.nome,
+        'descricao': produto.descricao,
+        'certificacao': TERMOS_CERTIFICADO if certificado else '',
+        'localizacao': '',
+    }
+    if perfil:
+        estado = (perfil.estado or '').upper()
+        campos['localizacao'] = ' '.join(
+            filter(None, [perfil.cidade, estado, NOMES_ESTADOS.get(estado)])
+        )
+
+    pesos = {}
+    for campo, texto in campos.items():
+        for termo in extrair_termos(texto):
+            pesos[termo] = pesos.get(termo, 0) + PESOS[campo]
+    return pesos
+
+
+def indexar_produto(produto_id):
+    """(Re)indexa um produto. Se ele não existir mais, apenas remove seus termos."""
+    with transaction.atomic():
+        IndiceBusca.objects.filter(produto_id=produto_id).delete()
+
+        produto = (
+            Produtos.objects.filter(pk=produto_id)
+            .annotate(certificado=Exists(
+                Certificacoes.objects.filter(produto=OuterRef('pk'), status_certificacao='aprovado')
+            ))
+            .first()
+        )
+        if produto is None:
+            return 0
+
+        perfil = ProdutorProfile.objects.filter(usuario_id=produto.usuario_id).first()
+        termos = termos_do_produto(produto, perfil, produto.certificado)
+        IndiceBusca.objects.bulk_create([
+            IndiceBusca(termo=termo, produto_id=produto_id, peso=peso)
+            for termo, peso in termos.items()
+        ])
+        return len(termos)
+
+
+def indexar_produtos_do_usuario(usuario_id):
+    """Reindexa todos os produtos de um produtor (ex.: mudou cidade/estado)."""
+    for produto_id in Produtos.objects.filter(usuario_id=usuario_id).values_list('pk', flat=True):
+        indexar_produto(produto_id)
+
+
+def reindexar_todos(tamanho_lote=500, apps=None):
+    """
+    Reconstrói o índice inteiro, em lotes, sem carregar o catálogo na memória.
+    Retorna a quantidade de produtos indexados.
+    apps: registro de models históricos, quando chamada de uma migration.
+    """
+    if apps is None:
+        produtos, certificacoes, perfis_produtor, indice = Produtos, Certificacoes, ProdutorProfile, IndiceBusca
+    else:
+        produtos, certificacoes, perfis_produtor, indice = (
+            apps.get_model('plataforma_certificacao', nome)
+            for nome in ('Produtos', 'Certificacoes', 'ProdutorProfile', 'IndiceBusca')
+        )
+    certificados = certificacoes.objects.filter(produto=OuterRef('pk'), status_certificacao='aprovado')
+    consulta = (
+        produtos.objects.annotate(certificado=Exists(certificados))
+        .order_by('pk')
+    )
+
+    indice.objects.all().delete()
+    total = 0
+    ultimo_id = 0
+    while True:
+        lote = list(consulta.filter(pk__gt=ultimo_id)[:tamanho_lote])
+        if not lote:
+            break
+
+        perfis = perfis_produtor.objects.in_bulk(
+            {p.usuario_id for p in lote}, field_name='usuario_id'
+        )
+        entradas = []
+        for produto in lote:
+            termos = termos_do_produto(produto, perfis.get(produto.usuario_id), produto.certificado)
+            entradas.extend(
+                indice(termo=termo, produto_id=produto.pk, peso=peso)
+                for termo, peso in termos.items()
+            )
+        indice.objects.bulk_create(entradas, batch_size=1000)
+
+        total += len(lote)
+        ultimo_id = lote[-1].pk
+    return total
+
+
+# ============================================================================
+# CONSULTA
+# ============================================================================
+
+def buscar_produtos(consulta, limite=LIMITE_RESULTADOS, apenas_disponiveis=True):
+    """
+    Busca produtos pelo texto digitado, ordenados por relevância.
+    Todos os termos precisam casar (por prefixo) com algum campo do produto.
+    Retorna a lista de Produtos já anotada com tem_selo.
+    """
+    termos = extrair_termos(consulta)
+    if not termos:
+        return []
+
+    filtro = Q()
+    relevancia = []
+    presenca = {}
+    for i, termo in enumerate(termos):
+        casa = Q(termo__startswith=termo)
+        filtro |= casa
+        relevancia.append(Case(
+            When(termo=termo, then=Value(1.0 + BONUS_EXATO)),
+            When(casa, then=Value(FATOR_PREFIXO)),
+            default=Value(0.0),
+            output_field=FloatField(),
+        ))
+        presenca[f'casou_{i}'] = Max(Case(
+            When(casa, then=1), default=0, output_field=IntegerField(),
+        ))
+
+    pontuacao = relevancia[0]
+    for expressao in relevancia[1:]:
+        pontuacao = pontuacao + expressao
+
+    indice = IndiceBusca.objects.filter(filtro)
+    if apenas_disponiveis:
+        indice = indice.filter(Produtos.filtro_a_venda('produto__'))
+
+    ranking = (
+        indice.values('produto_id')
+        .annotate(relevancia=Sum(pontuacao * F('peso')), **presenca)
+        .filter(**{nome: 1 for nome in presenca})
+        .order_by('-relevancia', '-produto_id')
+    )
+
+    ids = [linha['produto_id'] for linha in ranking[:limite]]
+
+    selo_aprovado = Certificacoes.objects.filter(produto=OuterRef('pk'), status_certificacao='aprovado')
+    produtos = Produtos.objects.filter(pk__in=ids).annotate(tem_selo=Exists(selo_aprovado)).in_bulk()
+    return [produtos[i] for i in ids if i in produtos]
+
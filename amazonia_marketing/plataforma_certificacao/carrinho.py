@@ -0,0 +1,368 @@
+"""
+Carrinho de compras: armazenamento intercambiável e totais calculados pelo banco.
+
+As views de carrinho usam obter_carrinho(request), que devolve o backend
+definido em CARRINHO_BACKEND. Os dois backends têm a mesma interface
+(itens, adicionar, definir_quantidades, atualizar, remover, totais, persistir,
+esvaziar):
+
+- CarrinhoBanco: tabelas Carrinho/ItemCarrinho, cada alteração é gravada;
+- CarrinhoSessao: itens na sessão do usuário; nada é gravado em
+  Carrinho/ItemCarrinho até o checkout (persistir()). Com SESSION_ENGINE em
+  cache ou signed_cookies, montar o carrinho não escreve no banco.
+
+Pedidos B2B com muitas linhas: validar_linhas() confere todos os produtos numa
+consulta e definir_quantidades() grava tudo de uma vez (no banco, um único
+INSERT ... ON CONFLICT sobre o unique_together de ItemCarrinho).
+
+O checkout sempre fecha o pedido a partir das tabelas (pedidos.fazer_pedido):
+persistir() devolve o Carrinho ativo do usuário, já gravado.
+
+totais(carrinho) faz uma única consulta (aggregate) para o valor total e a
+quantidade de unidades e guarda o resultado na própria instância: ver_carrinho,
+checkout e os métodos Carrinho.get_total() / get_quantidade_itens() reutilizam
+o mesmo cálculo na requisição.
+
+Listagens (Django Admin) usam anotar_totais(queryset): os totais vêm na mesma
+consulta da lista e totais() os aproveita sem consultar de novo.
+"""
+
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import DecimalField, ExpressionWrapper, F, Sum
+from django.db.models.functions import Coalesce
+from django.utils.module_loading import import_string
+
+from .models import Carrinho, ItemCarrinho, Produtos
+
+
+_ZERO = Decimal('0.00')
+
+
+def _somas(prefixo=''):
+    return {
+        'total_carrinho': Coalesce(
+            Sum(ExpressionWrapper(
+                F(f'{prefixo}quantidade') * F(f'{prefixo}preco_unitario'),
+                output_field=DecimalField(max_digits=10, decimal_places=2),
+            )),
+            _ZERO,
+            output_field=DecimalField(max_digits=10, decimal_places=2),
+        ),
+        'quantidade_itens_carrinho': Coalesce(Sum(f'{prefixo}quantidade'), 0),
+    }
+
+
+def anotar_totais(carrinhos):
+    """Queryset de Carrinho com total_carrinho e quantidade_itens_carrinho anotados."""
+    return carrinhos.annotate(**_somas('itens__'))
+
+
+def totais(carrinho):
+    """{'total': Decimal, 'quantidade_itens': int} do carrinho, numa consulta (ou nenhuma, se já calculado)."""
+    if not hasattr(carrinho, 'total_carrinho'):
+        somas = carrinho.itens.aggregate(**_somas())
+        carrinho.total_carrinho = somas['total_carrinho']
+        carrinho.quantidade_itens_carrinho = somas['quantidade_itens_carrinho']
+    return {'total': carrinho.total_carrinho, 'quantidade_itens': carrinho.quantidade_itens_carrinho}
+
+
+# ============================================================================
+# BACKENDS DE ARMAZENAMENTO
+# ============================================================================
+
+class QuantidadeIndisponivel(Exception):
+    """Mais unidades do que o estoque controlado do produto (Produtos.quantidade_estoque)."""
+
+
+def _conferir_estoque(produto, quantidade):
+    if produto.quantidade_estoque is not None and quantidade > produto.quantidade_estoque:
+        raise QuantidadeIndisponivel(
+            f'Só há {produto.quantidade_estoque} unidade(s) de {produto.nome} em estoque.'
+        )
+
+
+# Linhas aceitas por requisição em carrinho_adicionar_varios
+MAXIMO_LINHAS_POR_LOTE = 500
+# Limites de cada linha: o id cabe em Produtos.id_produto (AutoField) e a
+# quantidade mantém quantidade x preço dentro do DecimalField dos totais
+MAXIMO_ID_PRODUTO = 2 ** 31 - 1
+MAXIMO_QUANTIDADE_POR_LINHA = 10_000
+
+
+def _inteiro(valor):
+    # Só inteiros do JSON: 1.9 não vira 1 e true não vira 1
+    return isinstance(valor, int) and not isinstance(valor, bool)
+
+
+def validar_linhas(pares):
+    """
+    Confere uma lista de (produto_id, quantidade) numa única consulta.
+    Retorna ({Produtos: quantidade}, erros). Produto repetido tem as quantidades somadas.
+    """
+    quantidades, erros = {}, []
+    for indice, par in enumerate(pares):
+        try:
+            produto_id, quantidade = par
+        except (TypeError, ValueError):
+            produto_id = quantidade = None
+        if not (_inteiro(produto_id) and _inteiro(quantidade)):
+            erros.append(f'Linha {indice + 1}: informe produto_id e quantidade inteiros.')
+            continue
+        if not 1 <= produto_id <= MAXIMO_ID_PRODUTO:
+            erros.append(f'Linha {indice + 1}: produto_id inválido.')
+            continue
+        if quantidade < 1:
+            erros.append(f'Linha {indice + 1}: quantidade deve ser maior que zero.')
+            continue
+        if quantidade > MAXIMO_QUANTIDADE_POR_LINHA:
+            erros.append(f'Linha {indice + 1}: no máximo {MAXIMO_QUANTIDADE_POR_LINHA} unidades por produto.')
+            continue
+        quantidades[produto_id] = quantidades.get(produto_id, 0) + quantidade
+
+    produtos = Produtos.objects.only(
+        'nome', 'preco', 'status_estoque', 'quantidade_estoque',
+    ).in_bulk(list(quantidades))
+    linhas = {}
+    for produto_id, quantidade in quantidades.items():
+        produto = produtos.get(produto_id)
+        if produto is None or not produto.a_venda:
+            erros.append(f'Produto {produto_id} não está disponível.')
+            continue
+        if quantidade > MAXIMO_QUANTIDADE_POR_LINHA:
+            # Linhas repetidas do mesmo produto somadas
+            erros.append(f'Produto {produto_id}: no máximo {MAXIMO_QUANTIDADE_POR_LINHA} unidades.')
+            continue
+        try:
+            _conferir_estoque(produto, quantidade)
+        except QuantidadeIndisponivel as e:
+            erros.append(str(e))
+            continue
+        linhas[produto] = quantidade
+    return linhas, erros
+
+
+def obter_carrinho(request):
+    """Carrinho do usuário logado no backend de CARRINHO_BACKEND."""
+    return import_string(settings.CARRINHO_BACKEND)(request)
+
+
+class CarrinhoBanco:
+    """Carrinho nas tabelas Carrinho/ItemCarrinho. Identificador do item: ItemCarrinho.pk."""
+
+    def __init__(self, request):
+        self.usuario = request.user
+        self._carrinho_ativo = None
+
+    def _carrinho(self, criar=False):
+        # Lido uma vez por requisição, já com os totais anotados: ver_carrinho
+        # faz só esta consulta e a dos itens
+        if self._carrinho_ativo is None:
+            self._carrinho_ativo = anotar_totais(
+                Carrinho.objects.filter(usuario=self.usuario, ativo=True)
+            ).first()
+        if self._carrinho_ativo is None and criar:
+            self._carrinho_ativo = Carrinho.objects.get_or_create(usuario=self.usuario, ativo=True)[0]
+        return self._carrinho_ativo
+
+    def _itens_alterados(self):
+        # Os totais guardados na instância deixam de valer (totais() recalcula)
+        if self._carrinho_ativo is not None:
+            for atributo in ('total_carrinho', 'quantidade_itens_carrinho'):
+                self._carrinho_ativo.__dict__.pop(atributo, None)
+
+    def _item(self, item_id):
+        return ItemCarrinho.objects.select_related('produto').filter(
+            pk=item_id, carrinho__usuario=self.usuario, carrinho__ativo=True,
+        ).first()
+
+    def itens(self):
+        carrinho = self._carrinho()
+        if carrinho is None:
+            return []
+        return list(carrinho.itens.select_related('produto').order_by('data_adicao', 'pk'))
+
+    def adicionar(self, produto, quantidade=1):
+        """Soma unidades do produto. Retorna (quantidade no carrinho, item novo?)."""
+        _conferir_estoque(produto, quantidade)
+        item, criado = ItemCarrinho.objects.get_or_create(
+            carrinho=self._carrinho(criar=True),
+            produto=produto,
+            defaults={'preco_unitario': produto.preco, 'quantidade': quantidade},
+        )
+        if not criado:
+            _conferir_estoque(produto, item.quantidade + quantidade)
+            item.quantidade += quantidade
+            item.save(update_fields=['quantidade'])
+        self._itens_alterados()
+        return item.quantidade, criado
+
+    def definir_quantidades(self, linhas):
+        """Grava {Produtos: quantidade} de uma vez: inclui os novos e substitui a quantidade dos existentes."""
+        carrinho = self._carrinho(criar=True)
+        opcoes = {'update_conflicts': True, 'update_fields': ['quantidade']}
+        # PostgreSQL/SQLite exigem o alvo do ON CONFLICT; MySQL (ON DUPLICATE KEY) não aceita
+        if connections[ItemCarrinho.objects.db].features.supports_update_conflicts_with_target:
+            opcoes['unique_fields'] = ['carrinho', 'produto']
+        ItemCarrinho.objects.bulk_create([
+            ItemCarrinho(carrinho=carrinho, produto=produto, quantidade=quantidade, preco_unitario=produto.preco)
+            for produto, quantidade in linhas.items()
+        ], **opcoes)
+        self._itens_alterados()
+
+    def atualizar(self, item_id, quantidade):
+        """Nova quantidade (0 remove). Retorna False se o item não é do usuário."""
+        item = self._item(item_id)
+        if item is None:
+            return False
+        if quantidade > 0:
+            _conferir_estoque(item.produto, quantidade)
+            item.quantidade = quantidade
+            item.save(update_fields=['quantidade'])
+        else:
+            item.delete()
+        self._itens_alterados()
+        return True
+
+    def remover(self, item_id):
+        """Remove o item. Retorna o nome do produto, ou None se o item não é do usuário."""
+        item = self._item(item_id)
+        if item is None:
+            return None
+        item.delete()
+        self._itens_alterados()
+        return item.produto.nome
+
+    def totais(self):
+        carrinho = self._carrinho()
+        if carrinho is None:
+            return {'total': _ZERO, 'quantidade_itens': 0}
+        return totais(carrinho)
+
+    def persistir(self):
+        # O checkout (fazer_pedido) trava e relê o carrinho: instância nova
+        self._carrinho_ativo = None
+        return self._carrinho()
+
+    def esvaziar(self):
+        """Depois do pedido: o carrinho já foi desativado por fazer_pedido."""
+        self._carrinho_ativo = None
+
+
+class ItemSessao:
+    """Item do CarrinhoSessao, com os mesmos atributos usados nos templates que ItemCarrinho."""
+
+    def __init__(self, produto, quantidade, preco_unitario):
+        self.pk = produto.pk
+        self.produto = produto
+        self.quantidade = quantidade
+        self.preco_unitario = preco_unitario
+
+    def get_subtotal(self):
+        return self.quantidade * self.preco_unitario
+
+
+class CarrinhoSessao:
+    """
+    Carrinho na sessão: {produto_id: {'quantidade': n, 'preco_unitario': '10.00'}}.
+    Identificador do item: o id do produto. O preço fica fixado na inclusão,
+    como em ItemCarrinho.
+    """
+
+    CHAVE = 'carrinho'
+
+    def __init__(self, request):
+        self.request = request
+        self.usuario = request.user
+
+    @property
+    def _dados(self):
+        return self.request.session.get(self.CHAVE, {})
+
+    def _gravar(self, dados):
+        self.request.session[self.CHAVE] = dados
+
+    def itens(self):
+        dados = self._dados
+        produtos = Produtos.objects.in_bulk([int(produto_id) for produto_id in dados])
+        return [
+            ItemSessao(produtos[int(produto_id)], item['quantidade'], Decimal(item['preco_unitario']))
+            for produto_id, item in dados.items()
+            if int(produto_id) in produtos
+        ]
+
+    def adicionar(self, produto, quantidade=1):
+        dados = self._dados
+        item = dados.get(str(produto.pk))
+        criado = item is None
+        if criado:
+            item = {'quantidade': 0, 'preco_unitario': str(produto.preco)}
+        _conferir_estoque(produto, item['quantidade'] + quantidade)
+        item['quantidade'] += quantidade
+        dados[str(produto.pk)] = item
+        self._gravar(dados)
+        return item['quantidade'], criado
+
+    def definir_quantidades(self, linhas):
+        dados = self._dados
+        for produto, quantidade in linhas.items():
+            item = dados.setdefault(str(produto.pk), {'preco_unitario': str(produto.preco)})
+            item['quantidade'] = quantidade
+        self._gravar(dados)
+
+    def atualizar(self, item_id, quantidade):
+        dados = self._dados
+        if str(item_id) not in dados:
+            return False
+        if quantidade > 0:
+            produto = Produtos.objects.filter(pk=item_id).first()
+            if produto is not None:
+                _conferir_estoque(produto, quantidade)
+            dados[str(item_id)]['quantidade'] = quantidade
+        else:
+            del dados[str(item_id)]
+        self._gravar(dados)
+        return True
+
+    def remover(self, item_id):
+        dados = self._dados
+        if dados.pop(str(item_id), None) is None:
+            return None
+        self._gravar(dados)
+        produto = Produtos.objects.filter(pk=item_id).values_list('nome', flat=True).first()
+        return produto or 'Produto'
+
+    def totais(self):
+        total, quantidade_itens = _ZERO, 0
+        for item in self._dados.values():
+            total += item['quantidade'] * Decimal(item['preco_unitario'])
+            quantidade_itens += item['quantidade']
+        return {'total': total, 'quantidade_itens': quantidade_itens}
+
+    def persistir(self):
+        """Grava os itens da sessão no Carrinho ativo (substituindo os que houver) para o checkout."""
+        dados = self._dados
+        if not dados:
+            return Carrinho.objects.filter(usuario=self.usuario, ativo=True).first()
+        existentes = set(
+            Produtos.objects.filter(pk__in=[int(produto_id) for produto_id in dados]).values_list('pk', flat=True)
+        )
+        with transaction.atomic():
+            carrinho = Carrinho.objects.get_or_create(usuario=self.usuario, ativo=True)[0]
+            carrinho.itens.all().delete()
+            ItemCarrinho.objects.bulk_create([
+                ItemCarrinho(
+                    carrinho=carrinho,
+                    produto_id=int(produto_id),
+                    quantidade=item['quantidade'],
+                    preco_unitario=Decimal(item['preco_unitario']),
+                )
+                for produto_id, item in dados.items()
+                if int(produto_id) in existentes
+            ])
+        return carrinho
+
+    def esvaziar(self):
+        self.request.session.pop(self.CHAVE, None)
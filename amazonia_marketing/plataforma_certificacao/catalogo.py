@@ -0,0 +1,183 @@
+"""
+Catálogo público (Vitrine).
+Concentra a consulta de produtos disponíveis e a paginação por cursor (keyset).
+
+Paginação por cursor: em vez de OFFSET (que fica mais lento a cada página),
+cada página continua a partir do último par (data_criacao, id_produto) já exibido,
+na mesma ordem da Meta do modelo (-data_criacao). O custo de cada página é constante.
+
+Cache: a vitrine é igual para todos os visitantes, então cada página renderizada
+(cards + selos) fica no cache VITRINE_CACHE_ALIAS (compartilhado entre processos)
+sob uma chave versionada. Qualquer gravação em Produtos/Certificacoes incrementa
+a versão (ver signals.py) e as chaves antigas simplesmente deixam de ser lidas,
+expirando sozinhas.
+"""
+
+import hashlib
+import time
+from datetime import datetime
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import Exists, F, OuterRef, Q
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from .models import Produtos, Certificacoes
+from .facetas import aplicar_filtros, contagens_facetas
+
+
+SALT_CURSOR = 'plataforma_certificacao.catalogo.cursor'
+CHAVE_VERSAO = 'vitrine:versao'
+
+
+class CursorInvalido(ValueError):
+    """Cursor adulterado, expirado ou em formato desconhecido."""
+
+
+def produtos_vitrine():
+    """
+    Produtos à venda com o selo (tem_selo) calculado no banco.
+    Ordenação estável: data de criação (mais recentes primeiro) e ID como desempate.
+    """
+    selo_aprovado = Certificacoes.objects.filter(
+        produto=OuterRef('pk'),
+        status_certificacao='aprovado',
+    )
+    return (
+        Produtos.objects.filter(Produtos.filtro_a_venda())
+        .annotate(tem_selo=Exists(selo_aprovado))
+        .order_by(F('data_criacao').desc(nulls_last=True), '-id_produto')
+    )
+
+
+def codificar_cursor(produto):
+    """Gera o cursor (assinado) que aponta para depois deste produto."""
+    data = produto.data_criacao.isoformat() if produto.data_criacao else None
+    return signing.dumps([data, produto.id_produto], salt=SALT_CURSOR)
+
+
+def decodificar_cursor(cursor):
+    """Retorna a tupla (data_criacao, id_produto) contida no cursor."""
+    try:
+        data, id_produto = signing.loads(cursor, salt=SALT_CURSOR)
+        data = datetime.fromisoformat(data) if data else None
+        return data, int(id_produto)
+    except (signing.BadSignature, TypeError, ValueError) as e:
+        raise CursorInvalido('Cursor de paginação inválido.') from e
+
+
+def filtro_apos_cursor(data, id_produto):
+    """
+    Condição keyset equivalente a "(data_criacao, id_produto) < cursor"
+    respeitando que produtos sem data vêm por último.
+    """
+    if data is None:
+        return Q(data_criacao__isnull=True, id_produto__lt=id_produto)
+    return (
+        Q(data_criacao__lt=data)
+        | Q(data_criacao=data, id_produto__lt=id_produto)
+        | Q(data_criacao__isnull=True)
+    )
+
+
+def pagina_vitrine(cursor=None, tamanho=None, queryset=None):
+    """
+    Retorna (produtos, proximo_cursor) de uma página da vitrine.
+    proximo_cursor é None quando não há mais páginas.
+    """
+    tamanho = tamanho or settings.VITRINE_ITENS_POR_PAGINA
+    consulta = produtos_vitrine() if queryset is None else queryset
+
+    if cursor:
+        consulta = consulta.filter(filtro_apos_cursor(*decodificar_cursor(cursor)))
+
+    # Busca um item a mais só para saber se existe próxima página (sem COUNT)
+    produtos = list(consulta[:tamanho + 1])
+    proximo_cursor = None
+    if len(produtos) > tamanho:
+        produtos = produtos[:tamanho]
+        proximo_cursor = codificar_cursor(produtos[-1])
+
+    return produtos, proximo_cursor
+
+
+# ============================================================================
+# CACHE DA VITRINE
+# ============================================================================
+
+def _cache():
+    # Compartilhado entre processos (web, run_worker, comandos): a versão
+    # incrementada por qualquer um deles invalida as páginas de todos
+    return caches[settings.VITRINE_CACHE_ALIAS]
+
+
+def versao_catalogo():
+    """Versão atual do catálogo (parte da chave de todas as páginas em cache)."""
+    versao = _cache().get(CHAVE_VERSAO)
+    if versao is None:
+        # Semente por relógio: se a chave de versão for descartada pelo cache,
+        # nunca voltamos a uma versão antiga que ainda tenha páginas guardadas
+        _cache().add(CHAVE_VERSAO, time.time_ns(), None)
+        versao = _cache().get(CHAVE_VERSAO)
+    return versao
+
+
+def _incrementar_versao():
+    try:
+        _cache().incr(CHAVE_VERSAO)
+    except ValueError:
+        _cache().set(CHAVE_VERSAO, time.time_ns(), None)
+
+
+def invalidar_catalogo():
+    """
+    Descarta todas as páginas da vitrine em cache.
+    Invalida na hora e de novo após o commit: assim uma requisição concorrente
+    que leia dados antigos antes do commit não deixa uma página velha no cache.
+    """
+    _incrementar_versao()
+    transaction.on_commit(_incrementar_versao)
+
+
+def renderizar_cards(request, produtos):
+    """HTML dos cards de produto da vitrine (template vitrine_produtos.html)."""
+    html = render_to_string('vitrine_produtos.html', {'produtos': produtos}, request=request)
+    return mark_safe(html.strip())
+
+
+def pagina_vitrine_renderizada(request, cursor=None, filtros=None):
+    """
+    Retorna (html, proximo_cursor) de uma página da vitrine, servindo do cache
+    quando possível. O HTML contém os cards já com os selos marcados.
+    filtros: facetas ativas (ver facetas.filtros_da_requisicao).
+    """
+    # O card muda apenas pelo link "Comprar" (sessão legada com usuario_id)
+    perfil = 'sessao' if request.session.get('usuario_id') else 'anonimo'
+    if cursor or filtros:
+        identificador = f"{sorted((filtros or {}).items())}|{cursor or ''}"
+        trecho = hashlib.md5(identificador.encode()).hexdigest()
+    else:
+        trecho = 'inicio'
+    chave = f'vitrine:{versao_catalogo()}:{perfil}:{trecho}'
+
+    pagina = _cache().get(chave)
+    if pagina is None:
+        consulta = aplicar_filtros(produtos_vitrine(), filtros) if filtros else None
+        produtos, proximo_cursor = pagina_vitrine(cursor, queryset=consulta)
+        pagina = (str(renderizar_cards(request, produtos)), proximo_cursor)
+        _cache().set(chave, pagina, settings.VITRINE_CACHE_TIMEOUT)
+
+    html, proximo_cursor = pagina
+    return mark_safe(html), proximo_cursor
+
+
+def facetas_em_cache():
+    """Contagens das facetas; mudam junto com o catálogo, então usam a mesma versão."""
+    return _cache().get_or_set(
+        f'vitrine:{versao_catalogo()}:facetas',
+        contagens_facetas,
+        settings.VITRINE_CACHE_TIMEOUT,
+    )
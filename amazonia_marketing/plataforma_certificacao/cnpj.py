@@ -0,0 +1,450 @@
+"""
+Cliente da consulta de CNPJ na API pública da ReceitaWS.
+
+Usado pelo endpoint AJAX do formulário (validar_cnpj_api) e pela validação
+interna (_validar_cnpj_api_interno). A API pública é lenta e tem limite de
+requisições por minuto, então:
+
+- CNPJ com dígitos verificadores errados é recusado sem rede (validadores.py);
+- cache persistente (alias CNPJ_CACHE_ALIAS, em arquivo): CNPJ encontrado fica
+  CNPJ_CACHE_TTL_ENCONTRADO segundos; "não encontrado" fica menos tempo
+  (CNPJ_CACHE_TTL_NAO_ENCONTRADO), pois pode ser um CNPJ recém-aberto;
+- erros transitórios (timeout, 429, 5xx) não vão para o cache: levantam
+  ConsultaCNPJIndisponivel;
+- consultas simultâneas do mesmo CNPJ no processo esperam uma única chamada
+  à API (coalescência);
+- métricas de acerto/falha do cache: metricas_cnpj();
+- uma sessão HTTP persistente (keep-alive, pool de conexões) para todas as consultas;
+- disjuntor (circuit breaker): depois de CNPJ_DISJUNTOR_FALHAS falhas seguidas
+  as consultas falham na hora, sem rede, por CNPJ_DISJUNTOR_ESPERA segundos;
+  depois uma consulta de teste decide se o circuito fecha ou abre de novo;
+- modo degradado (CNPJ_MODO_DEGRADADO): com a API fora, config_perfil_empresa
+  aceita o CNPJ com dígitos válidos e enfileira 'cnpj.verificar_empresa'.
+
+Versão assíncrona (aconsultar_cnpj, usada pela view validar_cnpj_api no ASGI):
+mesmo cache, métricas, disjuntor e coalescência, com um httpx.AsyncClient
+compartilhado por event loop; a espera pela API não ocupa uma thread.
+
+Verificação em lote (manage.py verificar_cnpjs): a função de consulta vem de
+CNPJ_CONSULTA (caminho pontilhado; troque por um stub local em desenvolvimento)
+e as chamadas são espaçadas por LimiteRequisicoes.
+"""
+
+import asyncio
+import threading
+import time
+import weakref
+from concurrent.futures import Future, TimeoutError as TempoEsgotado
+from datetime import timedelta
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.module_loading import import_string
+from django.utils import timezone
+
+from .models import EmpresaProfile
+from .tarefas import enfileirar, tarefa
+from .validadores import cnpj_valido, normalizar_cnpj
+
+
+METRICAS = ('acertos', 'falhas', 'consultas_api', 'coalescidas')
+
+
+class ConsultaCNPJIndisponivel(Exception):
+    """A API não respondeu de forma conclusiva (tente de novo mais tarde)."""
+
+
+class CircuitoAberto(ConsultaCNPJIndisponivel):
+    """Consultas suspensas pelo disjuntor depois de falhas seguidas da API."""
+
+
+def _cache():
+    return caches[settings.CNPJ_CACHE_ALIAS]
+
+
+def _chave(cnpj):
+    return f'cnpj:{cnpj}'
+
+
+# ============================================================================
+# MÉTRICAS
+# ============================================================================
+
+def _contar(metrica):
+    cache = _cache()
+    chave = f'cnpj:metricas:{metrica}'
+    if cache.add(chave, 1, None):
+        return
+    try:
+        cache.incr(chave)
+    except ValueError:
+        # Expirou entre o add e o incr
+        cache.add(chave, 1, None)
+
+
+async def _acontar(metrica):
+    cache = _cache()
+    chave = f'cnpj:metricas:{metrica}'
+    if await cache.aadd(chave, 1, None):
+        return
+    try:
+        await cache.aincr(chave)
+    except ValueError:
+        await cache.aadd(chave, 1, None)
+
+
+def metricas_cnpj():
+    """Contadores acumulados e taxa de acerto do cache de CNPJ."""
+    valores = _cache().get_many([f'cnpj:metricas:{metrica}' for metrica in METRICAS])
+    metricas = {metrica: valores.get(f'cnpj:metricas:{metrica}', 0) for metrica in METRICAS}
+    consultas = metricas['acertos'] + metricas['falhas']
+    metricas['taxa_acerto'] = metricas['acertos'] / consultas if consultas else 0.0
+    return metricas
+
+
+# ============================================================================
+# CONSULTA
+# ============================================================================
+
+def _normalizar(dados):
+    """Campos da resposta da ReceitaWS usados pelas views."""
+    return {
+        'encontrado': True,
+        'razao_social': dados.get('nome', ''),
+        'nome_fantasia': dados.get('fantasia', ''),
+        'cnpj': dados.get('cnpj', ''),
+        'situacao': dados.get('situacao', ''),
+        'logradouro': dados.get('logradouro', ''),
+        'numero': dados.get('numero', ''),
+        'municipio': dados.get('municipio', ''),
+        'uf': dados.get('uf', ''),
+        'cep': dados.get('cep', ''),
+        'telefone': dados.get('telefone', ''),
+        'email': dados.get('email', ''),
+    }
+
+
+# ============================================================================
+# SESSÃO HTTP E DISJUNTOR
+# ============================================================================
+
+class Disjuntor:
+    """
+    Circuit breaker por processo.
+    fechado: chamadas passam; `limite_falhas` falhas seguidas abrem o circuito.
+    aberto: chamadas recusadas na hora (CircuitoAberto) por `espera` segundos.
+    meio aberto: passada a espera, uma única chamada de teste vai à API;
+    sucesso fecha o circuito, falha abre de novo.
+    """
+
+    def __init__(self, limite_falhas, espera):
+        self.limite_falhas = limite_falhas
+        self.espera = espera
+        self.falhas = 0
+        self.aberto_ate = None
+        self._testando = False
+        self._trava = threading.Lock()
+
+    @property
+    def estado(self):
+        if self.aberto_ate is None:
+            return 'fechado'
+        return 'aberto' if time.monotonic() < self.aberto_ate else 'meio_aberto'
+
+    def permitir(self):
+        with self._trava:
+            if self.aberto_ate is None:
+                return
+            if time.monotonic() < self.aberto_ate or self._testando:
+                raise CircuitoAberto('Consulta à Receita Federal suspensa temporariamente após falhas seguidas')
+            self._testando = True
+
+    def registrar_sucesso(self):
+        with self._trava:
+            self.falhas = 0
+            self.aberto_ate = None
+            self._testando = False
+
+    def registrar_falha(self):
+        with self._trava:
+            self.falhas += 1
+            if self._testando or self.falhas >= self.limite_falhas:
+                self.aberto_ate = time.monotonic() + self.espera
+            self._testando = False
+
+
+_sessao_http = None
+_disjuntor_api = None
+_trava_cliente = threading.Lock()
+
+
+def _sessao():
+    """requests.Session compartilhada: reaproveita conexões TLS entre consultas."""
+    global _sessao_http
+    with _trava_cliente:
+        if _sessao_http is None:
+            sessao = requests.Session()
+            adaptador = HTTPAdapter(pool_connections=1, pool_maxsize=settings.CNPJ_API_CONEXOES)
+            sessao.mount('https://', adaptador)
+            sessao.mount('http://', adaptador)
+            sessao.headers['Accept'] = 'application/json'
+            _sessao_http = sessao
+    return _sessao_http
+
+
+def disjuntor():
+    global _disjuntor_api
+    with _trava_cliente:
+        if _disjuntor_api is None:
+            _disjuntor_api = Disjuntor(settings.CNPJ_DISJUNTOR_FALHAS, settings.CNPJ_DISJUNTOR_ESPERA)
+    return _disjuntor_api
+
+
+def _buscar_na_api(cnpj):
+    """Uma chamada à ReceitaWS (se o disjuntor permitir). Retorna o resultado normalizado."""
+    circuito = disjuntor()
+    circuito.permitir()
+    try:
+        resultado = _requisitar(cnpj)
+    except ConsultaCNPJIndisponivel:
+        circuito.registrar_falha()
+        raise
+    circuito.registrar_sucesso()
+    return resultado
+
+
+def _requisitar(cnpj):
+    _contar('consultas_api')
+    try:
+        resposta = _sessao().get(
+            settings.CNPJ_API_URL.format(cnpj=cnpj),
+            timeout=(settings.CNPJ_API_TIMEOUT_CONEXAO, settings.CNPJ_API_TIMEOUT),
+        )
+    except requests.exceptions.Timeout:
+        raise ConsultaCNPJIndisponivel('Tempo limite excedido - API não respondeu')
+    except requests.RequestException as e:
+        raise ConsultaCNPJIndisponivel(f'Erro de conexão: {e}')
+    return _interpretar(resposta)
+
+
+def _interpretar(resposta):
+    """Resposta HTTP da ReceitaWS (requests ou httpx) -> resultado normalizado."""
+    if resposta.status_code != 200:
+        # 429 (limite de requisições) e 5xx: não dizem nada sobre o CNPJ
+        raise ConsultaCNPJIndisponivel(f'Erro ao consultar API (Status {resposta.status_code})')
+    try:
+        dados = resposta.json()
+    except ValueError:
+        raise ConsultaCNPJIndisponivel('Resposta inválida da API')
+
+    if dados.get('status') == 'ERROR':
+        return {'encontrado': False, 'erro': dados.get('message') or 'CNPJ não encontrado'}
+    return _normalizar(dados)
+
+
+def _ttl(resultado):
+    if resultado['encontrado']:
+        return settings.CNPJ_CACHE_TTL_ENCONTRADO
+    return settings.CNPJ_CACHE_TTL_NAO_ENCONTRADO
+
+
+def _guardar(cnpj, resultado):
+    _cache().set(_chave(cnpj), resultado, _ttl(resultado))
+
+
+_em_andamento = {}
+_trava = threading.Lock()
+
+
+def consultar_cnpj(cnpj):
+    """
+    Dados do CNPJ: {'encontrado': True, 'razao_social': ..., ...}
+    ou {'encontrado': False, 'erro': ...}.
+    Levanta ConsultaCNPJIndisponivel quando a API falha.
+    """
+    cnpj = normalizar_cnpj(cnpj)
+    if not cnpj_valido(cnpj):
+        # Nem chega à API: dígitos verificadores errados
+        return {'encontrado': False, 'erro': 'CNPJ inválido: dígitos verificadores não conferem'}
+
+    resultado = _cache().get(_chave(cnpj))
+    if resultado is not None:
+        _contar('acertos')
+        return resultado
+    _contar('falhas')
+
+    with _trava:
+        futuro = _em_andamento.get(cnpj)
+        lider = futuro is None
+        if lider:
+            futuro = Future()
+            _em_andamento[cnpj] = futuro
+
+    if not lider:
+        # Outra thread já está consultando este CNPJ: espera a mesma resposta
+        _contar('coalescidas')
+        try:
+            return futuro.result(timeout=settings.CNPJ_API_TIMEOUT + 5)
+        except TempoEsgotado:
+            raise ConsultaCNPJIndisponivel('Tempo limite excedido - API não respondeu')
+
+    try:
+        # Outra thread pode ter terminado entre a primeira leitura e a reserva
+        resultado = _cache().get(_chave(cnpj))
+        if resultado is None:
+            resultado = _buscar_na_api(cnpj)
+            _guardar(cnpj, resultado)
+        futuro.set_result(resultado)
+        return resultado
+    except BaseException as e:
+        futuro.set_exception(e)
+        raise
+    finally:
+        with _trava:
+            _em_andamento.pop(cnpj, None)
+
+
+def consulta_configurada():
+    """Função de consulta definida em CNPJ_CONSULTA (mesmo contrato de consultar_cnpj)."""
+    return import_string(settings.CNPJ_CONSULTA)
+
+
+class LimiteRequisicoes:
+    """
+    Limita as chamadas a `por_minuto`, espaçadas igualmente, entre threads.
+    aguardar() bloqueia até a vez da próxima chamada.
+    """
+
+    def __init__(self, por_minuto):
+        self.intervalo = 60.0 / por_minuto if por_minuto else 0.0
+        self._proxima = time.monotonic()
+        self._trava = threading.Lock()
+
+    def aguardar(self):
+        with self._trava:
+            agora = time.monotonic()
+            vez = max(self._proxima, agora)
+            self._proxima = vez + self.intervalo
+        if vez > agora:
+            time.sleep(vez - agora)
+
+
+# ============================================================================
+# CONSULTA ASSÍNCRONA (ASGI)
+# ============================================================================
+
+# Um cliente e um mapa de consultas em andamento por event loop: objetos do
+# asyncio não podem ser usados fora do loop em que foram criados
+# Só faz sentido com um loop duradouro (servidor ASGI): no WSGI a view
+# validar_cnpj_api usa consultar_cnpj, sem criar um cliente por requisição
+_clientes_async = weakref.WeakKeyDictionary()
+_em_andamento_async = weakref.WeakKeyDictionary()
+
+
+def _cliente_async():
+    loop = asyncio.get_running_loop()
+    cliente = _clientes_async.get(loop)
+    if cliente is None:
+        cliente = httpx.AsyncClient(
+            headers={'Accept': 'application/json'},
+            timeout=httpx.Timeout(settings.CNPJ_API_TIMEOUT, connect=settings.CNPJ_API_TIMEOUT_CONEXAO),
+            limits=httpx.Limits(
+                max_connections=settings.CNPJ_API_CONEXOES_ASYNC,
+                max_keepalive_connections=settings.CNPJ_API_CONEXOES,
+            ),
+        )
+        _clientes_async[loop] = cliente
+    return cliente
+
+
+async def _abuscar_na_api(cnpj):
+    circuito = disjuntor()
+    circuito.permitir()
+    await _acontar('consultas_api')
+    try:
+        resposta = await _cliente_async().get(settings.CNPJ_API_URL.format(cnpj=cnpj))
+        resultado = _interpretar(resposta)
+    except httpx.TimeoutException:
+        circuito.registrar_falha()
+        raise ConsultaCNPJIndisponivel('Tempo limite excedido - API não respondeu')
+    except httpx.HTTPError as e:
+        circuito.registrar_falha()
+        raise ConsultaCNPJIndisponivel(f'Erro de conexão: {e}')
+    except ConsultaCNPJIndisponivel:
+        circuito.registrar_falha()
+        raise
+    circuito.registrar_sucesso()
+    return resultado
+
+
+async def _aconsultar_e_guardar(cnpj):
+    resultado = await _abuscar_na_api(cnpj)
+    await _cache().aset(_chave(cnpj), resultado, _ttl(resultado))
+    return resultado
+
+
+async def aconsultar_cnpj(cnpj):
+    """Versão assíncrona de consultar_cnpj (mesmo retorno e mesmas exceções)."""
+    cnpj = normalizar_cnpj(cnpj)
+    if not cnpj_valido(cnpj):
+        return {'encontrado': False, 'erro': 'CNPJ inválido: dígitos verificadores não conferem'}
+
+    resultado = await _cache().aget(_chave(cnpj))
+    if resultado is not None:
+        await _acontar('acertos')
+        return resultado
+    await _acontar('falhas')
+
+    em_andamento = _em_andamento_async.setdefault(asyncio.get_running_loop(), {})
+    consulta = em_andamento.get(cnpj)
+    if consulta is None:
+        consulta = asyncio.ensure_future(_aconsultar_e_guardar(cnpj))
+        em_andamento[cnpj] = consulta
+        consulta.add_done_callback(lambda _consulta: em_andamento.pop(cnpj, None))
+    else:
+        await _acontar('coalescidas')
+    # shield: quem desiste (cliente desconectou) não cancela a consulta dos outros
+    return await asyncio.shield(consulta)
+
+
+# ============================================================================
+# VERIFICAÇÃO ADIADA (MODO DEGRADADO)
+# ============================================================================
+
+SITUACAO_NAO_ENCONTRADO = 'NÃO ENCONTRADO'
+
+
+def situacao_do_resultado(resultado):
+    """Valor gravado em EmpresaProfile.situacao_receita para um resultado de consultar_cnpj."""
+    if not resultado['encontrado']:
+        return SITUACAO_NAO_ENCONTRADO
+    return (resultado['situacao'] or '').upper()[:30]
+
+
+def agendar_verificacao(empresa_id):
+    """Enfileira a consulta do CNPJ da empresa para quando a API voltar."""
+    enfileirar(
+        'cnpj.verificar_empresa', empresa_id,
+        atraso=timedelta(seconds=settings.CNPJ_VERIFICACAO_ATRASO), max_tentativas=10,
+    )
+
+
+@tarefa('cnpj.verificar_empresa')
+def verificar_empresa(empresa_id):
+    """
+    Consulta o CNPJ aceito em modo degradado e grava a situação cadastral.
+    API ainda fora (ou circuito aberto): a exceção devolve a tarefa à fila com backoff.
+    """
+    perfil = EmpresaProfile.objects.filter(pk=empresa_id).values('cnpj').first()
+    if not perfil or not perfil['cnpj']:
+        return
+    resultado = consultar_cnpj(perfil['cnpj'])
+    # Só grava se o CNPJ não mudou enquanto a tarefa esperava na fila
+    EmpresaProfile.objects.filter(pk=empresa_id, cnpj=perfil['cnpj']).update(
+        situacao_receita=situacao_do_resultado(resultado),
+        consulta_receita_em=timezone.now(),
+    )
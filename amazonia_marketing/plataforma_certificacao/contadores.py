@@ -0,0 +1,91 @@
+"""
+Contadores materializados de status (tabela ContadorStatus).
+
+O dashboard do auditor lê os totais de certificações e empresas por status
+desta tabela pequena, em vez de contar as tabelas inteiras a cada acesso.
+
+Manutenção:
+- criação/exclusão de registros: signals (signals.py), +1/-1 no status atual;
+- mudança de status: as views chamam registrar_transicao() na mesma
+  transação em que salvam o registro (ver admin_responder_certificacoes
+  e detalhe_empresa).
+
+Alterações feitas por fora (Django Admin, shell, SQL) geram divergência,
+detectada e corrigida por: python manage.py recalcular_contadores
+"""
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F
+
+from .models import Certificacoes, EmpresaProfile, ContadorStatus
+
+
+# entidade -> (model, campo de status)
+ENTIDADES = {
+    'certificacao': (Certificacoes, 'status_certificacao'),
+    'empresa': (EmpresaProfile, 'status_verificacao'),
+}
+
+
+def ajustar(entidade, status, delta):
+    """Soma delta ao contador (cria a linha se ainda não existir)."""
+    if not status or not delta:
+        return
+    atualizados = ContadorStatus.objects.filter(entidade=entidade, status=status).update(total=F('total') + delta)
+    if atualizados:
+        return
+    try:
+        with transaction.atomic():
+            ContadorStatus.objects.create(entidade=entidade, status=status, total=delta)
+    except IntegrityError:
+        # Outra transação criou a linha primeiro: basta somar
+        ContadorStatus.objects.filter(entidade=entidade, status=status).update(total=F('total') + delta)
+
+
+def registrar_transicao(entidade, status_anterior, status_novo):
+    """Move uma unidade de um status para outro. Chamar dentro de transaction.atomic()."""
+    if status_anterior == status_novo:
+        return
+    ajustar(entidade, status_anterior, -1)
+    ajustar(entidade, status_novo, +1)
+
+
+def contadores_por_status():
+    """Todos os contadores numa consulta: {entidade: {status: total}}."""
+    resultado = {entidade: {} for entidade in ENTIDADES}
+    for entidade, status, total in ContadorStatus.objects.values_list('entidade', 'status', 'total'):
+        resultado.setdefault(entidade, {})[status] = total
+    return resultado
+
+
+def contagem_real(entidade):
+    """Contagem direta na tabela de origem: {status: total} (uma consulta GROUP BY)."""
+    model, campo = ENTIDADES[entidade]
+    return dict(
+        model.objects.order_by().values(campo).annotate(total=Count('pk')).values_list(campo, 'total')
+    )
+
+
+def recalcular(corrigir=True):
+    """
+    Compara os contadores com a contagem real.
+    Retorna a lista de divergências (entidade, status, registrado, real);
+    com corrigir=True, regrava os contadores a partir da contagem real.
+    """
+    divergencias = []
+    with transaction.atomic():
+        registrados = contadores_por_status()
+        for entidade in ENTIDADES:
+            reais = contagem_real(entidade)
+            for status in sorted(set(reais) | set(registrados[entidade])):
+                registrado = registrados[entidade].get(status, 0)
+                real = reais.get(status, 0)
+                if registrado != real:
+                    divergencias.append((entidade, status, registrado, real))
+
+        if corrigir and divergencias:
+            for entidade, status, _registrado, real in divergencias:
+                ContadorStatus.objects.update_or_create(
+                    entidade=entidade, status=status, defaults={'total': real}
+                )
+    return divergencias
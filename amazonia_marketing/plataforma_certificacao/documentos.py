@@ -0,0 +1,104 @@
+"""
+Metadados dos documentos da empresa (tabela MetadadosDocumento).
+
+O dashboard da empresa não consulta o storage: lê tamanho, hash e existência
+gravados no banco. Os metadados são calculados:
+- no upload (config_perfil_empresa), a partir do próprio arquivo enviado;
+- pela reconciliação periódica: python manage.py verificar_documentos
+"""
+
+import hashlib
+
+from django.utils import timezone
+
+from .models import MetadadosDocumento
+
+
+# (campo do EmpresaProfile, rótulo exibido como pendência)
+DOCUMENTOS_EMPRESA = [
+    ('documento_cnpj', 'Documento CNPJ (Cartão CNPJ)'),
+    ('documento_contrato_social', 'Contrato Social'),
+    ('documento_alvara', 'Alvará de Funcionamento'),
+]
+
+TAMANHO_BLOCO = 64 * 1024
+
+
+def resumo_do_arquivo(arquivo):
+    """(tamanho, sha256) lendo o arquivo em blocos, sem carregá-lo inteiro na memória."""
+    sha256 = hashlib.sha256()
+    tamanho = 0
+    # File.chunks() volta ao início do arquivo antes de ler
+    for bloco in arquivo.chunks(TAMANHO_BLOCO):
+        sha256.update(bloco)
+        tamanho += len(bloco)
+    return tamanho, sha256.hexdigest()
+
+
+def registrar_upload(perfil, campo, arquivo_enviado):
+    """Grava os metadados de um documento recém-enviado (perfil já salvo)."""
+    tamanho, sha256 = resumo_do_arquivo(arquivo_enviado)
+    MetadadosDocumento.objects.update_or_create(
+        empresa=perfil,
+        campo=campo,
+        defaults={
+            'nome_arquivo': getattr(perfil, campo).name,
+            'tamanho': tamanho,
+            'hash_sha256': sha256,
+            'existe': True,
+            'verificado_em': timezone.now(),
+        },
+    )
+
+
+def verificar_documentos(perfil):
+    """
+    Confere no storage os documentos de uma empresa e atualiza os metadados.
+    Usado pela reconciliação em segundo plano, nunca numa requisição de página.
+    Retorna a lista de campos cujo arquivo não foi encontrado.
+    """
+    ausentes = []
+    for campo, _rotulo in DOCUMENTOS_EMPRESA:
+        arquivo = getattr(perfil, campo)
+        if not arquivo:
+            MetadadosDocumento.objects.filter(empresa=perfil, campo=campo).delete()
+            continue
+
+        valores = {'nome_arquivo': arquivo.name, 'verificado_em': timezone.now()}
+        try:
+            existe = arquivo.storage.exists(arquivo.name)
+            if existe:
+                with arquivo.storage.open(arquivo.name, 'rb') as conteudo:
+                    valores['tamanho'], valores['hash_sha256'] = resumo_do_arquivo(conteudo)
+        except OSError:
+            existe = False
+        valores['existe'] = existe
+        if not existe:
+            ausentes.append(campo)
+            valores.update(tamanho=None, hash_sha256='')
+
+        MetadadosDocumento.objects.update_or_create(empresa=perfil, campo=campo, defaults=valores)
+    return ausentes
+
+
+def situacao_documentos(perfil):
+    """
+    Situação dos documentos só com dados do banco (uma consulta).
+    Retorna {campo: bool "enviado e presente"}.
+    Documento ainda não verificado (sem metadados) conta como presente
+    até a próxima reconciliação.
+    """
+    metadados = {
+        m.campo: m for m in MetadadosDocumento.objects.filter(empresa=perfil)
+    }
+    situacao = {}
+    for campo, _rotulo in DOCUMENTOS_EMPRESA:
+        arquivo = getattr(perfil, campo)
+        meta = metadados.get(campo)
+        if not arquivo:
+            situacao[campo] = False
+        elif meta is None or meta.nome_arquivo != arquivo.name:
+            situacao[campo] = True
+        else:
+            situacao[campo] = meta.existe
+    return situacao
@@ -0,0 +1,125 @@
+"""
+Estatísticas dos dashboards (auditor, produtor e empresa).
+
+Cada função devolve todos os contadores de uma tabela numa única consulta,
+com agregação condicional (COUNT ... FILTER / CASE WHEN), em vez de um
+.count() por status. O painel do auditor lê os contadores materializados
+(contadores.py), sem varrer as tabelas.
+"""
+
+import time
+from datetime import datetime
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import Count, Max, Q
+
+from .models import Produtos
+from .contadores import contadores_por_status
+
+
+def estatisticas_painel_admin():
+    """
+    Totais de certificações e de empresas por status, lidos da tabela
+    ContadorStatus numa única consulta: (certificacoes, empresas).
+    """
+    contadores = contadores_por_status()
+    cert = contadores['certificacao']
+    emp = contadores['empresa']
+    certificacoes = {
+        'total': sum(cert.values()),
+        'pendentes': cert.get('pendente', 0),
+        'aprovadas': cert.get('aprovado', 0),
+        'reprovadas': cert.get('reprovado', 0),
+    }
+    empresas = {
+        'total': sum(emp.values()),
+        'pendentes': emp.get('pendente', 0),
+        'verificadas': emp.get('verificado', 0),
+        'rejeitadas': emp.get('rejeitado', 0),
+        'suspensas': emp.get('suspenso', 0),
+    }
+    return certificacoes, empresas
+
+
+def estatisticas_usuario(usuario):
+    """
+    Produtos e certificações (por status) de um produtor ou empresa,
+    com as datas da última atividade. Uma consulta: produtos com LEFT JOIN
+    nas certificações.
+    """
+    estatisticas = Produtos.objects.filter(usuario=usuario).aggregate(
+        total_produtos=Count('pk', distinct=True),
+        certificacoes_pendentes=Count(
+            'certificacoes', filter=Q(certificacoes__status_certificacao='pendente')
+        ),
+        certificacoes_aprovadas=Count(
+            'certificacoes', filter=Q(certificacoes__status_certificacao='aprovado')
+        ),
+        certificacoes_rejeitadas=Count(
+            'certificacoes', filter=Q(certificacoes__status_certificacao='reprovado')
+        ),
+        ultimo_produto_em=Max('data_criacao'),
+        ultimo_envio_em=Max('certificacoes__data_envio'),
+        ultima_resposta_em=Max('certificacoes__data_resposta'),
+    )
+    datas = [
+        data.date() if isinstance(data, datetime) else data
+        for data in (
+            estatisticas['ultimo_produto_em'],
+            estatisticas['ultimo_envio_em'],
+            estatisticas['ultima_resposta_em'],
+        )
+        if data
+    ]
+    estatisticas['ultima_atividade'] = max(datas) if datas else None
+    return estatisticas
+
+
+# ============================================================================
+# RESUMO DO PRODUTOR EM CACHE
+# ============================================================================
+
+def _cache():
+    # Compartilhado entre processos, como o da vitrine: a invalidação feita
+    # em outro processo (run_worker, comandos) vale para todos
+    return caches[settings.RESUMO_PRODUTOR_CACHE_ALIAS]
+
+
+def _chave_versao_produtor(usuario_id):
+    return f'resumo_produtor:{usuario_id}:versao'
+
+
+def resumo_produtor(usuario):
+    """
+    estatisticas_usuario() guardado no cache por usuário.
+    A chave inclui uma versão por produtor, incrementada a cada gravação
+    em seus produtos ou certificações (ver signals.py).
+    """
+    chave_versao = _chave_versao_produtor(usuario.pk)
+    versao = _cache().get(chave_versao)
+    if versao is None:
+        # Semente por relógio, como a versão do catálogo (catalogo.py)
+        _cache().add(chave_versao, time.time_ns(), None)
+        versao = _cache().get(chave_versao)
+
+    return _cache().get_or_set(
+        f'resumo_produtor:{usuario.pk}:{versao}',
+        lambda: estatisticas_usuario(usuario),
+        settings.RESUMO_PRODUTOR_CACHE_TIMEOUT,
+    )
+
+
+def _incrementar_versao_produtor(usuario_id):
+    try:
+        _cache().incr(_chave_versao_produtor(usuario_id))
+    except ValueError:
+        # Ainda sem versão: a próxima leitura cria uma nova semente
+        pass
+
+
+def invalidar_resumo_produtor(usuario_id):
+    """Descarta o resumo em cache (agora e de novo após o commit)."""
+    _incrementar_versao_produtor(usuario_id)
+    transaction.on_commit(lambda: _incrementar_versao_produtor(usuario_id))
@@ -0,0 +1,148 @@
+"""
+Estoque numérico dos produtos e reservas do checkout.
+
+Produtos.quantidade_estoque vazio = sem controle de quantidade (não reserva).
+Com quantidade, o checkout (pedidos.fazer_pedido) baixa as unidades na mesma
+transação do pedido, com um único UPDATE condicional:
+
+    UPDATE Produtos SET quantidade_estoque = quantidade_estoque - <n>
+    WHERE id IN (...) AND quantidade_estoque >= <n>
+
+Se alguma linha não foi atualizada, faltou estoque: EstoqueInsuficiente
+desfaz o pedido inteiro. Checkouts simultâneos do mesmo produto não vendem
+mais do que existe, sem precisar travar as linhas antes.
+
+Produto com quantidade zerada sai da vitrine, da busca e das facetas
+(Produtos.filtro_a_venda). Como as baixas e devoluções são UPDATEs, sem
+signals, as que esgotam um produto ou devolvem unidades a um esgotado
+invalidam o cache da vitrine e ajustam as facetas após o commit.
+
+Cada baixa vira uma ReservaEstoque 'ativa', com validade
+ESTOQUE_RESERVA_VALIDADE:
+- pagamento aprovado: confirmar() -> 'confirmada';
+- sessão de pagamento expirada ou reserva vencida (manage.py liberar_reservas):
+  o pedido pendente é cancelado e as unidades voltam ao estoque -> 'liberada'.
+"""
+
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.utils import timezone
+
+from . import facetas
+from .catalogo import invalidar_catalogo
+from .models import Pedido, Produtos, ReservaEstoque
+
+
+class EstoqueInsuficiente(Exception):
+    """Algum produto do pedido não tem unidades suficientes."""
+
+
+def _disponibilidade_alterada(produto_ids):
+    """Produtos que esgotaram ou voltaram a ter unidades: reflete na vitrine e nas facetas após o commit."""
+    def refletir():
+        for produto_id in produto_ids:
+            facetas.atualizar_facetas_produto(produto_id)
+        invalidar_catalogo()
+    transaction.on_commit(refletir)
+
+
+def _baixar(quantidades):
+    """
+    Baixa as quantidades ({produto_id: n}) dos produtos com estoque controlado,
+    tudo ou nada. Retorna {produto_id: n} só dos controlados.
+    Deve rodar dentro de uma transação (a falha é desfeita pelo rollback).
+    """
+    controlados = list(
+        Produtos.objects.filter(pk__in=quantidades, quantidade_estoque__isnull=False).values_list('pk', flat=True)
+    )
+    if not controlados:
+        return {}
+    necessario = Case(
+        *[When(pk=pk, then=Value(quantidades[pk])) for pk in controlados], output_field=IntegerField(),
+    )
+    baixados = Produtos.objects.filter(pk__in=controlados, quantidade_estoque__gte=necessario).update(
+        quantidade_estoque=F('quantidade_estoque') - necessario,
+    )
+    if baixados != len(controlados):
+        raise EstoqueInsuficiente('Estoque insuficiente para um ou mais produtos do carrinho.')
+    esgotados = list(Produtos.objects.filter(pk__in=controlados, quantidade_estoque=0).values_list('pk', flat=True))
+    if esgotados:
+        _disponibilidade_alterada(esgotados)
+    return {pk: quantidades[pk] for pk in controlados}
+
+
+def reservar(pedido, itens):
+    """
+    Reserva as unidades dos itens ([{'produto_id', 'quantidade'}, ...]) para o pedido.
+    Chamada dentro da transação do checkout. Levanta EstoqueInsuficiente.
+    """
+    quantidades = Counter()
+    for item in itens:
+        quantidades[item['produto_id']] += item['quantidade']
+    baixadas = _baixar(quantidades)
+    expira_em = timezone.now() + timedelta(seconds=settings.ESTOQUE_RESERVA_VALIDADE)
+    return ReservaEstoque.objects.bulk_create([
+        ReservaEstoque(pedido=pedido, produto_id=produto_id, quantidade=quantidade, expira_em=expira_em)
+        for produto_id, quantidade in baixadas.items()
+    ])
+
+
+def confirmar(pedido):
+    """
+    Pagamento aprovado: reservas ativas viram confirmadas.
+    Reservas já liberadas (pagamento chegou depois do vencimento) são baixadas
+    de novo se ainda houver estoque. Retorna False se não houver.
+    """
+    with transaction.atomic():
+        pedido.reservas.filter(status='ativa').update(status='confirmada')
+        liberadas = list(pedido.reservas.filter(status='liberada').values_list('pk', 'produto_id', 'quantidade'))
+        if not liberadas:
+            return True
+        try:
+            with transaction.atomic():
+                _baixar({produto_id: quantidade for _pk, produto_id, quantidade in liberadas})
+        except EstoqueInsuficiente:
+            return False
+        ReservaEstoque.objects.filter(pk__in=[pk for pk, _produto_id, _quantidade in liberadas]).update(
+            status='confirmada',
+        )
+    return True
+
+
+def liberar(reservas):
+    """Devolve ao estoque as reservas ativas do queryset. Retorna quantas liberou."""
+    liberadas = 0
+    for reserva in reservas.filter(status='ativa').only('pk', 'produto_id', 'quantidade').iterator():
+        with transaction.atomic():
+            # Só quem muda o status de 'ativa' devolve as unidades (sem devolução em dobro)
+            if ReservaEstoque.objects.filter(pk=reserva.pk, status='ativa').update(status='liberada'):
+                Produtos.objects.filter(pk=reserva.produto_id).update(
+                    quantidade_estoque=F('quantidade_estoque') + reserva.quantidade,
+                )
+                # Estava zerado: volta à vitrine
+                if Produtos.objects.filter(pk=reserva.produto_id, quantidade_estoque=reserva.quantidade).exists():
+                    _disponibilidade_alterada([reserva.produto_id])
+                liberadas += 1
+    return liberadas
+
+
+def cancelar_pedido(pedido):
+    """Pagamento não concluído: cancela o pedido pendente e libera as reservas."""
+    Pedido.objects.filter(pk=pedido.pk, status='pendente').update(status='cancelado')
+    return liberar(ReservaEstoque.objects.filter(pedido_id=pedido.pk, pedido__status='cancelado'))
+
+
+def liberar_vencidas():
+    """
+    Cancela os pedidos ainda pendentes com reservas vencidas e devolve as unidades.
+    Pedidos já pagos não são tocados (a confirmação cuida das reservas deles).
+    Retorna quantas reservas foram liberadas.
+    """
+    vencidas = ReservaEstoque.objects.filter(status='ativa', expira_em__lte=timezone.now())
+    pedidos = set(vencidas.values_list('pedido_id', flat=True))
+    Pedido.objects.filter(pk__in=pedidos, status='pendente').update(status='cancelado')
+    return liberar(vencidas.filter(pedido__status='cancelado'))
@@ -0,0 +1,267 @@
+"""
+Facetas da vitrine: filtros por estado (UF), selo, faixa de preço e produtor.
+
+As contagens exibidas ao lado dos filtros NÃO são calculadas com COUNT/GROUP BY
+a cada requisição: ficam pré-calculadas em ContagemFaceta e são ajustadas
+incrementalmente (+1/-1) quando um produto, certificação ou perfil de produtor muda.
+Ler as facetas é sempre uma consulta pequena, independente do tamanho do catálogo.
+"""
+
+from decimal import Decimal
+from urllib.parse import urlencode
+
+from django.db import IntegrityError, transaction
+from django.db.models import Exists, F, OuterRef
+
+from .models import (
+    Produtos, Certificacoes, ProdutorProfile, UsuarioBase, FacetaProduto, ContagemFaceta
+)
+
+
+FACETAS = ['estado', 'certificado', 'faixa_preco', 'produtor']
+
+TITULOS = {
+    'estado': 'Estado',
+    'certificado': 'Certificação',
+    'faixa_preco': 'Preço',
+    'produtor': 'Produtor',
+}
+
+# Produtores exibidos na faceta (os com mais produtos)
+LIMITE_PRODUTORES = 20
+
+# (chave, rótulo, mínimo inclusivo, máximo exclusivo)
+FAIXAS_PRECO = [
+    ('ate-10', 'Até R$ 10', None, Decimal('10')),
+    ('10-50', 'R$ 10 a R$ 50', Decimal('10'), Decimal('50')),
+    ('50-100', 'R$ 50 a R$ 100', Decimal('50'), Decimal('100')),
+    ('acima-100', 'Acima de R$ 100', Decimal('100'), None),
+]
+
+
+def faixa_do_preco(preco):
+    """Chave da faixa de preço correspondente (None se o produto não tem preço)."""
+    if preco is None:
+        return None
+    for chave, _rotulo, minimo, maximo in FAIXAS_PRECO:
+        if (minimo is None or preco >= minimo) and (maximo is None or preco < maximo):
+            return chave
+    return None
+
+
+# ============================================================================
+# MANUTENÇÃO INCREMENTAL DAS CONTAGENS
+# ============================================================================
+
+def _produtos_com_selo(produtos=Produtos, certificacoes=Certificacoes):
+    return produtos.objects.annotate(certificado=Exists(
+        certificacoes.objects.filter(produto=OuterRef('pk'), status_certificacao='aprovado')
+    ))
+
+
+def valores_do_produto(produto, estado):
+    """Valores de cada faceta de um produto (None quando fora da vitrine)."""
+    if produto is None or not produto.a_venda:
+        return None
+    return _valores(produto, estado)
+
+
+def _valores(produto, estado):
+    return {
+        'estado': (estado or '').upper() or None,
+        'certificado': 'sim' if produto.certificado else 'nao',
+        'faixa_preco': faixa_do_preco(produto.preco),
+        'produtor': str(produto.usuario_id),
+    }
+
+
+def _ajustar(faceta, valor, delta):
+    if valor is None:
+        return
+    atualizados = ContagemFaceta.objects.filter(faceta=faceta, valor=valor).update(total=F('total') + delta)
+    if atualizados:
+        return
+    try:
+        with transaction.atomic():
+            ContagemFaceta.objects.create(faceta=faceta, valor=valor, total=delta)
+    except IntegrityError:
+        # Outra transação criou a linha primeiro: basta somar
+        ContagemFaceta.objects.filter(faceta=faceta, valor=valor).update(total=F('total') + delta)
+
+
+def atualizar_facetas_produto(produto_id):
+    """
+    Reflete nas contagens o estado atual de um produto.
+    Compara com a foto anterior (FacetaProduto) e ajusta só o que mudou.
+    """
+    with transaction.atomic():
+        foto = FacetaProduto.objects.select_for_update().filter(id_produto=produto_id).first()
+        anteriores = {f: getattr(foto, f) for f in FACETAS} if foto else {}
+
+        produto = _produtos_com_selo().filter(pk=produto_id).first()
+        estado = None
+        if produto is not None:
+            estado = ProdutorProfile.objects.filter(usuario_id=produto.usuario_id).values_list('estado', flat=True).first()
+        atuais = valores_do_produto(produto, estado) or {}
+
+        for faceta in FACETAS:
+            antes, depois = anteriores.get(faceta), atuais.get(faceta)
+            if antes != depois:
+                _ajustar(faceta, antes, -1)
+                _ajustar(faceta, depois, +1)
+
+        if atuais:
+            FacetaProduto.objects.update_or_create(id_produto=produto_id, defaults=atuais)
+        elif foto:
+            foto.delete()
+
+
+def atualizar_facetas_do_usuario(usuario_id):
+    """Reprocessa os produtos de um produtor (ex.: mudou o estado do perfil)."""
+    for produto_id in Produtos.objects.filter(usuario_id=usuario_id).values_list('pk', flat=True):
+        atualizar_facetas_produto(produto_id)
+
+
+def recalcular_todas(tamanho_lote=1000, apps=None):
+    """
+    Reconstrói fotos e contagens do zero, em lotes.
+    Retorna a quantidade de produtos na vitrine.
+    apps: registro de models históricos, quando chamada de uma migration.
+    """
+    if apps is None:
+        produtos, certificacoes, perfis_produtor, fotos_produto, contagens_faceta = (
+            Produtos, Certificacoes, ProdutorProfile, FacetaProduto, ContagemFaceta
+        )
+    else:
+        produtos, certificacoes, perfis_produtor, fotos_produto, contagens_faceta = (
+            apps.get_model('plataforma_certificacao', nome)
+            for nome in ('Produtos', 'Certificacoes', 'ProdutorProfile', 'FacetaProduto', 'ContagemFaceta')
+        )
+    consulta = _produtos_com_selo(produtos, certificacoes).filter(Produtos.filtro_a_venda()).order_by('pk')
+    contagens = {}
+    total = 0
+    ultimo_id = 0
+
+    with transaction.atomic():
+        fotos_produto.objects.all().delete()
+        while True:
+            lote = list(consulta.filter(pk__gt=ultimo_id)[:tamanho_lote])
+            if not lote:
+                break
+
+            estados = dict(
+                perfis_produtor.objects.filter(usuario_id__in={p.usuario_id for p in lote})
+                .values_list('usuario_id', 'estado')
+            )
+            fotos = []
+            for produto in lote:
+                valores = _valores(produto, estados.get(produto.usuario_id))
+                fotos.append(fotos_produto(id_produto=produto.pk, **valores))
+                for faceta, valor in valores.items():
+                    if valor is not None:
+                        contagens[(faceta, valor)] = contagens.get((faceta, valor), 0) + 1
+            fotos_produto.objects.bulk_create(fotos)
+
+            total += len(lote)
+            ultimo_id = lote[-1].pk
+
+        contagens_faceta.objects.all().delete()
+        contagens_faceta.objects.bulk_create([
+            contagens_faceta(faceta=faceta, valor=valor, total=quantidade)
+            for (faceta, valor), quantidade in contagens.items()
+        ])
+    return total
+
+
+# ============================================================================
+# LEITURA DAS FACETAS E FILTROS DA VITRINE
+# ============================================================================
+
+def contagens_facetas():
+    """
+    Facetas prontas para o template: {faceta: [{valor, rotulo, total}, ...]}.
+    Uma consulta na tabela de contagens (+ uma para os nomes dos produtores).
+    """
+    resultado = {faceta: [] for faceta in FACETAS}
+    for faceta, valor, total in (
+        ContagemFaceta.objects.filter(total__gt=0).order_by('faceta', '-total', 'valor')
+        .values_list('faceta', 'valor', 'total')
+    ):
+        resultado[faceta].append({'valor': valor, 'rotulo': valor, 'total': total})
+
+    rotulos_faixas = {chave: rotulo for chave, rotulo, _min, _max in FAIXAS_PRECO}
+    ordem_faixas = [chave for chave, *_ in FAIXAS_PRECO]
+    for item in resultado['faixa_preco']:
+        item['rotulo'] = rotulos_faixas.get(item['valor'], item['valor'])
+    resultado['faixa_preco'].sort(key=lambda item: ordem_faixas.index(item['valor']))
+
+    for item in resultado['certificado']:
+        item['rotulo'] = 'Com selo' if item['valor'] == 'sim' else 'Sem selo'
+
+    resultado['produtor'] = resultado['produtor'][:LIMITE_PRODUTORES]
+    nomes = dict(
+        UsuarioBase.objects.filter(pk__in=[int(i['valor']) for i in resultado['produtor']])
+        .values_list('pk', 'nome')
+    ) if resultado['produtor'] else {}
+    for item in resultado['produtor']:
+        item['rotulo'] = nomes.get(int(item['valor']), item['valor'])
+
+    return resultado
+
+
+def facetas_para_template(contagens, filtros):
+    """
+    Lista de grupos {titulo, itens} com a querystring de cada item já montada:
+    clicar num valor ativa o filtro (mantendo os outros); clicar no ativo o remove.
+    As contagens são do catálogo inteiro, não da combinação de filtros ativa.
+    """
+    grupos = []
+    for faceta in FACETAS:
+        itens = []
+        for item in contagens.get(faceta, []):
+            ativo = filtros.get(faceta) == item['valor']
+            novos = dict(filtros)
+            if ativo:
+                novos.pop(faceta)
+            else:
+                novos[faceta] = item['valor']
+            itens.append({**item, 'ativo': ativo, 'query': urlencode(novos)})
+        if itens:
+            grupos.append({'titulo': TITULOS[faceta], 'itens': itens})
+    return grupos
+
+
+def filtros_da_requisicao(params):
+    """Extrai e valida os filtros de faceta da querystring (ignora valores inválidos)."""
+    filtros = {}
+    estado = params.get('estado', '').strip().upper()
+    if len(estado) == 2 and estado.isalpha():
+        filtros['estado'] = estado
+    if params.get('certificado') in ('sim', 'nao'):
+        filtros['certificado'] = params['certificado']
+    if params.get('faixa_preco') in {chave for chave, *_ in FAIXAS_PRECO}:
+        filtros['faixa_preco'] = params['faixa_preco']
+    if params.get('produtor', '').isdigit():
+        filtros['produtor'] = params['produtor']
+    return filtros
+
+
+def aplicar_filtros(queryset, filtros):
+    """
+    Aplica os filtros a um queryset da vitrine (catalogo.produtos_vitrine()).
+    Usa os índices compostos de Produtos (estoque+preço, produtor+estoque+data).
+    """
+    if 'estado' in filtros:
+        queryset = queryset.filter(usuario__produtor_profile__estado=filtros['estado'])
+    if 'certificado' in filtros:
+        queryset = queryset.filter(tem_selo=filtros['certificado'] == 'sim')
+    if 'faixa_preco' in filtros:
+        for chave, _rotulo, minimo, maximo in FAIXAS_PRECO:
+            if chave == filtros['faixa_preco']:
+                if minimo is not None:
+                    queryset = queryset.filter(preco__gte=minimo)
+                if maximo is not None:
+                    queryset = queryset.filter(preco__lt=maximo)
+    if 'produtor' in filtros:
+        queryset = queryset.filter(usuario_id=int(filtros['produtor']))
+    return queryset
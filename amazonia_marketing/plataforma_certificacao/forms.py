@@ -3,6 +3,7 @@ from django.core.exceptions import ValidationError
 from .models import (
     Produtos, ProdutorProfile, EmpresaProfile, Certificacoes, UsuarioBase
 )
+from .validadores import cnpj_valido, cpf_valido, normalizar_cnpj, normalizar_cpf
 import re
 
 # ============================================================================
@@ -68,9 +69,11 @@ class CadastroProdutorForm(forms.ModelForm):
     def clean_cpf(self):
         cpf = self.cleaned_data.get('cpf', '').strip()
         if cpf:
-            cpf_numeros = cpf.replace('.', '').replace('-', '')
+            cpf_numeros = normalizar_cpf(cpf)
             if len(cpf_numeros) != 11:
                 raise ValidationError('CPF deve conter 11 dígitos.')
+            if not cpf_valido(cpf_numeros):
+                raise ValidationError('CPF inválido: confira os dígitos.')
             # Validar se CPF já existe
             if ProdutorProfile.objects.filter(cpf=cpf_numeros).exists():
                 raise ValidationError('CPF já está em uso, tente outro.')
@@ -183,9 +186,11 @@ class CadastroEmpresaForm(forms.ModelForm):
         cnpj = self.cleaned_data.get('cnpj', '').strip()
         if cnpj:
             # Validar comprimento
-            cnpj_numeros = cnpj.replace('.', '').replace('/', '').replace('-', '')
+            cnpj_numeros = normalizar_cnpj(cnpj)
             if len(cnpj_numeros) != 14:
                 raise ValidationError('CNPJ deve conter 14 dígitos.')
+            if not cnpj_valido(cnpj_numeros):
+                raise ValidationError('CNPJ inválido: confira os dígitos.')
             
             # Validar se CNPJ já existe
             if EmpresaProfile.objects.filter(cnpj=cnpj_numeros).exists():
@@ -291,11 +296,12 @@ class ProdutoForm(forms.ModelForm):
     """Formulário para cadastro/edição de produtos"""
     class Meta:
         model = Produtos
-        fields = ['nome', 'descricao', 'preco', 'imagem', 'status_estoque']
+        fields = ['nome', 'descricao', 'preco', 'quantidade_estoque', 'imagem', 'status_estoque']
         widgets = {
             'nome': forms.TextInput(attrs={'class': 'form-input', 'placeholder': 'Nome do produto'}),
             'descricao': forms.Textarea(attrs={'class': 'form-input', 'rows': 4, 'placeholder': 'Descrição completa'}),
             'preco': forms.NumberInput(attrs={'class': 'form-input', 'placeholder': '0.00', 'step': '0.01'}),
+            'quantidade_estoque': forms.NumberInput(attrs={'class': 'form-input', 'placeholder': 'Sem limite', 'min': '0'}),
             'imagem': forms.FileInput(attrs={'class': 'form-input', 'accept': 'image/*'}),
             'status_estoque': forms.Select(attrs={'class': 'form-input'}, choices=[
                 ('disponivel', 'Disponível'),
@@ -0,0 +1,163 @@
+"""
+Rendições (versões reduzidas) das imagens de produtos e logos de empresas.
+
+A vitrine servia a imagem original do upload (fotos de celular com vários MB).
+Para cada imagem são geradas variantes WebP e JPEG em algumas larguras,
+gravadas ao lado do original (ex.: produtos/foto_640w.webp). Os nomes ficam
+no JSONField de rendições do registro (Produtos.imagem_rendicoes,
+EmpresaProfile.logo_rendicoes):
+
+    {"original": "produtos/foto.jpg", "largura": 3000, "altura": 2000,
+     "variantes": {"webp": [{"largura": 320, "nome": "..."}, ...], "jpg": [...]}}
+
+A geração roda fora da requisição: o signal de post_save enfileira a tarefa
+'imagens.gerar_rendicoes' (tarefas.py), executada pelo worker. O template tag
+{% imagem_responsiva %} (templatetags/imagens.py) monta o srcset e usa
+o original enquanto as rendições não existem ou estão desatualizadas.
+
+Imagens já existentes: python manage.py gerar_rendicoes
+"""
+
+import logging
+import os
+import posixpath
+from io import BytesIO
+
+from PIL import Image, ImageOps
+
+from django.core.files.base import ContentFile
+from django.db.models import Q
+
+from .catalogo import invalidar_catalogo
+from .models import EmpresaProfile, Produtos
+from .tarefas import enfileirar, tarefa
+
+
+logger = logging.getLogger(__name__)
+
+# alvo -> (model, campo da imagem, campo das rendições)
+ALVOS_IMAGEM = {
+    'produto': (Produtos, 'imagem', 'imagem_rendicoes'),
+    'empresa': (EmpresaProfile, 'logo', 'logo_rendicoes'),
+}
+
+LARGURAS = (320, 640, 960)
+# (extensão, formato do Pillow, tipo MIME); WebP primeiro: é o preferido no <picture>
+FORMATOS = (
+    ('webp', 'WEBP', 'image/webp'),
+    ('jpg', 'JPEG', 'image/jpeg'),
+)
+QUALIDADE = 80
+
+
+def alvo_do_model(model):
+    for alvo, (model_alvo, _campo, _campo_rendicoes) in ALVOS_IMAGEM.items():
+        if model is model_alvo:
+            return alvo
+    return None
+
+
+def rendicoes_atualizadas(arquivo, rendicoes):
+    """True quando as rendições gravadas correspondem à imagem atual (ou ambas estão vazias)."""
+    return (arquivo.name or '') == (rendicoes or {}).get('original', '')
+
+
+def larguras_para(largura_original):
+    """Larguras a gerar: as padrão menores que o original, mais uma no limite (sem ampliar)."""
+    larguras = {largura for largura in LARGURAS if largura < largura_original}
+    larguras.add(min(largura_original, LARGURAS[-1]))
+    return sorted(larguras)
+
+
+def _para_formato(imagem, formato):
+    """Converte o modo de cor para o que o formato aceita (JPEG não tem transparência)."""
+    tem_transparencia = imagem.mode in ('RGBA', 'LA') or (imagem.mode == 'P' and 'transparency' in imagem.info)
+    if formato == 'JPEG':
+        if tem_transparencia:
+            rgba = imagem.convert('RGBA')
+            fundo = Image.new('RGB', imagem.size, (255, 255, 255))
+            fundo.paste(rgba, mask=rgba.getchannel('A'))
+            return fundo
+        return imagem.convert('RGB')
+    return imagem.convert('RGBA' if tem_transparencia else 'RGB')
+
+
+def gerar_rendicoes(arquivo):
+    """Gera e grava as variantes de um ImageField/FieldFile. Retorna o dicionário de rendições."""
+    storage = arquivo.storage
+    with storage.open(arquivo.name, 'rb') as conteudo:
+        with Image.open(conteudo) as aberta:
+            # Fotos de celular: aplica a rotação do EXIF antes de redimensionar
+            imagem = ImageOps.exif_transpose(aberta)
+    largura, altura = imagem.size
+
+    pasta, nome = posixpath.split(arquivo.name)
+    base = os.path.splitext(nome)[0]
+    variantes = {extensao: [] for extensao, _formato, _tipo in FORMATOS}
+    for largura_variante in larguras_para(largura):
+        altura_variante = max(1, round(altura * largura_variante / largura))
+        reduzida = imagem
+        if largura_variante != largura:
+            reduzida = imagem.resize((largura_variante, altura_variante), Image.Resampling.LANCZOS)
+
+        for extensao, formato, _tipo in FORMATOS:
+            buffer = BytesIO()
+            _para_formato(reduzida, formato).save(buffer, formato, quality=QUALIDADE, optimize=True)
+            nome_variante = storage.save(
+                posixpath.join(pasta, f'{base}_{largura_variante}w.{extensao}'), ContentFile(buffer.getvalue())
+            )
+            variantes[extensao].append({'largura': largura_variante, 'nome': nome_variante})
+
+    return {'original': arquivo.name, 'largura': largura, 'altura': altura, 'variantes': variantes}
+
+
+def apagar_rendicoes(storage, rendicoes):
+    for lista in (rendicoes or {}).get('variantes', {}).values():
+        for variante in lista:
+            storage.delete(variante['nome'])
+
+
+@tarefa('imagens.gerar_rendicoes')
+def processar_rendicoes(alvo, pk, refazer=False):
+    """
+    Gera as rendições da imagem atual do registro e apaga as anteriores.
+    Se a imagem mudar durante o processamento, o resultado é descartado
+    (o post_save da nova imagem já agendou outro processamento).
+    """
+    model, campo, campo_rendicoes = ALVOS_IMAGEM[alvo]
+    instancia = model.objects.filter(pk=pk).only(campo, campo_rendicoes).first()
+    if instancia is None:
+        return
+    arquivo = getattr(instancia, campo)
+    anteriores = getattr(instancia, campo_rendicoes) or {}
+    if rendicoes_atualizadas(arquivo, anteriores) and not refazer:
+        return
+
+    novas = {}
+    if arquivo:
+        try:
+            novas = gerar_rendicoes(arquivo)
+        except (OSError, ValueError, Image.DecompressionBombError):
+            # Imagem corrompida ou ausente: registra para não reprocessar até ser trocada
+            logger.warning('Não foi possível gerar rendições de %s', arquivo.name, exc_info=True)
+            novas = {'original': arquivo.name, 'variantes': {}}
+
+    if arquivo:
+        mesma_imagem = Q(**{campo: arquivo.name})
+    else:
+        mesma_imagem = Q(**{campo: ''}) | Q(**{f'{campo}__isnull': True})
+    atualizados = model.objects.filter(mesma_imagem, pk=pk).update(**{campo_rendicoes: novas})
+
+    storage = model._meta.get_field(campo).storage
+    if not atualizados:
+        apagar_rendicoes(storage, novas)
+        return
+    apagar_rendicoes(storage, anteriores)
+    if model is Produtos:
+        # update() não dispara signals: os cards em cache ainda apontam para o original
+        invalidar_catalogo()
+
+
+def agendar_rendicoes(alvo, pk):
+    """Enfileira a geração das rendições (executada pelo worker depois do commit)."""
+    enfileirar('imagens.gerar_rendicoes', alvo, pk)
@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand
+
+from plataforma_certificacao.imagens import ALVOS_IMAGEM, processar_rendicoes, rendicoes_atualizadas
+
+
+class Command(BaseCommand):
+    help = (
+        'Gera as rendições WebP/JPEG das imagens de produtos e logos de empresas '
+        'que ainda não têm (ex.: imagens enviadas antes desta funcionalidade).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--alvo',
+            choices=sorted(ALVOS_IMAGEM),
+            help='Processa só produtos ou só empresas (padrão: ambos).',
+        )
+        parser.add_argument(
+            '--refazer',
+            action='store_true',
+            help='Gera de novo mesmo as rendições que já estão atualizadas.',
+        )
+        parser.add_argument(
+            '--lote',
+            type=int,
+            default=200,
+            help='Quantidade de registros lidos do banco por vez (padrão: 200).',
+        )
+
+    def handle(self, *args, **options):
+        alvos = [options['alvo']] if options['alvo'] else sorted(ALVOS_IMAGEM)
+        for alvo in alvos:
+            model, campo, campo_rendicoes = ALVOS_IMAGEM[alvo]
+            registros = (
+                model.objects.exclude(**{campo: ''}).exclude(**{f'{campo}__isnull': True})
+                .only(campo, campo_rendicoes).order_by('pk')
+            )
+            processados = 0
+            for instancia in registros.iterator(chunk_size=options['lote']):
+                atualizada = rendicoes_atualizadas(getattr(instancia, campo), getattr(instancia, campo_rendicoes))
+                if atualizada and not options['refazer']:
+                    continue
+                processar_rendicoes(alvo, instancia.pk, refazer=options['refazer'])
+                processados += 1
+            self.stdout.write(f'{model.__name__}: {processados} imagem(ns) processada(s).')
+
+        self.stdout.write(self.style.SUCCESS('Rendições atualizadas.'))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from plataforma_certificacao.estoque import liberar_vencidas
+
+
+class Command(BaseCommand):
+    help = (
+        'Cancela os pedidos não pagos com reservas de estoque vencidas e devolve as unidades ao estoque. '
+        'Feito para rodar periodicamente (cron).'
+    )
+
+    def handle(self, *args, **options):
+        liberadas = liberar_vencidas()
+        self.stdout.write(self.style.SUCCESS(f'{liberadas} reserva(s) vencida(s) liberada(s).'))
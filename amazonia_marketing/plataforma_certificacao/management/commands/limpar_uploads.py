@@ -0,0 +1,26 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from plataforma_certificacao.uploads import descartar_expiradas
+
+
+class Command(BaseCommand):
+    help = (
+        'Descarta os uploads em partes abandonados (sessão e partes temporárias). '
+        'Feito para rodar periodicamente (cron).'
+    )
+
+    def add_arguments(self, parser):
+        padrao = settings.UPLOAD_SESSAO_VALIDADE // 3600
+        parser.add_argument(
+            '--inativos-ha',
+            type=int,
+            default=padrao,
+            help=f'Descarta sessões sem partes novas há mais de N horas (padrão: {padrao}).',
+        )
+
+    def handle(self, *args, **options):
+        descartadas = descartar_expiradas(timedelta(hours=options['inativos_ha']))
+        self.stdout.write(self.style.SUCCESS(f'{descartadas} upload(s) abandonado(s) descartado(s).'))
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from plataforma_certificacao.contadores import recalcular
+
+
+class Command(BaseCommand):
+    help = (
+        'Compara os contadores de status (tabela ContadorStatus) com a contagem real '
+        'de certificações e empresas e corrige as divergências.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verificar',
+            action='store_true',
+            help='Apenas relata as divergências, sem corrigir (sai com erro se houver alguma).',
+        )
+
+    def handle(self, *args, **options):
+        apenas_verificar = options['verificar']
+        divergencias = recalcular(corrigir=not apenas_verificar)
+
+        for entidade, status, registrado, real in divergencias:
+            self.stdout.write(f'{entidade}/{status}: contador={registrado}, real={real}')
+
+        if not divergencias:
+            self.stdout.write(self.style.SUCCESS('Contadores em dia: nenhuma divergência.'))
+        elif apenas_verificar:
+            raise CommandError(f'{len(divergencias)} divergência(s) encontrada(s).')
+        else:
+            self.stdout.write(self.style.SUCCESS(f'{len(divergencias)} contador(es) corrigido(s).'))
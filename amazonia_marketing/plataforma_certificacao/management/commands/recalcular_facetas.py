@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from plataforma_certificacao.facetas import recalcular_todas
+
+
+class Command(BaseCommand):
+    help = 'Recalcula do zero as contagens das facetas da vitrine (tabelas FacetaProduto e ContagemFaceta).'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--lote',
+            type=int,
+            default=1000,
+            help='Quantidade de produtos processados por lote (padrão: 1000).',
+        )
+
+    def handle(self, *args, **options):
+        total = recalcular_todas(tamanho_lote=options['lote'])
+        self.stdout.write(self.style.SUCCESS(f'Facetas recalculadas: {total} produto(s) na vitrine.'))
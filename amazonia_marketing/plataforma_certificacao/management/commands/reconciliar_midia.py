@@ -0,0 +1,59 @@
+from django.core.management.base import BaseCommand
+
+from plataforma_certificacao.midia import (
+    ALVOS, TAMANHO_LOTE, arquivos_orfaos, limpar_referencia, mover_para_quarentena, referencias_quebradas,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Confere documentos de certificações e empresas contra o storage: relata referências '
+        'para arquivos inexistentes e arquivos que nenhum registro usa. '
+        'Pastas verificadas: ' + ', '.join(pasta for pasta, _model, _campos in ALVOS) + '.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--reparar',
+            action='store_true',
+            help='Limpa as referências quebradas (campos opcionais) e move os órfãos para a quarentena.',
+        )
+        parser.add_argument(
+            '--lote',
+            type=int,
+            default=TAMANHO_LOTE,
+            help=f'Tamanho dos lotes de leitura do banco e do storage (padrão: {TAMANHO_LOTE}).',
+        )
+
+    def handle(self, *args, **options):
+        reparar = options['reparar']
+        lote = options['lote']
+
+        quebradas = manuais = 0
+        for model, pk, campo, nome in referencias_quebradas(lote):
+            quebradas += 1
+            descricao = f'{model.__name__} {pk}.{campo} -> {nome} (arquivo inexistente)'
+            if reparar and not limpar_referencia(model, pk, campo):
+                manuais += 1
+                descricao += ' [campo obrigatório: corrigir manualmente]'
+            self.stdout.write(descricao)
+
+        orfaos = em_uso = 0
+        for nome in arquivos_orfaos(lote):
+            orfaos += 1
+            if reparar:
+                destino = mover_para_quarentena(nome)
+                if destino is None:
+                    em_uso += 1
+                    self.stdout.write(f'{nome} (sem referência) -> mantido: ainda contado em BlobDocumento')
+                else:
+                    self.stdout.write(f'{nome} (sem referência) -> movido para {destino}')
+            else:
+                self.stdout.write(f'{nome} (sem referência)')
+
+        resumo = f'{quebradas} referência(s) quebrada(s), {orfaos} arquivo(s) órfão(s).'
+        if reparar:
+            resumo += f' Reparado: {quebradas - manuais} referência(s) limpa(s), {orfaos - em_uso} arquivo(s) em quarentena.'
+        elif quebradas or orfaos:
+            resumo += ' Use --reparar para corrigir.'
+        self.stdout.write(self.style.SUCCESS(resumo))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from plataforma_certificacao.busca import reindexar_todos
+
+
+class Command(BaseCommand):
+    help = 'Reconstrói do zero o índice de busca de produtos (tabela IndiceBusca).'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--lote',
+            type=int,
+            default=500,
+            help='Quantidade de produtos processados por lote (padrão: 500).',
+        )
+
+    def handle(self, *args, **options):
+        total = reindexar_todos(tamanho_lote=options['lote'])
+        self.stdout.write(self.style.SUCCESS(f'Índice de busca reconstruído: {total} produto(s) indexado(s).'))
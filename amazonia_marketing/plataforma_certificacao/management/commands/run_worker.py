@@ -0,0 +1,74 @@
+import os
+import signal
+import socket
+import threading
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from plataforma_certificacao.tarefas import iniciar_threads, manutencao, tarefas_registradas
+
+
+# Intervalo (segundos) entre as rodadas de manutenção da fila
+INTERVALO_MANUTENCAO = 60
+
+
+class Command(BaseCommand):
+    help = (
+        'Executa as tarefas em segundo plano da fila (tabela Tarefa) com um grupo de threads. '
+        'Pode rodar em vários processos/máquinas ao mesmo tempo. Interrompa com Ctrl+C (SIGINT) ou SIGTERM.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--threads',
+            type=int,
+            default=settings.TAREFAS_WORKERS,
+            help=f'Quantidade de threads de execução (padrão: {settings.TAREFAS_WORKERS}).',
+        )
+        parser.add_argument(
+            '--intervalo',
+            type=float,
+            default=1.0,
+            help='Segundos de espera entre consultas quando a fila está vazia (padrão: 1).',
+        )
+        parser.add_argument(
+            '--uma-vez',
+            action='store_true',
+            help='Executa as tarefas já vencidas e termina (ex.: cron ou testes).',
+        )
+
+    def handle(self, *args, **options):
+        parar = threading.Event()
+        prefixo = f'{socket.gethostname()}:{os.getpid()}'
+
+        def encerrar(_sinal, _frame):
+            self.stdout.write('Encerrando: aguardando as tarefas em execução...')
+            parar.set()
+
+        if not options['uma_vez']:
+            signal.signal(signal.SIGINT, encerrar)
+            signal.signal(signal.SIGTERM, encerrar)
+
+        devolvidas, apagadas = manutencao()
+        if devolvidas or apagadas:
+            self.stdout.write(
+                f'{devolvidas} tarefa(s) presa(s) devolvida(s) à fila; {apagadas} concluída(s) antiga(s) apagada(s).'
+            )
+
+        self.stdout.write(
+            f'Worker {prefixo} com {options["threads"]} thread(s). '
+            f'Tarefas registradas: {", ".join(tarefas_registradas()) or "nenhuma"}.'
+        )
+        threads = iniciar_threads(prefixo, options['threads'], parar, options['intervalo'], options['uma_vez'])
+
+        if options['uma_vez']:
+            for thread in threads:
+                thread.join()
+        else:
+            while not parar.wait(INTERVALO_MANUTENCAO):
+                manutencao()
+            for thread in threads:
+                thread.join()
+
+        self.stdout.write(self.style.SUCCESS('Worker encerrado.'))
@@ -0,0 +1,153 @@
+import csv
+import threading
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from plataforma_certificacao.cnpj import (
+    CircuitoAberto, ConsultaCNPJIndisponivel, LimiteRequisicoes, consulta_configurada, situacao_do_resultado,
+)
+from plataforma_certificacao.models import EmpresaProfile
+from plataforma_certificacao.validadores import cnpj_valido, normalizar_cnpj
+
+
+def _em_lotes(iteravel, tamanho):
+    iterador = iter(iteravel)
+    while lote := list(islice(iterador, tamanho)):
+        yield lote
+
+
+def _comparavel(texto):
+    """Razão social sem acentos, caixa e espaços extras, para comparar com a Receita."""
+    texto = unicodedata.normalize('NFKD', texto or '')
+    return ' '.join(''.join(c for c in texto if not unicodedata.combining(c)).casefold().split())
+
+
+class Command(BaseCommand):
+    help = (
+        'Consulta na Receita Federal o CNPJ de todas as empresas pendentes de verificação, '
+        'grava a situação cadastral e relata as inativas, não encontradas ou com razão social divergente.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--threads',
+            type=int,
+            default=4,
+            help='Consultas simultâneas (padrão: 4).',
+        )
+        parser.add_argument(
+            '--por-minuto',
+            type=float,
+            default=settings.CNPJ_API_POR_MINUTO,
+            help=f'Máximo de consultas por minuto; 0 = sem limite (padrão: {settings.CNPJ_API_POR_MINUTO}).',
+        )
+        parser.add_argument(
+            '--consulta',
+            help='Caminho pontilhado da função de consulta (padrão: CNPJ_CONSULTA). Ex.: um stub local.',
+        )
+        parser.add_argument(
+            '--relatorio',
+            help='Grava também o relatório em CSV neste arquivo.',
+        )
+        parser.add_argument(
+            '--lote',
+            type=int,
+            default=100,
+            help='Empresas lidas e gravadas no banco por vez (padrão: 100).',
+        )
+
+    def handle(self, *args, **options):
+        consultar = import_string(options['consulta']) if options['consulta'] else consulta_configurada()
+        limite = LimiteRequisicoes(options['por_minuto'])
+        circuito_aberto = threading.Event()
+
+        def verificar(cnpj):
+            # API fora: as consultas ainda na fila desistem sem gastar a vez no limite
+            if circuito_aberto.is_set():
+                raise CircuitoAberto('Consulta interrompida: API indisponível')
+            limite.aguardar()
+            return consultar(cnpj)
+
+        pendentes = (
+            EmpresaProfile.objects.filter(status_verificacao='pendente')
+            .exclude(cnpj__isnull=True).exclude(cnpj='')
+            .only('cnpj', 'razao_social', 'situacao_receita', 'consulta_receita_em')
+            .order_by('pk')
+        )
+        relatorio = []
+        verificadas = indisponiveis = 0
+
+        with ThreadPoolExecutor(max_workers=options['threads']) as pool:
+            for lote in _em_lotes(pendentes.iterator(chunk_size=options['lote']), options['lote']):
+                consultas = []
+                for empresa in lote:
+                    cnpj = normalizar_cnpj(empresa.cnpj)
+                    if not cnpj_valido(cnpj):
+                        relatorio.append((empresa.pk, empresa.cnpj, empresa.razao_social, 'CNPJ inválido', ''))
+                        continue
+                    consultas.append((empresa, cnpj, pool.submit(verificar, cnpj)))
+
+                atualizadas = []
+                agora = timezone.now()
+                for empresa, cnpj, futuro in consultas:
+                    try:
+                        resultado = futuro.result()
+                    except ConsultaCNPJIndisponivel as e:
+                        if isinstance(e, CircuitoAberto):
+                            circuito_aberto.set()
+                        indisponiveis += 1
+                        continue
+
+                    empresa.situacao_receita = situacao_do_resultado(resultado)
+                    empresa.consulta_receita_em = agora
+                    atualizadas.append(empresa)
+                    verificadas += 1
+
+                    if not resultado['encontrado']:
+                        relatorio.append((empresa.pk, empresa.cnpj, empresa.razao_social, 'Não encontrado', ''))
+                        continue
+                    if empresa.situacao_receita != 'ATIVA':
+                        relatorio.append((
+                            empresa.pk, empresa.cnpj, empresa.razao_social, 'Inativa', empresa.situacao_receita,
+                        ))
+                    if normalizar_cnpj(resultado.get('cnpj') or cnpj) != cnpj:
+                        relatorio.append((
+                            empresa.pk, empresa.cnpj, empresa.razao_social, 'CNPJ divergente', resultado.get('cnpj'),
+                        ))
+                    razao_receita = resultado.get('razao_social')
+                    if empresa.razao_social and razao_receita and \
+                            _comparavel(empresa.razao_social) != _comparavel(razao_receita):
+                        relatorio.append((
+                            empresa.pk, empresa.cnpj, empresa.razao_social, 'Razão social divergente', razao_receita,
+                        ))
+
+                EmpresaProfile.objects.bulk_update(atualizadas, ['situacao_receita', 'consulta_receita_em'])
+                if circuito_aberto.is_set():
+                    break
+
+        for pk, cnpj, razao_social, motivo, receita in relatorio:
+            detalhe = f' (Receita: {receita})' if receita else ''
+            self.stdout.write(f'#{pk} {cnpj} {razao_social or "—"}: {motivo}{detalhe}')
+
+        if options['relatorio']:
+            with open(options['relatorio'], 'w', newline='', encoding='utf-8') as arquivo:
+                escritor = csv.writer(arquivo)
+                escritor.writerow(['empresa_id', 'cnpj', 'razao_social', 'problema', 'receita'])
+                escritor.writerows(relatorio)
+
+        self.stdout.write(
+            f'{verificadas} empresa(s) verificada(s); {len(relatorio)} problema(s); '
+            f'{indisponiveis} sem resposta da API.'
+        )
+        if circuito_aberto.is_set():
+            self.stdout.write(self.style.WARNING(
+                'API da Receita indisponível: verificação interrompida. Rode o comando de novo mais tarde.'
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS('Verificação concluída.'))
@@ -0,0 +1,56 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+
+from plataforma_certificacao.documentos import DOCUMENTOS_EMPRESA, verificar_documentos
+from plataforma_certificacao.models import EmpresaProfile, MetadadosDocumento
+
+
+class Command(BaseCommand):
+    help = (
+        'Reconcilia os metadados dos documentos das empresas com o storage '
+        '(existência, tamanho e hash). Feito para rodar periodicamente (cron).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--desatualizados-ha',
+            type=int,
+            default=24,
+            help='Reverifica só documentos conferidos há mais de N horas (padrão: 24; 0 = todos).',
+        )
+        parser.add_argument(
+            '--lote',
+            type=int,
+            default=200,
+            help='Quantidade de empresas lidas do banco por vez (padrão: 200).',
+        )
+
+    def handle(self, *args, **options):
+        empresas = EmpresaProfile.objects.filter(
+            Q(documento_cnpj__gt='') | Q(documento_contrato_social__gt='') | Q(documento_alvara__gt='')
+        )
+        if options['desatualizados_ha']:
+            limite = timezone.now() - timedelta(hours=options['desatualizados_ha'])
+            # Empresas com algum documento sem metadados ou com verificação antiga
+            antigos = MetadadosDocumento.objects.filter(empresa=OuterRef('pk'), verificado_em__lt=limite)
+            pendentes = Exists(antigos)
+            for campo, _rotulo in DOCUMENTOS_EMPRESA:
+                metadados = MetadadosDocumento.objects.filter(empresa=OuterRef('pk'), campo=campo)
+                pendentes |= Q(**{f'{campo}__gt': ''}) & ~Exists(metadados)
+            empresas = empresas.filter(pendentes)
+
+        verificadas = 0
+        ausentes = 0
+        for perfil in empresas.order_by('pk').iterator(chunk_size=options['lote']):
+            faltando = verificar_documentos(perfil)
+            verificadas += 1
+            for campo in faltando:
+                ausentes += 1
+                self.stdout.write(self.style.WARNING(f'Empresa {perfil.pk}: arquivo de {campo} não encontrado.'))
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{verificadas} empresa(s) verificada(s); {ausentes} documento(s) ausente(s) no storage.'
+        ))
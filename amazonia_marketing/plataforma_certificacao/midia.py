@@ -0,0 +1,143 @@
+"""
+Reconciliação entre os arquivos de mídia e as colunas FileField do banco.
+
+Dois tipos de inconsistência:
+- referência quebrada: a linha aponta para um arquivo que não existe no storage;
+- arquivo órfão: o arquivo existe no storage mas nenhuma linha aponta para ele.
+
+Tudo é feito em fluxo (generators) e em lotes: o banco é lido com iterator()
+e os arquivos são conferidos contra o banco em grupos de tamanho fixo, então
+a memória usada não cresce com o volume de mídia.
+"""
+
+import os
+from datetime import datetime, timedelta
+
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
+
+from .armazenamento import documento_em_uso, liberar_documento
+from .models import Certificacoes, EmpresaProfile, MetadadosDocumento
+
+
+# (pasta no storage, model, campos FileField que apontam para ela)
+ALVOS = [
+    ('certificacoes', Certificacoes, ['documento', 'documento_2', 'documento_3']),
+    ('empresas/documentos', EmpresaProfile, ['documento_contrato_social', 'documento_cnpj', 'documento_alvara']),
+]
+
+PASTA_QUARENTENA = 'orfaos'
+TAMANHO_LOTE = 500
+IDADE_MINIMA_ORFAO = timedelta(hours=1)
+
+
+def _lotes(itens, tamanho):
+    lote = []
+    for item in itens:
+        lote.append(item)
+        if len(lote) >= tamanho:
+            yield lote
+            lote = []
+    if lote:
+        yield lote
+
+
+def listar_arquivos(pasta, storage=default_storage):
+    """
+    Nomes (relativos ao storage) de todos os arquivos sob a pasta, em fluxo.
+    No FileSystemStorage usa os.scandir (não monta a lista do diretório inteiro);
+    em outros backends cai no listdir() do storage.
+    """
+    try:
+        raiz = storage.path(pasta)
+    except NotImplementedError:
+        raiz = None
+
+    if raiz is not None:
+        if not os.path.isdir(raiz):
+            return
+        pendentes = [raiz]
+        while pendentes:
+            atual = pendentes.pop()
+            with os.scandir(atual) as entradas:
+                for entrada in entradas:
+                    if entrada.is_dir(follow_symlinks=False):
+                        pendentes.append(entrada.path)
+                    elif entrada.is_file(follow_symlinks=False):
+                        relativo = os.path.relpath(entrada.path, storage.location)
+                        yield relativo.replace(os.sep, '/')
+        return
+
+    diretorios, arquivos = storage.listdir(pasta)
+    for nome in arquivos:
+        yield f'{pasta}/{nome}'
+    for diretorio in diretorios:
+        yield from listar_arquivos(f'{pasta}/{diretorio}', storage)
+
+
+def referencias_quebradas(tamanho_lote=TAMANHO_LOTE, storage=default_storage):
+    """Gera (model, pk, campo, nome) para cada FileField que aponta para arquivo inexistente."""
+    for _pasta, model, campos in ALVOS:
+        linhas = model.objects.order_by('pk').values_list('pk', *campos)
+        for linha in linhas.iterator(chunk_size=tamanho_lote):
+            pk, nomes = linha[0], linha[1:]
+            for campo, nome in zip(campos, nomes):
+                if nome and not storage.exists(nome):
+                    yield model, pk, campo, nome
+
+
+def arquivos_orfaos(tamanho_lote=TAMANHO_LOTE, storage=default_storage, idade_minima=IDADE_MINIMA_ORFAO):
+    """
+    Gera o nome de cada arquivo das pastas de documentos que nenhuma linha referencia.
+    Arquivos mais novos que idade_minima são ignorados: num upload o arquivo é
+    gravado antes da linha que aponta para ele.
+    """
+    limite = timezone.now() - idade_minima
+    for pasta, model, campos in ALVOS:
+        for lote in _lotes(listar_arquivos(pasta, storage), tamanho_lote):
+            referenciados = set()
+            for campo in campos:
+                referenciados.update(
+                    model.objects.filter(**{f'{campo}__in': lote}).values_list(campo, flat=True)
+                )
+            for nome in lote:
+                if nome not in referenciados and storage.get_modified_time(nome) < limite:
+                    yield nome
+
+
+def campo_aceita_vazio(model, campo):
+    return model._meta.get_field(campo).null
+
+
+def limpar_referencia(model, pk, campo):
+    """
+    Remove a referência quebrada (campo passa a NULL) e libera a referência
+    contada no BlobDocumento, como os signals fazem ao trocar o documento
+    (o update() não dispara signals).
+    Retorna False se o campo é obrigatório e precisa de correção manual.
+    """
+    if not campo_aceita_vazio(model, campo):
+        return False
+    with transaction.atomic():
+        nome = model.objects.filter(pk=pk).values_list(campo, flat=True).first()
+        model.objects.filter(pk=pk).update(**{campo: None})
+        if model is EmpresaProfile:
+            MetadadosDocumento.objects.filter(empresa_id=pk, campo=campo).delete()
+        liberar_documento(nome)
+    return True
+
+
+def mover_para_quarentena(nome, storage=default_storage, marca=None):
+    """
+    Move um arquivo órfão para orfaos/<data>/..., em vez de apagá-lo de vez.
+    Retorna o novo nome no storage, ou None se o arquivo ainda tem referências
+    contadas em BlobDocumento (documento deduplicado): fica onde está.
+    """
+    if documento_em_uso(nome):
+        return None
+    marca = marca or datetime.now().strftime('%Y%m%d')
+    with storage.open(nome, 'rb') as conteudo:
+        novo_nome = storage.save(f'{PASTA_QUARENTENA}/{marca}/{nome}', conteudo)
+    storage.delete(nome)
+    return novo_nome
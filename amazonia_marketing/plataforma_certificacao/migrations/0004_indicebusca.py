@@ -0,0 +1,29 @@
+# Generated by Django 5.2.10 on 2026-10-18 01:15
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('plataforma_certificacao', '0003_alter_empresaprofile_cnpj'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IndiceBusca',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('termo', models.CharField(max_length=60, verbose_name='Termo')),
+                ('peso', models.FloatField(default=1, verbose_name='Peso')),
+                ('produto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='termos_busca', to='plataforma_certificacao.produtos', verbose_name='Produto')),
+            ],
+            options={
+                'verbose_name': 'Termo do Índice de Busca',
+                'verbose_name_plural': 'Índice de Busca',
+                'db_table': 'IndiceBusca',
+                'unique_together': {('termo', 'produto')},
+            },
+        ),
+    ]
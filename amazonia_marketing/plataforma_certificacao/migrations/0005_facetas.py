@@ -0,0 +1,62 @@
+# Generated by Django 5.2.10 on 2026-10-18 01:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('plataforma_certificacao', '0004_indicebusca'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ContagemFaceta',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('faceta', models.CharField(max_length=20, verbose_name='Faceta')),
+                ('valor', models.CharField(max_length=20, verbose_name='Valor')),
+                ('total', models.IntegerField(default=0, verbose_name='Total de Produtos')),
+            ],
+            options={
+                'verbose_name': 'Contagem de Faceta',
+                'verbose_name_plural': 'Contagens de Facetas',
+                'db_table': 'ContagemFaceta',
+            },
+        ),
+        migrations.CreateModel(
+            name='FacetaProduto',
+            fields=[
+                ('id_produto', models.IntegerField(primary_key=True, serialize=False, verbose_name='Produto')),
+                ('estado', models.CharField(blank=True, max_length=2, null=True, verbose_name='Estado (UF)')),
+                ('certificado', models.CharField(blank=True, max_length=3, null=True, verbose_name='Certificado')),
+                ('faixa_preco', models.CharField(blank=True, max_length=20, null=True, verbose_name='Faixa de Preço')),
+                ('produtor', models.CharField(blank=True, max_length=20, null=True, verbose_name='Produtor')),
+            ],
+            options={
+                'verbose_name': 'Faceta do Produto',
+                'verbose_name_plural': 'Facetas dos Produtos',
+                'db_table': 'FacetaProduto',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='produtorprofile',
+            index=models.Index(fields=['estado'], name='ProdutorPro_estado_165804_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='produtos',
+            index=models.Index(fields=['status_estoque', '-data_criacao', '-id_produto'], name='produtos_vitrine_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='produtos',
+            index=models.Index(fields=['status_estoque', 'preco'], name='produtos_estoque_preco_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='produtos',
+            index=models.Index(fields=['usuario', 'status_estoque', '-data_criacao'], name='produtos_produtor_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='contagemfaceta',
+            unique_together={('faceta', 'valor')},
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.10 on 2026-10-18 01:21
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def popular_contadores(apps, schema_editor):
+    """Contagem inicial a partir dos registros já existentes."""
+    ContadorStatus = apps.get_model('plataforma_certificacao', 'ContadorStatus')
+    origens = [
+        ('certificacao', apps.get_model('plataforma_certificacao', 'Certificacoes'), 'status_certificacao'),
+        ('empresa', apps.get_model('plataforma_certificacao', 'EmpresaProfile'), 'status_verificacao'),
+    ]
+    for entidade, model, campo in origens:
+        totais = model.objects.order_by().values(campo).annotate(total=Count('pk'))
+        ContadorStatus.objects.bulk_create([
+            ContadorStatus(entidade=entidade, status=linha[campo], total=linha['total'])
+            for linha in totais if linha[campo]
+        ])
+
+
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('plataforma_certificacao', '0005_facetas'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ContadorStatus',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('entidade', models.CharField(choices=[('certificacao', 'Certificação'), ('empresa', 'Empresa')], max_length=20, verbose_name='Entidade')),
+                ('status', models.CharField(max_length=20, verbose_name='Status')),
+                ('total', models.IntegerField(default=0, verbose_name='Total')),
+            ],
+            options={
+                'verbose_name': 'Contador de Status',
+                'verbose_name_plural': 'Contadores de Status',
+                'db_table': 'ContadorStatus',
+                'unique_together': {('entidade', 'status')},
+            },
+        ),
+        migrations.RunPython(popular_contadores, migrations.RunPython.noop),
+    ]
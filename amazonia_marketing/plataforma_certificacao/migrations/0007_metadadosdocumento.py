@@ -0,0 +1,34 @@
+# Generated by Django 5.2.10 on 2026-10-18 01:24
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('plataforma_certificacao', '0006_contadorstatus'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MetadadosDocumento',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('campo', models.CharField(choices=[('documento_cnpj', 'Comprovante de CNPJ'), ('documento_contrato_social', 'Contrato Social'), ('documento_alvara', 'Alvará de Funcionamento')], max_length=30, verbose_name='Documento')),
+                ('nome_arquivo', models.CharField(max_length=255, verbose_name='Arquivo')),
+                ('tamanho', models.BigIntegerField(blank=True, null=True, verbose_name='Tamanho (bytes)')),
+                ('hash_sha256', models.CharField(blank=True, max_length=64, verbose_name='Hash SHA-256')),
+                ('existe', models.BooleanField(default=True, verbose_name='Arquivo Existe')),
+                ('verificado_em', models.DateTimeField(verbose_name='Verificado em')),
+                ('empresa', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='metadados_documentos', to='plataforma_certificacao.empresaprofile', verbose_name='Empresa')),
+            ],
+            options={
+                'verbose_name': 'Metadados de Documento',
+                'verbose_name_plural': 'Metadados de Documentos',
+                'db_table': 'MetadadosDocumento',
+                'indexes': [models.Index(fields=['verificado_em'], name='MetadadosDo_verific_584370_idx')],
+                'unique_together': {('empresa', 'campo')},
+            },
+        ),
+    ]
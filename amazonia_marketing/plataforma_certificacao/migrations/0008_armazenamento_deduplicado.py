@@ -0,0 +1,60 @@
+# Generated by Django 5.2.10 on 2026-10-18 01:28
+
+import plataforma_certificacao.armazenamento
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('plataforma_certificacao', '0007_metadadosdocumento'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BlobDocumento',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nome', models.CharField(max_length=255, unique=True, verbose_name='Arquivo')),
+                ('sha256', models.CharField(db_index=True, max_length=64, verbose_name='Hash SHA-256')),
+                ('tamanho', models.BigIntegerField(verbose_name='Tamanho (bytes)')),
+                ('referencias', models.PositiveIntegerField(default=0, verbose_name='Referências')),
+                ('criado_em', models.DateTimeField(auto_now_add=True, verbose_name='Criado em')),
+            ],
+            options={
+                'verbose_name': 'Blob de Documento',
+                'verbose_name_plural': 'Blobs de Documentos',
+                'db_table': 'BlobDocumento',
+            },
+        ),
+        migrations.AlterField(
+            model_name='certificacoes',
+            name='documento',
+            field=models.FileField(max_length=255, storage=plataforma_certificacao.armazenamento.armazenamento_documentos, upload_to='certificacoes/', verbose_name='Documento Principal'),
+        ),
+        migrations.AlterField(
+            model_name='certificacoes',
+            name='documento_2',
+            field=models.FileField(blank=True, max_length=255, null=True, storage=plataforma_certificacao.armazenamento.armazenamento_documentos, upload_to='certificacoes/', verbose_name='Documento Adicional 1'),
+        ),
+        migrations.AlterField(
+            model_name='certificacoes',
+            name='documento_3',
+            field=models.FileField(blank=True, max_length=255, null=True, storage=plataforma_certificacao.armazenamento.armazenamento_documentos, upload_to='certificacoes/', verbose_name='Documento Adicional 2'),
+        ),
+        migrations.AlterField(
+            model_name='empresaprofile',
+            name='documento_alvara',
+            field=models.FileField(blank=True, null=True, storage=plataforma_certificacao.armazenamento.armazenamento_documentos, upload_to='empresas/documentos/', verbose_name='Alvará de Funcionamento'),
+        ),
+        migrations.AlterField(
+            model_name='empresaprofile',
+            name='documento_cnpj',
+            field=models.FileField(blank=True, null=True, storage=plataforma_certificacao.armazenamento.armazenamento_documentos, upload_to='empresas/documentos/', verbose_name='Comprovante de CNPJ'),
+        ),
+        migrations.AlterField(
+            model_name='empresaprofile',
+            name='documento_contrato_social',
+            field=models.FileField(blank=True, null=True, storage=plataforma_certificacao.armazenamento.armazenamento_documentos, upload_to='empresas/documentos/', verbose_name='Contrato Social'),
+        ),
+    ]
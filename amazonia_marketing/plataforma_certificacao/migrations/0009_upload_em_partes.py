@@ -0,0 +1,37 @@
+# Generated by Django 5.2.10 on 2026-10-18 01:32
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('plataforma_certificacao', '0008_armazenamento_deduplicado'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UploadEmPartes',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('nome_arquivo', models.CharField(max_length=255, verbose_name='Nome do Arquivo')),
+                ('tamanho_total', models.BigIntegerField(verbose_name='Tamanho Total (bytes)')),
+                ('tamanho_parte', models.PositiveIntegerField(verbose_name='Tamanho da Parte (bytes)')),
+                ('tipo_mime', models.CharField(blank=True, max_length=100, verbose_name='Tipo Detectado')),
+                ('status', models.CharField(choices=[('recebendo', 'Recebendo partes'), ('concluido', 'Concluído')], default='recebendo', max_length=10, verbose_name='Status')),
+                ('criado_em', models.DateTimeField(auto_now_add=True, verbose_name='Criado em')),
+                ('atualizado_em', models.DateTimeField(auto_now=True, verbose_name='Atualizado em')),
+                ('certificacao', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='plataforma_certificacao.certificacoes', verbose_name='Certificação')),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='uploads_em_partes', to=settings.AUTH_USER_MODEL, verbose_name='Usuário')),
+            ],
+            options={
+                'verbose_name': 'Upload em Partes',
+                'verbose_name_plural': 'Uploads em Partes',
+                'db_table': 'UploadEmPartes',
+                'indexes': [models.Index(fields=['status', 'atualizado_em'], name='UploadEmPar_status_adbc39_idx')],
+            },
+        ),
+    ]
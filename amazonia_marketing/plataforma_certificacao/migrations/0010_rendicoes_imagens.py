@@ -0,0 +1,23 @@
+# Generated by Django 5.2.10 on 2026-10-18 01:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('plataforma_certificacao', '0009_upload_em_partes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='empresaprofile',
+            name='logo_rendicoes',
+            field=models.JSONField(blank=True, default=dict, editable=False, help_text='Versões reduzidas (WebP/JPEG) geradas por imagens.py', verbose_name='Rendições do Logo'),
+        ),
+        migrations.AddField(
+            model_name='produtos',
+            name='imagem_rendicoes',
+            field=models.JSONField(blank=True, default=dict, editable=False, help_text='Versões reduzidas (WebP/JPEG) geradas por imagens.py', verbose_name='Rendições da Imagem'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.10 on 2026-10-18 01:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('plataforma_certificacao', '0011_tarefa'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='empresaprofile',
+            name='consulta_receita_em',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Consultado na Receita em'),
+        ),
+        migrations.AddField(
+            model_name='empresaprofile',
+            name='situacao_receita',
+            field=models.CharField(blank=True, default='', editable=False, max_length=30, verbose_name='Situação na Receita Federal'),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.10 on 2026-10-18 01:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('plataforma_certificacao', '0012_empresa_situacao_receita'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pedido',
+            name='chave_idempotencia',
+            field=models.CharField(blank=True, editable=False, max_length=64, null=True, verbose_name='Chave de idempotência'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='pedido',
+            unique_together={('usuario', 'chave_idempotencia')},
+        ),
+    ]
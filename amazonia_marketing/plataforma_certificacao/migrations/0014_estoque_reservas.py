@@ -0,0 +1,37 @@
+# Generated by Django 5.2.10 on 2026-10-18 01:50
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('plataforma_certificacao', '0013_pedido_chave_idempotencia'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='produtos',
+            name='quantidade_estoque',
+            field=models.PositiveIntegerField(blank=True, help_text='Unidades disponíveis para venda. Deixe vazio para não limitar.', null=True, verbose_name='Quantidade em Estoque'),
+        ),
+        migrations.CreateModel(
+            name='ReservaEstoque',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantidade', models.PositiveIntegerField(verbose_name='Quantidade')),
+                ('status', models.CharField(choices=[('ativa', 'Ativa'), ('confirmada', 'Confirmada'), ('liberada', 'Liberada')], default='ativa', max_length=10, verbose_name='Status')),
+                ('expira_em', models.DateTimeField(verbose_name='Expira em')),
+                ('criada_em', models.DateTimeField(auto_now_add=True, verbose_name='Criada em')),
+                ('pedido', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservas', to='plataforma_certificacao.pedido', verbose_name='Pedido')),
+                ('produto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservas', to='plataforma_certificacao.produtos', verbose_name='Produto')),
+            ],
+            options={
+                'verbose_name': 'Reserva de Estoque',
+                'verbose_name_plural': 'Reservas de Estoque',
+                'db_table': 'ReservaEstoque',
+                'indexes': [models.Index(fields=['status', 'expira_em'], name='reserva_vencimento_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.10 on 2026-10-18 02:16
+
+from django.db import migrations
+
+
+def popular_indice_busca(apps, schema_editor):
+    """Indexa os produtos cadastrados antes do índice existir (0004 cria a tabela vazia)."""
+    from plataforma_certificacao.busca import reindexar_todos
+
+    reindexar_todos(apps=apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('plataforma_certificacao', '0014_estoque_reservas'),
+    ]
+
+    operations = [
+        migrations.RunPython(popular_indice_busca, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.10 on 2026-10-18 02:31
+
+from django.db import migrations
+
+
+def popular_facetas(apps, schema_editor):
+    """Contagens dos produtos cadastrados antes das facetas existirem (0005 cria as tabelas vazias)."""
+    from plataforma_certificacao.facetas import recalcular_todas
+
+    recalcular_todas(apps=apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('plataforma_certificacao', '0015_popular_indice_busca'),
+    ]
+
+    operations = [
+        migrations.RunPython(popular_facetas, migrations.RunPython.noop),
+    ]
@@ -2,10 +2,15 @@
 # Arquitetura: Herança Multi-Tabela com UsuarioBase como base
 # Padrão: Cada tipo de usuário (Produtor, Empresa, Admin) herda de UsuarioBase
 
+import uuid
+
 from django.db import models
 from django.contrib.auth.models import AbstractBaseUser, PermissionsMixin, BaseUserManager
 from django.conf import settings
 from django.core.validators import RegexValidator, EmailValidator
+from django.utils import timezone
+
+from .armazenamento import armazenamento_documentos
 
 
 # ============================================================================
@@ -229,6 +234,9 @@ class ProdutorProfile(models.Model):
         db_table = 'ProdutorProfile'
         verbose_name = 'Perfil de Produtor'
         verbose_name_plural = 'Perfis de Produtores'
+        indexes = [
+            models.Index(fields=['estado']),
+        ]
     
     def __str__(self):
         return f"Perfil: {self.usuario.nome}"
@@ -287,21 +295,39 @@ class EmpresaProfile(models.Model):
         null=True,
         verbose_name='Inscrição Estadual'
     )
+    # Preenchidos pela consulta à Receita; vazios enquanto a verificação
+    # está pendente (CNPJ aceito em modo degradado, ver cnpj.py)
+    situacao_receita = models.CharField(
+        max_length=30,
+        blank=True,
+        default='',
+        editable=False,
+        verbose_name='Situação na Receita Federal',
+    )
+    consulta_receita_em = models.DateTimeField(
+        null=True,
+        blank=True,
+        editable=False,
+        verbose_name='Consultado na Receita em',
+    )
     
     documento_contrato_social = models.FileField(
         upload_to='empresas/documentos/',
+        storage=armazenamento_documentos,
         blank=True, 
         null=True,
         verbose_name='Contrato Social',
     )
     documento_cnpj = models.FileField(
         upload_to='empresas/documentos/',
+        storage=armazenamento_documentos,
         blank=True, 
         null=True,
         verbose_name='Comprovante de CNPJ',
     )
     documento_alvara = models.FileField(
         upload_to='empresas/documentos/',
+        storage=armazenamento_documentos,
         blank=True, 
         null=True,
         verbose_name='Alvará de Funcionamento',
@@ -380,6 +406,13 @@ class EmpresaProfile(models.Model):
         null=True,
         verbose_name='Logo',
     )
+    logo_rendicoes = models.JSONField(
+        default=dict,
+        blank=True,
+        editable=False,
+        verbose_name='Rendições do Logo',
+        help_text='Versões reduzidas (WebP/JPEG) geradas por imagens.py',
+    )
     
     data_criacao = models.DateTimeField(auto_now_add=True, verbose_name='Criado em')
     data_atualizacao = models.DateTimeField(auto_now=True, verbose_name='Atualizado em')
@@ -411,6 +444,44 @@ class EmpresaProfile(models.Model):
 EmpresaProdutor = EmpresaProfile
 
 
+class MetadadosDocumento(models.Model):
+    """
+    Metadados de um documento da empresa (tamanho, hash, existência no storage).
+    Permite ao dashboard da empresa mostrar a situação da documentação
+    sem acessar o storage a cada requisição (ver documentos.py).
+    """
+    CAMPO_CHOICES = [
+        ('documento_cnpj', 'Comprovante de CNPJ'),
+        ('documento_contrato_social', 'Contrato Social'),
+        ('documento_alvara', 'Alvará de Funcionamento'),
+    ]
+
+    empresa = models.ForeignKey(
+        EmpresaProfile,
+        on_delete=models.CASCADE,
+        related_name='metadados_documentos',
+        verbose_name='Empresa'
+    )
+    campo = models.CharField(max_length=30, choices=CAMPO_CHOICES, verbose_name='Documento')
+    nome_arquivo = models.CharField(max_length=255, verbose_name='Arquivo')
+    tamanho = models.BigIntegerField(blank=True, null=True, verbose_name='Tamanho (bytes)')
+    hash_sha256 = models.CharField(max_length=64, blank=True, verbose_name='Hash SHA-256')
+    existe = models.BooleanField(default=True, verbose_name='Arquivo Existe')
+    verificado_em = models.DateTimeField(verbose_name='Verificado em')
+
+    class Meta:
+        db_table = 'MetadadosDocumento'
+        verbose_name = 'Metadados de Documento'
+        verbose_name_plural = 'Metadados de Documentos'
+        unique_together = ['empresa', 'campo']
+        indexes = [
+            models.Index(fields=['verificado_em']),
+        ]
+
+    def __str__(self):
+        return f"{self.get_campo_display()} - {self.nome_arquivo}"
+
+
 class AdminAuditorProfile(models.Model):
     """
     Perfil especializado para administradores/auditores.
@@ -510,6 +581,14 @@ class Produtos(models.Model):
         null=True,
         verbose_name='Status de Estoque'
     )
+    # Vazio: sem controle de quantidade. Preenchido: o checkout reserva unidades
+    # e recusa o pedido quando não há o bastante (estoque.py)
+    quantidade_estoque = models.PositiveIntegerField(
+        blank=True,
+        null=True,
+        verbose_name='Quantidade em Estoque',
+        help_text='Unidades disponíveis para venda. Deixe vazio para não limitar.',
+    )
     usuario = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
@@ -523,6 +602,13 @@ class Produtos(models.Model):
         null=True,
         verbose_name='Imagem',
     )
+    imagem_rendicoes = models.JSONField(
+        default=dict,
+        blank=True,
+        editable=False,
+        verbose_name='Rendições da Imagem',
+        help_text='Versões reduzidas (WebP/JPEG) geradas por imagens.py',
+    )
     
     data_criacao = models.DateTimeField(
         auto_now_add=True,
@@ -545,11 +631,31 @@ class Produtos(models.Model):
         indexes = [
             models.Index(fields=['usuario']),
             models.Index(fields=['status_estoque']),
+            # Índices compostos da vitrine filtrada (facetas): filtro + ordenação por cursor
+            models.Index(fields=['status_estoque', '-data_criacao', '-id_produto'], name='produtos_vitrine_idx'),
+            models.Index(fields=['status_estoque', 'preco'], name='produtos_estoque_preco_idx'),
+            models.Index(fields=['usuario', 'status_estoque', '-data_criacao'], name='produtos_produtor_idx'),
         ]
     
     def __str__(self):
         return self.nome
     
+    @staticmethod
+    def filtro_a_venda(prefixo=''):
+        """
+        Q dos produtos à venda: disponíveis e, com quantidade controlada, com unidades.
+        As reservas do checkout baixam quantidade_estoque com UPDATE (sem save()),
+        então status_estoque sozinho não indica que o produto esgotou.
+        """
+        return models.Q(**{f'{prefixo}status_estoque': 'disponivel'}) & (
+            models.Q(**{f'{prefixo}quantidade_estoque__isnull': True})
+            | models.Q(**{f'{prefixo}quantidade_estoque__gt': 0})
+        )
+    
+    @property
+    def a_venda(self):
+        return self.status_estoque == 'disponivel' and self.quantidade_estoque != 0
+    
     def tem_certificacao_aprovada(self):
         return self.certificacoes.filter(status_certificacao='aprovado').exists()
     
@@ -588,11 +694,13 @@ class Certificacoes(models.Model):
     
     documento = models.FileField(
         upload_to='certificacoes/',
+        storage=armazenamento_documentos,
         max_length=255,
         verbose_name='Documento Principal',
     )
     documento_2 = models.FileField(
         upload_to='certificacoes/',
+        storage=armazenamento_documentos,
         max_length=255,
         blank=True,
         null=True,
@@ -600,6 +708,7 @@ class Certificacoes(models.Model):
     )
     documento_3 = models.FileField(
         upload_to='certificacoes/',
+        storage=armazenamento_documentos,
         max_length=255,
         blank=True,
         null=True,
@@ -685,6 +794,222 @@ class Marketplace(models.Model):
         return f"Anúncio {self.id_anuncio} - {self.plataforma}"
 
 
+# ============================================================================
+# MODELS DE ARMAZENAMENTO
+# ============================================================================
+
+class BlobDocumento(models.Model):
+    """
+    Arquivo de documento gravado uma única vez, nomeado pelo SHA-256 do conteúdo.
+    referencias = quantas colunas de documento apontam para ele (ver armazenamento.py).
+    """
+    nome = models.CharField(max_length=255, unique=True, verbose_name='Arquivo')
+    sha256 = models.CharField(max_length=64, db_index=True, verbose_name='Hash SHA-256')
+    tamanho = models.BigIntegerField(verbose_name='Tamanho (bytes)')
+    referencias = models.PositiveIntegerField(default=0, verbose_name='Referências')
+    criado_em = models.DateTimeField(auto_now_add=True, verbose_name='Criado em')
+
+    class Meta:
+        db_table = 'BlobDocumento'
+        verbose_name = 'Blob de Documento'
+        verbose_name_plural = 'Blobs de Documentos'
+
+    def __str__(self):
+        return f"{self.nome} ({self.referencias} ref.)"
+
+
+class UploadEmPartes(models.Model):
+    """
+    Sessão de upload em partes (retomável) de um documento de certificação.
+    As partes ficam em tmp_uploads/partes/<id>/ até a conclusão (ver uploads.py).
+    """
+    STATUS_CHOICES = [
+        ('recebendo', 'Recebendo partes'),
+        ('concluido', 'Concluído'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    usuario = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='uploads_em_partes',
+        verbose_name='Usuário',
+    )
+    nome_arquivo = models.CharField(max_length=255, verbose_name='Nome do Arquivo')
+    tamanho_total = models.BigIntegerField(verbose_name='Tamanho Total (bytes)')
+    tamanho_parte = models.PositiveIntegerField(verbose_name='Tamanho da Parte (bytes)')
+    tipo_mime = models.CharField(max_length=100, blank=True, verbose_name='Tipo Detectado')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='recebendo', verbose_name='Status')
+    certificacao = models.ForeignKey(
+        'Certificacoes',
+        on_delete=models.SET_NULL,
+        blank=True,
+        null=True,
+        related_name='+',
+        verbose_name='Certificação',
+    )
+    criado_em = models.DateTimeField(auto_now_add=True, verbose_name='Criado em')
+    atualizado_em = models.DateTimeField(auto_now=True, verbose_name='Atualizado em')
+
+    class Meta:
+        db_table = 'UploadEmPartes'
+        verbose_name = 'Upload em Partes'
+        verbose_name_plural = 'Uploads em Partes'
+        indexes = [
+            models.Index(fields=['status', 'atualizado_em']),
+        ]
+
+    def __str__(self):
+        return f"{self.nome_arquivo} ({self.status})"
+
+    @property
+    def total_partes(self):
+        return -(-self.tamanho_total // self.tamanho_parte)
+
+
+# ============================================================================
+# MODELS DE BUSCA
+# ============================================================================
+
+class IndiceBusca(models.Model):
+    """
+    Índice invertido da busca de produtos.
+    Cada linha liga um termo normalizado (minúsculo, sem acento) a um produto,
+    com o peso acumulado dos campos onde o termo aparece.
+    Mantido pelos signals e reconstruído com: python manage.py reindexar_busca
+    """
+    termo = models.CharField(max_length=60, verbose_name='Termo')
+    produto = models.ForeignKey(
+        'Produtos',
+        on_delete=models.CASCADE,
+        related_name='termos_busca',
+        verbose_name='Produto',
+    )
+    peso = models.FloatField(default=1, verbose_name='Peso')
+
+    class Meta:
+        db_table = 'IndiceBusca'
+        verbose_name = 'Termo do Índice de Busca'
+        verbose_name_plural = 'Índice de Busca'
+        unique_together = ['termo', 'produto']
+
+    def __str__(self):
+        return f"{self.termo} -> {self.produto_id} ({self.peso})"
+
+
+class FacetaProduto(models.Model):
+    """
+    Foto das facetas de um produto disponível na vitrine (estado, selo, faixa de preço, produtor).
+    Guarda os valores já contados em ContagemFaceta para que cada alteração
+    ajuste apenas as diferenças. Sem FK de propósito: precisa sobreviver à
+    exclusão do produto até os contadores serem decrementados.
+    """
+    id_produto = models.IntegerField(primary_key=True, verbose_name='Produto')
+    estado = models.CharField(max_length=2, blank=True, null=True, verbose_name='Estado (UF)')
+    certificado = models.CharField(max_length=3, blank=True, null=True, verbose_name='Certificado')
+    faixa_preco = models.CharField(max_length=20, blank=True, null=True, verbose_name='Faixa de Preço')
+    produtor = models.CharField(max_length=20, blank=True, null=True, verbose_name='Produtor')
+
+    class Meta:
+        db_table = 'FacetaProduto'
+        verbose_name = 'Faceta do Produto'
+        verbose_name_plural = 'Facetas dos Produtos'
+
+    def __str__(self):
+        return f"Facetas do produto {self.id_produto}"
+
+
+class ContagemFaceta(models.Model):
+    """
+    Contagem pré-calculada de produtos disponíveis por valor de faceta.
+    Ex.: (estado, PA) -> 120, (certificado, sim) -> 45.
+    Mantida incrementalmente pelos signals; recalculável com: python manage.py recalcular_facetas
+    """
+    faceta = models.CharField(max_length=20, verbose_name='Faceta')
+    valor = models.CharField(max_length=20, verbose_name='Valor')
+    total = models.IntegerField(default=0, verbose_name='Total de Produtos')
+
+    class Meta:
+        db_table = 'ContagemFaceta'
+        verbose_name = 'Contagem de Faceta'
+        verbose_name_plural = 'Contagens de Facetas'
+        unique_together = ['faceta', 'valor']
+
+    def __str__(self):
+        return f"{self.faceta}={self.valor}: {self.total}"
+
+
+# ============================================================================
+# MODELS DE CONTADORES (DASHBOARD DO AUDITOR)
+# ============================================================================
+
+class ContadorStatus(models.Model):
+    """
+    Contador desnormalizado de registros por status.
+    Ex.: (certificacao, pendente) -> 12, (empresa, verificado) -> 30.
+    Evita COUNT nas tabelas de certificações e empresas a cada acesso do auditor.
+    Mantido por contadores.py; reconstruível com: python manage.py recalcular_contadores
+    """
+    ENTIDADE_CHOICES = [
+        ('certificacao', 'Certificação'),
+        ('empresa', 'Empresa'),
+    ]
+
+    entidade = models.CharField(max_length=20, choices=ENTIDADE_CHOICES, verbose_name='Entidade')
+    status = models.CharField(max_length=20, verbose_name='Status')
+    total = models.IntegerField(default=0, verbose_name='Total')
+
+    class Meta:
+        db_table = 'ContadorStatus'
+        verbose_name = 'Contador de Status'
+        verbose_name_plural = 'Contadores de Status'
+        unique_together = ['entidade', 'status']
+
+    def __str__(self):
+        return f"{self.entidade}/{self.status}: {self.total}"
+
+
+# ============================================================================
+# MODELS DE TAREFAS EM SEGUNDO PLANO
+# ============================================================================
+
+class Tarefa(models.Model):
+    """
+    Tarefa da fila em segundo plano (ver tarefas.py), executada por:
+    python manage.py run_worker
+    Tarefas que esgotam as tentativas ficam com status 'morta' para análise.
+    """
+    STATUS_CHOICES = [
+        ('pendente', 'Pendente'),
+        ('executando', 'Executando'),
+        ('concluida', 'Concluída'),
+        ('morta', 'Morta (tentativas esgotadas)'),
+    ]
+
+    nome = models.CharField(max_length=100, verbose_name='Tarefa')
+    argumentos = models.JSONField(default=dict, blank=True, verbose_name='Argumentos')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pendente', verbose_name='Status')
+    tentativas = models.PositiveIntegerField(default=0, verbose_name='Tentativas')
+    max_tentativas = models.PositiveIntegerField(default=5, verbose_name='Máximo de Tentativas')
+    executar_em = models.DateTimeField(default=timezone.now, verbose_name='Executar a partir de')
+    iniciada_em = models.DateTimeField(blank=True, null=True, verbose_name='Iniciada em')
+    concluida_em = models.DateTimeField(blank=True, null=True, verbose_name='Concluída em')
+    worker = models.CharField(max_length=100, blank=True, verbose_name='Worker')
+    ultimo_erro = models.TextField(blank=True, verbose_name='Último Erro')
+    criada_em = models.DateTimeField(auto_now_add=True, verbose_name='Criada em')
+
+    class Meta:
+        db_table = 'Tarefa'
+        verbose_name = 'Tarefa'
+        verbose_name_plural = 'Tarefas'
+        indexes = [
+            models.Index(fields=['status', 'executar_em']),
+        ]
+
+    def __str__(self):
+        return f"{self.nome} #{self.pk} ({self.status})"
+
+
 # ============================================================================
 # MODELS DE CARRINHO E PEDIDOS
 # ============================================================================
@@ -712,12 +1037,14 @@ class Carrinho(models.Model):
         return f"Carrinho de {self.usuario.nome}"
     
     def get_total(self):
-        """Calcula o total do carrinho"""
-        return sum(item.get_subtotal() for item in self.itens.all())
+        """Calcula o total do carrinho (no banco, ver carrinho.py)"""
+        from .carrinho import totais
+        return totais(self)['total']
     
     def get_quantidade_itens(self):
-        """Retorna a quantidade total de itens"""
-        return sum(item.quantidade for item in self.itens.all())
+        """Retorna a quantidade total de itens (no banco, ver carrinho.py)"""
+        from .carrinho import totais
+        return totais(self)['quantidade_itens']
 
 
 class ItemCarrinho(models.Model):
@@ -801,11 +1128,21 @@ class Pedido(models.Model):
     
     observacoes = models.TextField(blank=True, null=True)
     
+    # Gerada no formulário de checkout: reenvio do mesmo formulário não duplica o pedido (pedidos.py)
+    chave_idempotencia = models.CharField(
+        max_length=64,
+        blank=True,
+        null=True,
+        editable=False,
+        verbose_name='Chave de idempotência',
+    )
+    
     class Meta:
         db_table = 'Pedidos'
         verbose_name = 'Pedido'
         verbose_name_plural = 'Pedidos'
         ordering = ['-data_pedido']
+        unique_together = ['usuario', 'chave_idempotencia']
     
     def __str__(self):
         return f"Pedido #{self.pk} - {self.usuario.nome}"
@@ -839,6 +1176,48 @@ class ItemPedido(models.Model):
         return f"{self.quantidade}x {self.produto.nome}"
 
 
+class ReservaEstoque(models.Model):
+    """
+    Unidades de um produto separadas para um pedido ainda não pago (estoque.py).
+    Ativa até o pagamento (confirmada) ou até expirar / o pagamento falhar
+    (liberada: as unidades voltam para Produtos.quantidade_estoque).
+    """
+    STATUS_CHOICES = [
+        ('ativa', 'Ativa'),
+        ('confirmada', 'Confirmada'),
+        ('liberada', 'Liberada'),
+    ]
+
+    pedido = models.ForeignKey(
+        Pedido,
+        on_delete=models.CASCADE,
+        related_name='reservas',
+        verbose_name='Pedido',
+    )
+    produto = models.ForeignKey(
+        Produtos,
+        on_delete=models.CASCADE,
+        related_name='reservas',
+        verbose_name='Produto',
+    )
+    quantidade = models.PositiveIntegerField(verbose_name='Quantidade')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='ativa', verbose_name='Status')
+    expira_em = models.DateTimeField(verbose_name='Expira em')
+    criada_em = models.DateTimeField(auto_now_add=True, verbose_name='Criada em')
+
+    class Meta:
+        db_table = 'ReservaEstoque'
+        verbose_name = 'Reserva de Estoque'
+        verbose_name_plural = 'Reservas de Estoque'
+        indexes = [
+            # Varredura das reservas vencidas (liberar_reservas)
+            models.Index(fields=['status', 'expira_em'], name='reserva_vencimento_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.quantidade}x {self.produto_id} - Pedido #{self.pedido_id} ({self.status})"
+
+
 # ============================================================================
 # MODELS LEGADAS (compatibilidade)
 # ============================================================================
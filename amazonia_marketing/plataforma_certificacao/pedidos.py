@@ -0,0 +1,85 @@
+"""
+Fechamento de pedidos a partir do carrinho (view checkout).
+
+fazer_pedido() roda numa única transação, com número fixo de consultas
+(independe da quantidade de itens):
+- trava o carrinho ativo (select_for_update): dois checkouts simultâneos do
+  mesmo carrinho são serializados;
+- total calculado pelo banco (aggregate) e itens gravados num único INSERT
+  (bulk_create);
+- o carrinho é desativado na mesma transação: falha no meio não deixa pedido
+  pela metade nem carrinho já esvaziado;
+- produtos com quantidade controlada têm as unidades reservadas na mesma
+  transação (estoque.py); faltando estoque, nada é gravado (EstoqueInsuficiente).
+
+Idempotência: o formulário de checkout leva uma chave gerada na renderização.
+Reenvio do mesmo formulário (duplo clique, F5, rede instável) devolve o pedido
+já criado com essa chave em vez de criar outro.
+"""
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .carrinho import totais
+from .estoque import reservar
+from .models import Carrinho, ItemPedido, Pedido
+
+
+class CarrinhoVazio(Exception):
+    """Não há carrinho ativo com itens para fechar o pedido."""
+
+
+def _pedido_existente(usuario, chave_idempotencia):
+    if not chave_idempotencia:
+        return None
+    return Pedido.objects.filter(usuario=usuario, chave_idempotencia=chave_idempotencia).first()
+
+
+def fazer_pedido(usuario, chave_idempotencia, frete=0, **dados_entrega):
+    """
+    Cria o Pedido com os itens do carrinho ativo de `usuario` e desativa o carrinho.
+    dados_entrega: campos do Pedido (endereco_entrega, cidade_entrega, ..., observacoes).
+    Retorna (pedido, criado). Levanta CarrinhoVazio se não há o que fechar
+    e estoque.EstoqueInsuficiente se falta algum produto.
+    """
+    try:
+        with transaction.atomic():
+            carrinho = Carrinho.objects.select_for_update().filter(usuario=usuario, ativo=True).first()
+            # Depois da trava: um checkout concorrente com a mesma chave já terminou
+            existente = _pedido_existente(usuario, chave_idempotencia)
+            if existente:
+                return existente, False
+            if carrinho is None:
+                raise CarrinhoVazio()
+
+            itens = list(carrinho.itens.values('produto_id', 'quantidade', 'preco_unitario'))
+            if not itens:
+                raise CarrinhoVazio()
+            subtotal = totais(carrinho)['total']
+
+            pedido = Pedido.objects.create(
+                usuario=usuario,
+                total=subtotal + frete,
+                chave_idempotencia=chave_idempotencia or None,
+                status='pendente',
+                **dados_entrega,
+            )
+            ItemPedido.objects.bulk_create([
+                ItemPedido(
+                    pedido=pedido,
+                    produto_id=item['produto_id'],
+                    quantidade=item['quantidade'],
+                    preco_unitario=item['preco_unitario'],
+                    subtotal=item['quantidade'] * item['preco_unitario'],
+                )
+                for item in itens
+            ])
+            reservar(pedido, itens)
+            Carrinho.objects.filter(pk=carrinho.pk).update(ativo=False, data_atualizacao=timezone.now())
+    except IntegrityError:
+        # Mesma chave gravada por outra transação entre a consulta e o INSERT
+        existente = _pedido_existente(usuario, chave_idempotencia)
+        if existente is None:
+            raise
+        return existente, False
+    return pedido, True
@@ -0,0 +1,215 @@
+"""
+Signals da plataforma.
+Mantém estruturas derivadas (cache da vitrine, índice de busca, contagens de facetas,
+contadores de status, resumo do produtor, referências dos documentos) em dia com
+as gravações no banco.
+"""
+
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, pre_delete, pre_save
+from django.dispatch import receiver
+
+from .models import Produtos, Certificacoes, ProdutorProfile, EmpresaProfile
+from .catalogo import invalidar_catalogo
+from . import busca, contadores, facetas
+from .estatisticas import invalidar_resumo_produtor
+from .armazenamento import liberar_documento
+from .midia import ALVOS
+from .imagens import ALVOS_IMAGEM, agendar_rendicoes, alvo_do_model, rendicoes_atualizadas
+
+
+# ============================================================================
+# CACHE DA VITRINE
+# ============================================================================
+
+@receiver(post_save, sender=Produtos)
+@receiver(post_delete, sender=Produtos)
+@receiver(post_save, sender=Certificacoes)
+@receiver(post_delete, sender=Certificacoes)
+def invalidar_vitrine(sender, **kwargs):
+    """Produto ou selo alterado: a vitrine em cache deixa de valer."""
+    invalidar_catalogo()
+
+
+# ============================================================================
+# ÍNDICE DE BUSCA
+# ============================================================================
+
+@receiver(post_save, sender=Produtos)
+def indexar_produto_salvo(sender, instance, **kwargs):
+    busca.indexar_produto(instance.pk)
+
+
+@receiver(post_save, sender=Certificacoes)
+def indexar_status_certificacao(sender, instance, **kwargs):
+    """O termo "certificado" depende do status das certificações do produto."""
+    busca.indexar_produto(instance.produto_id)
+
+
+@receiver(post_delete, sender=Certificacoes)
+def indexar_certificacao_apagada(sender, instance, **kwargs):
+    """
+    Reindexa após o commit: numa cascata (ex.: exclusão do produtor) o produto
+    pode ser apagado logo depois pelo mesmo collector, e termos gravados agora
+    apontariam para ele (violação de FK). Produto já apagado: nada a indexar.
+    """
+    if _apagado_junto_com_produto(kwargs.get('origin')):
+        # Cascata a partir do próprio produto: os termos dele já foram removidos
+        return
+    produto_id = instance.produto_id
+    transaction.on_commit(lambda: busca.indexar_produto(produto_id))
+
+
+def _apagado_junto_com_produto(origem):
+    """True quando a exclusão começou em um Produto (instância ou queryset)."""
+    modelo = getattr(origem, 'model', None) or type(origem)
+    return modelo is Produtos
+
+
+@receiver(post_save, sender=ProdutorProfile)
+def indexar_localizacao_produtor(sender, instance, **kwargs):
+    """Cidade/estado do produtor fazem parte do índice de todos os seus produtos."""
+    busca.indexar_produtos_do_usuario(instance.usuario_id)
+
+
+# ============================================================================
+# CONTAGENS DE FACETAS
+# ============================================================================
+
+@receiver(post_save, sender=Produtos)
+@receiver(post_delete, sender=Produtos)
+def atualizar_facetas_produto(sender, instance, **kwargs):
+    facetas.atualizar_facetas_produto(instance.pk)
+
+
+@receiver(post_save, sender=Certificacoes)
+@receiver(post_delete, sender=Certificacoes)
+def atualizar_faceta_certificado(sender, instance, **kwargs):
+    if _apagado_junto_com_produto(kwargs.get('origin')):
+        return
+    facetas.atualizar_facetas_produto(instance.produto_id)
+
+
+@receiver(post_save, sender=ProdutorProfile)
+def atualizar_faceta_estado(sender, instance, **kwargs):
+    facetas.atualizar_facetas_do_usuario(instance.usuario_id)
+
+
+# ============================================================================
+# CONTADORES DE STATUS (DASHBOARD DO AUDITOR)
+# ============================================================================
+# Mudanças de status em registros existentes são registradas pelas views
+# (contadores.registrar_transicao); aqui entram só criação e exclusão.
+
+@receiver(post_save, sender=Certificacoes)
+def contar_certificacao_criada(sender, instance, created, **kwargs):
+    if created:
+        contadores.ajustar('certificacao', instance.status_certificacao, +1)
+
+
+@receiver(post_save, sender=EmpresaProfile)
+def contar_empresa_criada(sender, instance, created, **kwargs):
+    if created:
+        contadores.ajustar('empresa', instance.status_verificacao, +1)
+
+
+@receiver(pre_delete, sender=Certificacoes)
+@receiver(pre_delete, sender=EmpresaProfile)
+def guardar_status_antes_de_apagar(sender, instance, **kwargs):
+    """A instância pode estar desatualizada: desconta o status que está no banco."""
+    campo = 'status_certificacao' if sender is Certificacoes else 'status_verificacao'
+    instance._status_no_banco = (
+        sender.objects.filter(pk=instance.pk).values_list(campo, flat=True).first()
+    )
+
+
+@receiver(post_delete, sender=Certificacoes)
+def descontar_certificacao_apagada(sender, instance, **kwargs):
+    contadores.ajustar('certificacao', getattr(instance, '_status_no_banco', None), -1)
+
+
+@receiver(post_delete, sender=EmpresaProfile)
+def descontar_empresa_apagada(sender, instance, **kwargs):
+    contadores.ajustar('empresa', getattr(instance, '_status_no_banco', None), -1)
+
+
+# ============================================================================
+# RESUMO DO PAINEL DO PRODUTOR
+# ============================================================================
+
+@receiver(post_save, sender=Produtos)
+@receiver(post_delete, sender=Produtos)
+def invalidar_resumo_do_produto(sender, instance, **kwargs):
+    invalidar_resumo_produtor(instance.usuario_id)
+
+
+@receiver(post_save, sender=Certificacoes)
+@receiver(post_delete, sender=Certificacoes)
+def invalidar_resumo_da_certificacao(sender, instance, **kwargs):
+    if _apagado_junto_com_produto(kwargs.get('origin')):
+        # O próprio produto apagado já invalida
+        return
+    invalidar_resumo_produtor(instance.produto.usuario_id)
+
+
+# ============================================================================
+# REFERÊNCIAS DOS DOCUMENTOS (ARMAZENAMENTO DEDUPLICADO)
+# ============================================================================
+
+CAMPOS_DOCUMENTO = {model: campos for _pasta, model, campos in ALVOS}
+
+
+@receiver(pre_save, sender=Certificacoes)
+@receiver(pre_save, sender=EmpresaProfile)
+def guardar_documentos_anteriores(sender, instance, raw=False, update_fields=None, **kwargs):
+    """
+    Antes de salvar: quais arquivos a linha referenciava e quais campos
+    receberão um upload novo nesta gravação (cada upload soma uma referência).
+    """
+    campos = CAMPOS_DOCUMENTO[sender]
+    if update_fields is not None:
+        campos = [campo for campo in campos if campo in update_fields]
+    instance._documentos_anteriores = {}
+    instance._documentos_enviados = {
+        campo for campo in campos
+        if getattr(instance, campo) and not getattr(instance, campo)._committed
+    }
+    if raw or instance._state.adding or not campos:
+        return
+    anteriores = sender.objects.filter(pk=instance.pk).values_list(*campos).first()
+    if anteriores:
+        instance._documentos_anteriores = dict(zip(campos, anteriores))
+
+
+@receiver(post_save, sender=Certificacoes)
+@receiver(post_save, sender=EmpresaProfile)
+def liberar_documentos_substituidos(sender, instance, **kwargs):
+    anteriores = getattr(instance, '_documentos_anteriores', {})
+    enviados = getattr(instance, '_documentos_enviados', set())
+    for campo, nome_anterior in anteriores.items():
+        nome_atual = getattr(instance, campo).name or None
+        if nome_anterior and (nome_anterior != nome_atual or campo in enviados):
+            liberar_documento(nome_anterior)
+
+
+@receiver(post_delete, sender=Certificacoes)
+@receiver(post_delete, sender=EmpresaProfile)
+def liberar_documentos_apagados(sender, instance, **kwargs):
+    for campo in CAMPOS_DOCUMENTO[sender]:
+        liberar_documento(getattr(instance, campo).name)
+
+
+# ============================================================================
+# RENDIÇÕES DE IMAGEM (WEBP/JPEG REDUZIDOS)
+# ============================================================================
+
+@receiver(post_save, sender=Produtos)
+@receiver(post_save, sender=EmpresaProfile)
+def agendar_rendicoes_da_imagem(sender, instance, raw=False, **kwargs):
+    """Imagem nova, trocada ou removida: gera (ou apaga) as rendições fora da requisição."""
+    if raw:
+        return
+    alvo = alvo_do_model(sender)
+    _model, campo, campo_rendicoes = ALVOS_IMAGEM[alvo]
+    if not rendicoes_atualizadas(getattr(instance, campo), getattr(instance, campo_rendicoes)):
+        agendar_rendicoes(alvo, instance.pk)
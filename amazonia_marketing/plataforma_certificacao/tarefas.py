@@ -0,0 +1,197 @@
+"""
+Fila de tarefas em segundo plano, guardada no próprio banco (tabela Tarefa).
+
+Efeitos colaterais lentos (gerar rendições de imagem, consultar APIs externas,
+conferir arquivos) saem da requisição: a view enfileira e responde na hora.
+Não há broker externo: o worker é um comando do Django.
+
+Registrar uma tarefa:
+
+    @tarefa('imagens.gerar_rendicoes')
+    def processar_rendicoes(alvo, pk): ...
+
+Enfileirar (argumentos serializáveis em JSON):
+
+    enfileirar('imagens.gerar_rendicoes', 'produto', produto.pk)
+
+A linha da tarefa é gravada na transação atual: só fica visível para o worker
+depois do commit e some junto num rollback.
+
+Executar: python manage.py run_worker --threads 4
+- cada thread reserva uma tarefa com UPDATE condicional (status 'pendente'
+  -> 'executando'), então vários processos de worker podem rodar juntos;
+- falha: nova tentativa com espera exponencial (TAREFAS_BACKOFF_*);
+- tentativas esgotadas ou tarefa desconhecida: status 'morta', com o erro,
+  para análise no Django Admin (ação "Reenfileirar").
+"""
+
+import random
+import threading
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Tarefa
+
+
+_REGISTRO = {}
+
+# Quantas candidatas cada thread tenta reservar por consulta
+JANELA_RESERVA = 10
+
+
+def tarefa(nome):
+    """Decorador: registra a função como tarefa executável pelo worker."""
+    def registrar(funcao):
+        _REGISTRO[nome] = funcao
+        funcao.nome_tarefa = nome
+        return funcao
+    return registrar
+
+
+def tarefas_registradas():
+    return sorted(_REGISTRO)
+
+
+def enfileirar(nome, *args, atraso=None, max_tentativas=None, **kwargs):
+    """
+    Coloca a tarefa na fila (na transação atual). Retorna a Tarefa criada,
+    ou None com TAREFAS_SINCRONAS (executa após o commit, sem worker).
+    atraso: timedelta até a primeira execução.
+    """
+    if nome not in _REGISTRO:
+        raise LookupError(f'Tarefa não registrada: {nome}')
+    if settings.TAREFAS_SINCRONAS:
+        transaction.on_commit(lambda: _REGISTRO[nome](*args, **kwargs))
+        return None
+    return Tarefa.objects.create(
+        nome=nome,
+        argumentos={'args': list(args), 'kwargs': kwargs},
+        max_tentativas=max_tentativas or settings.TAREFAS_MAX_TENTATIVAS,
+        executar_em=timezone.now() + (atraso or timedelta()),
+    )
+
+
+# ============================================================================
+# EXECUÇÃO
+# ============================================================================
+
+def espera_para_tentativa(tentativa):
+    """Backoff exponencial com jitter: base * 2^(n-1), limitado ao máximo."""
+    espera = min(settings.TAREFAS_BACKOFF_BASE * 2 ** (tentativa - 1), settings.TAREFAS_BACKOFF_MAXIMO)
+    # Jitter: tarefas que falharam juntas (ex.: API fora do ar) não voltam todas no mesmo instante
+    return timedelta(seconds=random.uniform(espera / 2, espera))
+
+
+def reservar_proxima(worker):
+    """Reserva a próxima tarefa vencida para este worker, ou None se a fila está vazia."""
+    agora = timezone.now()
+    candidatas = list(
+        Tarefa.objects.filter(status='pendente', executar_em__lte=agora)
+        .order_by('executar_em', 'pk').values_list('pk', flat=True)[:JANELA_RESERVA]
+    )
+    for pk in candidatas:
+        # Só um worker consegue mudar o status de 'pendente' para 'executando'
+        reservada = Tarefa.objects.filter(pk=pk, status='pendente').update(
+            status='executando', iniciada_em=agora, worker=worker, tentativas=F('tentativas') + 1,
+        )
+        if reservada:
+            return Tarefa.objects.get(pk=pk)
+    return None
+
+
+def executar(tarefa_reservada):
+    """Executa uma tarefa reservada e registra o resultado (concluída, nova tentativa ou morta)."""
+    funcao = _REGISTRO.get(tarefa_reservada.nome)
+    argumentos = tarefa_reservada.argumentos or {}
+    # Atualiza só se a tarefa ainda é deste worker (pode ter sido devolvida por tempo limite)
+    minha = Tarefa.objects.filter(pk=tarefa_reservada.pk, status='executando', worker=tarefa_reservada.worker)
+    try:
+        if funcao is None:
+            raise LookupError(f'Tarefa não registrada: {tarefa_reservada.nome}')
+        funcao(*argumentos.get('args', []), **argumentos.get('kwargs', {}))
+    except Exception:
+        erro = traceback.format_exc()
+        agora = timezone.now()
+        if funcao is not None and tarefa_reservada.tentativas < tarefa_reservada.max_tentativas:
+            minha.update(
+                status='pendente', ultimo_erro=erro,
+                executar_em=agora + espera_para_tentativa(tarefa_reservada.tentativas),
+            )
+        else:
+            minha.update(status='morta', ultimo_erro=erro, concluida_em=agora)
+        return False
+    minha.update(status='concluida', concluida_em=timezone.now(), ultimo_erro='')
+    return True
+
+
+def processar_disponiveis(worker, parar=None):
+    """Executa tarefas vencidas até a fila esvaziar (ou até parar). Retorna quantas executou."""
+    executadas = 0
+    while parar is None or not parar.is_set():
+        proxima = reservar_proxima(worker)
+        if proxima is None:
+            break
+        executar(proxima)
+        executadas += 1
+    return executadas
+
+
+def manutencao():
+    """
+    Devolve à fila as tarefas presas em 'executando' (worker interrompido)
+    e apaga as concluídas antigas. Retorna (devolvidas, apagadas).
+    """
+    agora = timezone.now()
+    presas = Tarefa.objects.filter(
+        status='executando', iniciada_em__lt=agora - timedelta(seconds=settings.TAREFAS_TEMPO_LIMITE),
+    )
+    mortas = presas.filter(tentativas__gte=F('max_tentativas')).update(
+        status='morta', concluida_em=agora, ultimo_erro='Tempo limite excedido (worker interrompido?)',
+    )
+    devolvidas = presas.update(status='pendente', executar_em=agora)
+    apagadas, _ = Tarefa.objects.filter(
+        status='concluida', concluida_em__lt=agora - timedelta(days=settings.TAREFAS_RETENCAO_DIAS),
+    ).delete()
+    return devolvidas + mortas, apagadas
+
+
+def reenfileirar(tarefas):
+    """Devolve tarefas mortas para a fila, com as tentativas zeradas."""
+    return tarefas.filter(status='morta').update(
+        status='pendente', tentativas=0, executar_em=timezone.now(), concluida_em=None,
+    )
+
+
+def laco_do_worker(worker, parar, intervalo=1.0, uma_vez=False):
+    """Laço de uma thread do worker: processa a fila e espera `intervalo` segundos quando vazia."""
+    try:
+        while not parar.is_set():
+            close_old_connections()
+            executadas = processar_disponiveis(worker, parar)
+            if uma_vez:
+                break
+            if not executadas:
+                parar.wait(intervalo)
+    finally:
+        # Conexão própria de cada thread
+        connections.close_all()
+
+
+def iniciar_threads(prefixo, quantidade, parar, intervalo=1.0, uma_vez=False):
+    threads = [
+        threading.Thread(
+            target=laco_do_worker,
+            args=(f'{prefixo}-{numero}', parar, intervalo, uma_vez),
+            name=f'{prefixo}-{numero}',
+            daemon=True,
+        )
+        for numero in range(1, quantidade + 1)
+    ]
+    for thread in threads:
+        thread.start()
+    return threads
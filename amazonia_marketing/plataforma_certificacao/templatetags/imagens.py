@@ -0,0 +1,59 @@
+"""
+Template tags de imagens responsivas.
+
+Uso:
+    {% load imagens %}
+    {% imagem_responsiva p.imagem p.imagem_rendicoes alt=p.nome sizes="(max-width: 600px) 100vw, 300px" %}
+
+Com rendições (imagens.py) gera um <picture> com srcset WebP e JPEG: o navegador
+baixa a menor variante que atende à largura exibida. Sem rendições (ainda não
+geradas, ou de outra imagem) cai no <img> com o original.
+"""
+
+from django import template
+from django.utils.html import format_html, format_html_join
+
+from ..imagens import FORMATOS, rendicoes_atualizadas
+
+
+register = template.Library()
+
+
+def _srcset(storage, variantes):
+    return ', '.join(f"{storage.url(variante['nome'])} {variante['largura']}w" for variante in variantes)
+
+
+@register.simple_tag
+def imagem_responsiva(imagem, rendicoes=None, alt='', sizes='100vw', style=''):
+    if not imagem:
+        return ''
+    variantes = (rendicoes or {}).get('variantes') or {}
+    if not variantes or not rendicoes_atualizadas(imagem, rendicoes):
+        return format_html('<img src="{}" alt="{}" style="{}" loading="lazy">', imagem.url, alt, style)
+
+    storage = imagem.storage
+    fontes = format_html_join(
+        '',
+        '<source type="{}" srcset="{}" sizes="{}">',
+        (
+            (tipo, _srcset(storage, variantes[extensao]), sizes)
+            for extensao, _formato, tipo in FORMATOS
+            if extensao != 'jpg' and variantes.get(extensao)
+        ),
+    )
+    jpegs = variantes.get('jpg') or []
+    maior = jpegs[-1] if jpegs else None
+    if maior is None:
+        src, srcset, largura, altura = imagem.url, '', rendicoes.get('largura', ''), rendicoes.get('altura', '')
+    else:
+        src, srcset = storage.url(maior['nome']), _srcset(storage, jpegs)
+        largura = maior['largura']
+        altura = round(rendicoes['altura'] * maior['largura'] / rendicoes['largura'])
+
+    # display: contents -> o <img> continua sendo filho direto do container nos estilos existentes
+    return format_html(
+        '<picture style="display: contents;">{}'
+        '<img src="{}" srcset="{}" sizes="{}" width="{}" height="{}" alt="{}" style="{}" loading="lazy" decoding="async">'
+        '</picture>',
+        fontes, src, srcset, sizes, largura, altura, alt, style,
+    )
@@ -1,3 +1,1361 @@
-from django.test import TestCase
+import asyncio
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from io import StringIO
+from datetime import date
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+import httpx
+import requests
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.core.management import call_command
+from django.core.cache import caches
+from django.db import OperationalError, connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import busca, carrinho, cnpj, contadores, facetas, tarefas
+from .cnpj import CircuitoAberto, ConsultaCNPJIndisponivel, aconsultar_cnpj, consultar_cnpj, metricas_cnpj
+from .armazenamento import armazenamento
+from .documentos import verificar_documentos
+from .carrinho import MAXIMO_QUANTIDADE_POR_LINHA
+from .estoque import EstoqueInsuficiente
+from .forms import CadastroProdutorForm
+from .pedidos import fazer_pedido
+from .validadores import cnpj_valido, cpf_valido, validar_cnpjs
+from .estatisticas import estatisticas_usuario, resumo_produtor
+from .catalogo import pagina_vitrine
+from .models import (
+    UsuarioBase, Produtos, Certificacoes, ProdutorProfile, EmpresaProfile, ContagemFaceta, MetadadosDocumento,
+    BlobDocumento, Tarefa, Carrinho, ItemCarrinho, Pedido, ReservaEstoque,
+)
+
+
+def ids_na_vitrine(html):
+    """IDs dos produtos presentes nos cards renderizados da vitrine."""
+    return [int(i) for i in re.findall(r'data-produto="(\d+)"', str(html))]
+
+
+# ============================================================================
+# VITRINE PÚBLICA (home_publica)
+# ============================================================================
+
+class HomePublicaConsultasTest(TestCase):
+    """Garante que a vitrine não cresce em número de consultas com o catálogo."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.produtor = UsuarioBase.objects.create_user(
+            email='produtor@teste.com',
+            password='senha-forte-123',
+            nome='Produtor Teste',
+            tipo='produtor',
+        )
+
+    def setUp(self):
+        caches[settings.VITRINE_CACHE_ALIAS].clear()
+
+    def criar_produtos(self, quantidade, certificar_a_cada=2):
+        for i in range(quantidade):
+            produto = Produtos.objects.create(
+                nome=f'Produto {i}',
+                preco='10.00',
+                status_estoque='disponivel',
+                usuario=self.produtor,
+            )
+            if i % certificar_a_cada == 0:
+                Certificacoes.objects.create(
+                    produto=produto,
+                    documento='certificacoes/teste.pdf',
+                    status_certificacao='aprovado',
+                    data_envio=date.today(),
+                )
+
+    def test_selo_calculado_no_banco(self):
+        self.criar_produtos(4)
+        produtos, _ = pagina_vitrine()
+
+        selos = {p.nome: p.tem_selo for p in produtos}
+        self.assertEqual(selos, {
+            'Produto 0': True,
+            'Produto 1': False,
+            'Produto 2': True,
+            'Produto 3': False,
+        })
+
+    def test_numero_de_consultas_constante(self):
+        # Uma única consulta (produtos + EXISTS do selo), qualquer que seja o catálogo
+        for total in (1, 10, 40):
+            Produtos.objects.all().delete()
+            self.criar_produtos(total)
+            with self.assertNumQueries(1):
+                response = self.client.get(reverse('home_publica'))
+            self.assertEqual(
+                len(ids_na_vitrine(response.content.decode())),
+                min(total, settings.VITRINE_ITENS_POR_PAGINA),
+            )
+
+    def test_cache_servido_e_invalidado_pela_aprovacao(self):
+        self.criar_produtos(2, certificar_a_cada=3)
+        self.client.get(reverse('home_publica'))
+
+        # Segunda visita: nenhuma consulta ao banco
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('home_publica'))
+        self.assertEqual(response.content.decode().count('class="selo-flutuante"'), 1)
+
+        # Aprovar uma nova certificação reflete na vitrine imediatamente
+        Certificacoes.objects.create(
+            produto=Produtos.objects.get(nome='Produto 1'),
+            documento='certificacoes/teste.pdf',
+            status_certificacao='aprovado',
+            data_envio=date.today(),
+        )
+        response = self.client.get(reverse('home_publica'))
+        self.assertEqual(response.content.decode().count('class="selo-flutuante"'), 2)
+
+
+@override_settings(VITRINE_ITENS_POR_PAGINA=3)
+class VitrinePaginacaoTest(TestCase):
+    """Paginação por cursor (keyset) da vitrine e endpoint da rolagem infinita."""
+
+    @classmethod
+    def setUpTestData(cls):
+        produtor = UsuarioBase.objects.create_user(
+            email='produtor@teste.com',
+            password='senha-forte-123',
+            nome='Produtor Teste',
+            tipo='produtor',
+        )
+        for i in range(8):
+            Produtos.objects.create(
+                nome=f'Produto {i}',
+                preco='10.00',
+                status_estoque='disponivel',
+                usuario=produtor,
+            )
+
+    def setUp(self):
+        caches[settings.VITRINE_CACHE_ALIAS].clear()
+
+    def test_percorre_catalogo_sem_repetir(self):
+        response = self.client.get(reverse('home_publica'))
+        vistos = ids_na_vitrine(response.context['vitrine_html'])
+        cursor = response.context['proximo_cursor']
+
+        paginas = 1
+        while cursor:
+            dados = self.client.get(reverse('vitrine_pagina'), {'cursor': cursor}).json()
+            vistos.extend(ids_na_vitrine(dados['html']))
+            cursor = dados['proximo_cursor']
+            paginas += 1
+
+        esperados = list(
+            Produtos.objects.order_by('-data_criacao', '-id_produto').values_list('id_produto', flat=True)
+        )
+        self.assertEqual(paginas, 3)
+        self.assertEqual(vistos, esperados)
+
+    def test_cursor_invalido(self):
+        response = self.client.get(reverse('vitrine_pagina'), {'cursor': 'adulterado'})
+        self.assertEqual(response.status_code, 400)
+
+
+# ============================================================================
+# BUSCA DE PRODUTOS
+# ============================================================================
+
+class BuscaProdutosTest(TestCase):
+    """Índice invertido: acentos, prefixo, localização do produtor e selo."""
+
+    @classmethod
+    def setUpTestData(cls):
+        produtor = UsuarioBase.objects.create_user(
+            email='produtor@teste.com',
+            password='senha-forte-123',
+            nome='Produtor Teste',
+            tipo='produtor',
+        )
+        ProdutorProfile.objects.create(usuario=produtor, cidade='Belém', estado='PA')
+        cls.acai = Produtos.objects.create(
+            nome='Açaí Orgânico', descricao='Polpa congelada', preco='20.00', usuario=produtor,
+        )
+        cls.castanha = Produtos.objects.create(
+            nome='Castanha-do-Pará', descricao='Castanha selecionada', preco='35.00', usuario=produtor,
+        )
+        Certificacoes.objects.create(
+            produto=cls.castanha,
+            documento='certificacoes/teste.pdf',
+            status_certificacao='aprovado',
+            data_envio=date.today(),
+        )
+
+    def test_busca_sem_acento_e_por_prefixo(self):
+        self.assertEqual(busca.buscar_produtos('acai'), [self.acai])
+        self.assertEqual(busca.buscar_produtos('CASTAN'), [self.castanha])
+
+    def test_busca_por_localizacao_e_selo(self):
+        self.assertCountEqual(busca.buscar_produtos('belem'), [self.acai, self.castanha])
+        self.assertEqual(busca.buscar_produtos('pará certificado'), [self.castanha])
+
+    def test_relevancia_prioriza_nome(self):
+        resultado = busca.buscar_produtos('castanha')
+        self.assertEqual(resultado[0], self.castanha)
+        self.assertTrue(resultado[0].tem_selo)
+
+    def test_indice_atualizado_ao_editar(self):
+        self.acai.nome = 'Cupuaçu'
+        self.acai.save()
+        self.assertEqual(busca.buscar_produtos('acai'), [])
+        self.assertEqual(busca.buscar_produtos('cupuacu'), [self.acai])
+
+    def test_view_de_busca(self):
+        response = self.client.get(reverse('buscar_produtos'), {'q': 'açaí'})
+        self.assertEqual(ids_na_vitrine(response.content.decode()), [self.acai.pk])
+
+    def test_apagar_produtor_com_produto_certificado(self):
+        # Cascata a partir do usuário: a certificação apagada não reindexa o produto que vai junto
+        with self.captureOnCommitCallbacks(execute=True):
+            UsuarioBase.objects.get(email='produtor@teste.com').delete()
+        self.assertFalse(Produtos.objects.exists())
+        self.assertEqual(busca.buscar_produtos('castanha'), [])
+
+
+# ============================================================================
+# FACETAS DA VITRINE
+# ============================================================================
+
+class FacetasVitrineTest(TestCase):
+    """Contagens pré-calculadas mantidas pelos signals e filtros da vitrine."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.produtor_pa = UsuarioBase.objects.create_user(
+            email='pa@teste.com', password='senha-forte-123', nome='Produtor PA', tipo='produtor',
+        )
+        cls.produtor_am = UsuarioBase.objects.create_user(
+            email='am@teste.com', password='senha-forte-123', nome='Produtor AM', tipo='produtor',
+        )
+        ProdutorProfile.objects.create(usuario=cls.produtor_pa, estado='PA')
+        ProdutorProfile.objects.create(usuario=cls.produtor_am, estado='AM')
+        cls.acai = Produtos.objects.create(nome='Açaí', preco='8.00', usuario=cls.produtor_pa)
+        cls.castanha = Produtos.objects.create(nome='Castanha', preco='35.00', usuario=cls.produtor_pa)
+        cls.guarana = Produtos.objects.create(nome='Guaraná', preco='120.00', usuario=cls.produtor_am)
+        Certificacoes.objects.create(
+            produto=cls.castanha,
+            documento='certificacoes/teste.pdf',
+            status_certificacao='aprovado',
+            data_envio=date.today(),
+        )
+
+    def setUp(self):
+        caches[settings.VITRINE_CACHE_ALIAS].clear()
+
+    def contagens(self):
+        return {
+            (c.faceta, c.valor): c.total
+            for c in ContagemFaceta.objects.filter(total__gt=0)
+        }
+
+    def test_contagens_incrementais_batem_com_recalculo(self):
+        self.guarana.status_estoque = 'esgotado'
+        self.guarana.save()
+        self.acai.preco = '60.00'
+        self.acai.save()
+        self.castanha.delete()
+
+        incrementais = self.contagens()
+        self.assertEqual(incrementais, {
+            ('estado', 'PA'): 1, ('certificado', 'nao'): 1,
+            ('faixa_preco', '50-100'): 1, ('produtor', str(self.produtor_pa.pk)): 1,
+        })
+        facetas.recalcular_todas()
+        self.assertEqual(self.contagens(), incrementais)
+
+    def test_mudanca_de_estado_do_produtor(self):
+        perfil = self.produtor_am.produtor_profile
+        perfil.estado = 'PA'
+        perfil.save()
+        self.assertEqual(self.contagens()[('estado', 'PA')], 3)
+        self.assertNotIn(('estado', 'AM'), self.contagens())
+
+    def test_vitrine_filtrada(self):
+        response = self.client.get(reverse('vitrine_filtrada'), {'estado': 'PA', 'certificado': 'sim'})
+        self.assertEqual(ids_na_vitrine(response.context['vitrine_html']), [self.castanha.pk])
+
+        titulos = [grupo['titulo'] for grupo in response.context['facetas']]
+        self.assertEqual(titulos, ['Estado', 'Certificação', 'Preço', 'Produtor'])
+
+        dados = self.client.get(reverse('vitrine_pagina'), {'faixa_preco': 'acima-100'}).json()
+        self.assertEqual(ids_na_vitrine(dados['html']), [self.guarana.pk])
+
+
+# ============================================================================
+# ESTATÍSTICAS DOS DASHBOARDS
+# ============================================================================
+
+class EstatisticasDashboardTest(TestCase):
+    """Contadores dos dashboards calculados com agregação condicional."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = UsuarioBase.objects.create_user(
+            email='admin@teste.com', password='senha-forte-123', nome='Auditor', tipo='admin',
+        )
+        cls.produtor = UsuarioBase.objects.create_user(
+            email='produtor@teste.com', password='senha-forte-123', nome='Produtor', tipo='produtor',
+        )
+        for i, status in enumerate(['pendente', 'pendente', 'aprovado', 'reprovado']):
+            produto = Produtos.objects.create(nome=f'Produto {i}', preco='10.00', usuario=cls.produtor)
+            Certificacoes.objects.create(
+                produto=produto,
+                documento='certificacoes/teste.pdf',
+                status_certificacao=status,
+                data_envio=date.today(),
+            )
+        for i, status in enumerate(['pendente', 'verificado', 'rejeitado']):
+            empresa = UsuarioBase.objects.create_user(
+                email=f'empresa{i}@teste.com', password='senha-forte-123', nome=f'Empresa {i}', tipo='empresa',
+            )
+            EmpresaProfile.objects.create(
+                usuario=empresa, cnpj=f'1122233300018{i}', razao_social=f'Empresa {i}', status_verificacao=status,
+            )
+
+    def test_dashboard_admin_com_no_maximo_tres_consultas(self):
+        self.client.force_login(self.admin)
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.get(reverse('home_admin'))
+
+        # Descarta as consultas de autenticação (sessão e usuário logado)
+        tabelas_auth = ('django_session', UsuarioBase._meta.db_table)
+        do_dashboard = [
+            q['sql'] for q in consultas.captured_queries
+            if not any(f'FROM "{tabela}"' in q['sql'] for tabela in tabelas_auth)
+        ]
+        self.assertLessEqual(len(do_dashboard), 3, do_dashboard)
+
+        contexto = response.context
+        self.assertEqual(
+            (contexto['total_certificacoes'], contexto['pendentes'], contexto['aprovadas'], contexto['rejeitadas']),
+            (4, 2, 1, 1),
+        )
+        self.assertEqual(
+            (contexto['total_empresas'], contexto['emp_pendentes'], contexto['emp_verificadas'], contexto['emp_rejeitadas']),
+            (3, 1, 1, 1),
+        )
+
+    def test_estatisticas_do_produtor_em_uma_consulta(self):
+        with self.assertNumQueries(1):
+            estatisticas = estatisticas_usuario(self.produtor)
+        self.assertEqual(estatisticas['total_produtos'], 4)
+        self.assertEqual(estatisticas['certificacoes_pendentes'], 2)
+        self.assertEqual(estatisticas['certificacoes_aprovadas'], 1)
+        self.assertEqual(estatisticas['certificacoes_rejeitadas'], 1)
+        self.assertEqual(estatisticas['ultima_atividade'], date.today())
+
+    def test_resumo_do_produtor_em_cache_e_invalidado(self):
+        caches[settings.RESUMO_PRODUTOR_CACHE_ALIAS].clear()
+        resumo_produtor(self.produtor)
+        with self.assertNumQueries(0):
+            self.assertEqual(resumo_produtor(self.produtor)['certificacoes_aprovadas'], 1)
+
+        Certificacoes.objects.filter(status_certificacao='pendente').first().delete()
+        Certificacoes.objects.create(
+            produto=Produtos.objects.get(nome='Produto 0'),
+            documento='certificacoes/teste.pdf',
+            status_certificacao='aprovado',
+            data_envio=date.today(),
+        )
+        resumo = resumo_produtor(self.produtor)
+        self.assertEqual(resumo['certificacoes_pendentes'], 1)
+        self.assertEqual(resumo['certificacoes_aprovadas'], 2)
+
+        self.client.force_login(self.produtor)
+        response = self.client.get(reverse('home_produtor'))
+        self.assertEqual(response.context['certificacoes_aprovadas'], 2)
+
+
+class ContadoresStatusTest(TestCase):
+    """Contadores materializados acompanham criação, resposta do auditor e exclusão."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = UsuarioBase.objects.create_user(
+            email='admin@teste.com', password='senha-forte-123', nome='Auditor', tipo='admin',
+        )
+        produtor = UsuarioBase.objects.create_user(
+            email='produtor@teste.com', password='senha-forte-123', nome='Produtor', tipo='produtor',
+        )
+        cls.produto = Produtos.objects.create(nome='Cacau', preco='10.00', usuario=produtor)
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+        self.certificacao = Certificacoes.objects.create(
+            produto=self.produto,
+            documento='certificacoes/teste.pdf',
+            status_certificacao='pendente',
+            data_envio=date.today(),
+        )
+
+    def test_resposta_do_auditor_move_o_contador(self):
+        self.client.post(
+            reverse('admin_responder_certificacao', args=[self.certificacao.pk]), {'acao': 'aprovar'},
+        )
+        # Responder de novo com a mesma ação não conta duas vezes
+        self.client.post(
+            reverse('admin_responder_certificacao', args=[self.certificacao.pk]), {'acao': 'aprovar'},
+        )
+        self.assertEqual(contadores.contadores_por_status()['certificacao'], {'pendente': 0, 'aprovado': 1})
+
+        self.certificacao.delete()
+        self.assertEqual(contadores.contadores_por_status()['certificacao'], {'pendente': 0, 'aprovado': 0})
+        self.assertEqual(contadores.recalcular(), [])
+
+    def test_recalcular_detecta_e_corrige_divergencia(self):
+        # Alteração por fora das views (ex.: SQL direto) não passa pelos contadores
+        Certificacoes.objects.filter(pk=self.certificacao.pk).update(status_certificacao='reprovado')
+
+        self.assertEqual(contadores.recalcular(corrigir=False), [
+            ('certificacao', 'pendente', 1, 0),
+            ('certificacao', 'reprovado', 0, 1),
+        ])
+        contadores.recalcular()
+        self.assertEqual(contadores.recalcular(corrigir=False), [])
+
+
+# ============================================================================
+# DOCUMENTOS DA EMPRESA
+# ============================================================================
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class DocumentosEmpresaTest(TestCase):
+    """O dashboard da empresa lê a situação dos documentos só do banco."""
+
+    def setUp(self):
+        usuario = UsuarioBase.objects.create_user(
+            email='empresa@teste.com', password='senha-forte-123', nome='Empresa', tipo='empresa',
+        )
+        self.perfil = EmpresaProfile.objects.create(usuario=usuario, cnpj='11222333000181', razao_social='Empresa')
+        self.perfil.documento_cnpj.save('cartao.pdf', ContentFile(b'%PDF-1.4 cartao'))
+        self.perfil.documento_alvara.save('alvara.pdf', ContentFile(b'%PDF-1.4 alvara'))
+        self.client.force_login(usuario)
+
+    def test_dashboard_sem_acesso_ao_storage_e_sem_gravacoes(self):
+        with mock.patch.object(FileSystemStorage, 'exists', side_effect=AssertionError('storage acessado')), \
+                CaptureQueriesContext(connection) as consultas:
+            response = self.client.get(reverse('home_empresa'))
+
+        gravacoes = [
+            q['sql'] for q in consultas.captured_queries
+            if q['sql'].startswith(('UPDATE', 'INSERT', 'DELETE')) and 'django_session' not in q['sql']
+        ]
+        self.assertEqual(gravacoes, [])
+        self.assertEqual(response.context['docs_pendentes'], ['Contrato Social'])
+
+    def test_reconciliacao_marca_arquivo_ausente(self):
+        # Arquivo perdido por fora da aplicação (disco, backup restaurado, etc.)
+        os.remove(self.perfil.documento_alvara.path)
+
+        self.assertEqual(verificar_documentos(self.perfil), ['documento_alvara'])
+        cartao = MetadadosDocumento.objects.get(empresa=self.perfil, campo='documento_cnpj')
+        self.assertEqual(cartao.tamanho, len(b'%PDF-1.4 cartao'))
+        self.assertEqual(len(cartao.hash_sha256), 64)
+
+        response = self.client.get(reverse('home_empresa'))
+        self.assertEqual(response.context['docs_pendentes'], ['Contrato Social', 'Alvará de Funcionamento'])
+
+    def test_comando_verifica_documento_sem_metadados(self):
+        # Cartão verificado agora; o alvará ainda sem metadados (ex.: recém-enviado)
+        verificar_documentos(self.perfil)
+        MetadadosDocumento.objects.filter(empresa=self.perfil, campo='documento_alvara').delete()
+
+        saida = StringIO()
+        call_command('verificar_documentos', stdout=saida)
+        self.assertIn('1 empresa(s) verificada(s)', saida.getvalue())
+        self.assertTrue(MetadadosDocumento.objects.filter(empresa=self.perfil, campo='documento_alvara').exists())
+
+        saida = StringIO()
+        call_command('verificar_documentos', stdout=saida)
+        self.assertIn('0 empresa(s) verificada(s)', saida.getvalue())
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class ReconciliacaoMidiaTest(TestCase):
+    """reconciliar_midia: referências quebradas e arquivos sem referência."""
+
+    def setUp(self):
+        produtor = UsuarioBase.objects.create_user(
+            email='produtor@teste.com', password='senha-forte-123', nome='Produtor', tipo='produtor',
+        )
+        produto = Produtos.objects.create(nome='Cacau', preco='10.00', usuario=produtor)
+        self.usado = default_storage.save('certificacoes/usado.pdf', ContentFile(b'usado'))
+        self.orfao = default_storage.save('certificacoes/orfao.pdf', ContentFile(b'orfao'))
+        self.recente = default_storage.save('certificacoes/recente.pdf', ContentFile(b'recente'))
+        # Órfão antigo; o recente pode ser um upload cuja linha ainda não foi gravada
+        os.utime(default_storage.path(self.orfao), (0, 0))
+        self.certificacao = Certificacoes.objects.create(
+            produto=produto,
+            documento=self.usado,
+            documento_2='certificacoes/sumiu.pdf',
+            status_certificacao='pendente',
+            data_envio=date.today(),
+        )
+
+    def test_relata_sem_alterar(self):
+        saida = StringIO()
+        call_command('reconciliar_midia', stdout=saida)
+
+        self.assertIn('documento_2 -> certificacoes/sumiu.pdf', saida.getvalue())
+        self.assertIn('certificacoes/orfao.pdf (sem referência)', saida.getvalue())
+        self.assertNotIn('recente.pdf', saida.getvalue())
+        self.assertTrue(default_storage.exists(self.orfao))
+
+    def test_reparar(self):
+        call_command('reconciliar_midia', '--reparar', stdout=StringIO())
+
+        self.certificacao.refresh_from_db()
+        self.assertFalse(self.certificacao.documento_2)
+        self.assertEqual(self.certificacao.documento.name, self.usado)
+        self.assertFalse(default_storage.exists(self.orfao))
+        self.assertTrue(default_storage.exists(self.recente))
+
+    def test_reparar_respeita_documento_deduplicado(self):
+        # Mesmo laudo em duas certificações: um arquivo, duas referências
+        laudo = armazenamento.save('certificacoes/laudo.pdf', ContentFile(b'%PDF-1.4 laudo'))
+        armazenamento.save('certificacoes/laudo.pdf', ContentFile(b'%PDF-1.4 laudo'))
+        outra = Certificacoes.objects.create(
+            produto=self.certificacao.produto, documento=self.usado, documento_2=laudo,
+            status_certificacao='pendente', data_envio=date.today(),
+        )
+        # Contado em BlobDocumento, mas sem linha que aponte para ele (ex.: upload em andamento)
+        em_uso = armazenamento.save('certificacoes/em-uso.pdf', ContentFile(b'%PDF-1.4 em uso'))
+        os.utime(default_storage.path(em_uso), (0, 0))
+
+        os.remove(default_storage.path(laudo))
+        Certificacoes.objects.filter(pk=self.certificacao.pk).update(documento_3=laudo)
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('reconciliar_midia', '--reparar', stdout=StringIO())
+
+        outra.refresh_from_db()
+        self.assertFalse(outra.documento_2)
+        self.assertFalse(BlobDocumento.objects.filter(nome=laudo).exists())
+        self.assertTrue(default_storage.exists(em_uso))
+        self.assertEqual(BlobDocumento.objects.get(nome=em_uso).referencias, 1)
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class ArmazenamentoDeduplicadoTest(TestCase):
+    """O mesmo documento enviado várias vezes ocupa o disco uma vez, com contagem de referências."""
+
+    def setUp(self):
+        self.produtor = UsuarioBase.objects.create_user(
+            email='produtor@teste.com', password='senha-forte-123', nome='Produtor', tipo='produtor',
+        )
+        self.produtos = [
+            Produtos.objects.create(nome=f'Produto {i}', preco='10.00', usuario=self.produtor)
+            for i in range(3)
+        ]
+        self.client.force_login(self.produtor)
+
+    def enviar_para_todos(self):
+        pdf = SimpleUploadedFile('laudo.pdf', b'%PDF-1.4 laudo', content_type='application/pdf')
+        self.client.post(reverse('enviar_autodeclaracao_multipla'), {
+            'produtos': [p.pk for p in self.produtos],
+            'texto_autodeclaracao': 'Cultivo sem agrotóxicos',
+            'arquivo_1': pdf,
+        })
+
+    def test_um_arquivo_para_varias_certificacoes(self):
+        self.enviar_para_todos()
+
+        nomes = set(Certificacoes.objects.values_list('documento', flat=True))
+        self.assertEqual(len(nomes), 1)
+        nome = nomes.pop()
+        self.assertEqual(os.listdir(os.path.dirname(default_storage.path(nome))), [os.path.basename(nome)])
+        self.assertEqual(BlobDocumento.objects.get(nome=nome).referencias, 3)
+
+    def test_arquivo_apagado_com_a_ultima_referencia(self):
+        self.enviar_para_todos()
+        nome = Certificacoes.objects.first().documento.name
+
+        Certificacoes.objects.first().delete()
+        self.assertEqual(BlobDocumento.objects.get(nome=nome).referencias, 2)
+
+        # Trocar o documento libera a referência ao arquivo anterior
+        certificacao = Certificacoes.objects.first()
+        certificacao.documento.save('novo.pdf', ContentFile(b'%PDF-1.4 novo'))
+        self.assertEqual(BlobDocumento.objects.get(nome=nome).referencias, 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Produtos.objects.all().delete()
+        self.assertFalse(BlobDocumento.objects.exists())
+        self.assertFalse(default_storage.exists(nome))
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(), UPLOAD_PARTE_TAMANHO=8)
+class UploadEmPartesTest(TestCase):
+    """Documento enviado em partes, fora de ordem e retomado, vira uma certificação."""
+
+    conteudo = b'%PDF-1.4 laudo enviado em partes'
+
+    def setUp(self):
+        self.produtor = UsuarioBase.objects.create_user(
+            email='produtor@teste.com', password='senha-forte-123', nome='Produtor', tipo='produtor',
+        )
+        self.produto = Produtos.objects.create(nome='Castanha', preco='10.00', usuario=self.produtor)
+        self.client.force_login(self.produtor)
+
+    def iniciar(self, nome='laudo.pdf', tamanho=None):
+        resposta = self.client.post(reverse('upload_iniciar'), {
+            'nome_arquivo': nome, 'tamanho': len(self.conteudo) if tamanho is None else tamanho,
+        })
+        return resposta, resposta.json()
+
+    def enviar_parte(self, upload_id, numero, dados):
+        return self.client.put(
+            reverse('upload_parte', args=[upload_id, numero]), dados, content_type='application/octet-stream',
+        )
+
+    def test_upload_retomado_e_concluido(self):
+        resposta, sessao = self.iniciar()
+        self.assertEqual(resposta.status_code, 201)
+        self.assertEqual(sessao['total_partes'], 4)
+        partes = [self.conteudo[i:i + 8] for i in range(0, len(self.conteudo), 8)]
+
+        for numero in (3, 0, 2):
+            self.assertEqual(self.enviar_parte(sessao['id'], numero, partes[numero]).status_code, 200)
+        status = self.client.get(reverse('upload_status', args=[sessao['id']])).json()
+        self.assertEqual(status['partes_recebidas'], [0, 2, 3])
+
+        concluir = reverse('upload_concluir', args=[sessao['id']])
+        self.assertEqual(self.client.post(concluir, {'produto_id': self.produto.pk}).status_code, 400)
+
+        self.enviar_parte(sessao['id'], 1, partes[1])
+        with self.captureOnCommitCallbacks(execute=True):
+            resposta = self.client.post(concluir, {'produto_id': self.produto.pk})
+        self.assertEqual(resposta.status_code, 201)
+
+        certificacao = Certificacoes.objects.get(pk=resposta.json()['certificacao'])
+        self.assertEqual(certificacao.status_certificacao, 'pendente')
+        with default_storage.open(certificacao.documento.name, 'rb') as arquivo:
+            self.assertEqual(arquivo.read(), self.conteudo)
+        self.assertFalse(os.path.exists(default_storage.path(f'tmp_uploads/partes/{sessao["id"]}')))
+
+    def test_recusa_tipo_e_tamanho_invalidos(self):
+        self.assertEqual(self.iniciar(nome='script.exe')[0].status_code, 400)
+        self.assertEqual(self.iniciar(tamanho=settings.UPLOAD_DOCUMENTO_MAX_SIZE + 1)[0].status_code, 400)
+
+        _resposta, sessao = self.iniciar()
+        # Extensão .pdf com conteúdo de outro tipo: recusado já na primeira parte
+        self.assertEqual(self.enviar_parte(sessao['id'], 0, b'MZ\x90\x00abcd').status_code, 400)
+        self.assertEqual(self.enviar_parte(sessao['id'], 1, b'curta').status_code, 400)
+        status = self.client.get(reverse('upload_status', args=[sessao['id']])).json()
+        self.assertEqual(status['partes_recebidas'], [])
+
+
+def imagem_png(largura, altura):
+    from io import BytesIO
+    from PIL import Image
+
+    buffer = BytesIO()
+    Image.new('RGB', (largura, altura), (30, 120, 60)).save(buffer, 'PNG')
+    return SimpleUploadedFile('foto.png', buffer.getvalue(), content_type='image/png')
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(), TAREFAS_SINCRONAS=True)
+class RendicoesImagemTest(TestCase):
+    """Imagens de produto ganham variantes WebP/JPEG reduzidas, usadas no srcset da vitrine."""
+
+    def setUp(self):
+        self.produtor = UsuarioBase.objects.create_user(
+            email='produtor@teste.com', password='senha-forte-123', nome='Produtor', tipo='produtor',
+        )
+
+    def test_rendicoes_geradas_e_substituidas(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            produto = Produtos.objects.create(
+                nome='Açaí', preco='10.00', usuario=self.produtor, imagem=imagem_png(1200, 800),
+            )
+        produto.refresh_from_db()
+        rendicoes = produto.imagem_rendicoes
+        self.assertEqual(rendicoes['original'], produto.imagem.name)
+        self.assertEqual([v['largura'] for v in rendicoes['variantes']['webp']], [320, 640, 960])
+        antigas = [v['nome'] for lista in rendicoes['variantes'].values() for v in lista]
+        self.assertTrue(all(default_storage.exists(nome) for nome in antigas))
+
+        html = self.client.get(reverse('home_publica')).content.decode()
+        self.assertIn('type="image/webp"', html)
+        self.assertIn('_320w.jpg 320w', html)
+
+        # Imagem menor que a maior largura: não é ampliada; as variantes antigas são apagadas
+        with self.captureOnCommitCallbacks(execute=True):
+            produto.imagem = imagem_png(500, 500)
+            produto.save()
+        produto.refresh_from_db()
+        self.assertEqual([v['largura'] for v in produto.imagem_rendicoes['variantes']['jpg']], [320, 500])
+        self.assertFalse(any(default_storage.exists(nome) for nome in antigas))
+
+
+# ============================================================================
+# FILA DE TAREFAS
+# ============================================================================
+
+EXECUCOES = []
+
+
+@tarefas.tarefa('testes.registrar')
+def tarefa_registrar(valor, sufixo=''):
+    EXECUCOES.append(f'{valor}{sufixo}')
+
+
+@tarefas.tarefa('testes.falhar')
+def tarefa_falhar():
+    raise RuntimeError('API fora do ar')
+
+
+class FilaTarefasTest(TestCase):
+    """Reserva por UPDATE condicional, novas tentativas com espera e estado final 'morta'."""
+
+    def setUp(self):
+        EXECUCOES.clear()
+
+    def test_tarefa_executada_uma_unica_vez(self):
+        tarefa = tarefas.enfileirar('testes.registrar', 'a', sufixo='!')
+
+        reservada = tarefas.reservar_proxima('worker-1')
+        self.assertEqual(reservada.pk, tarefa.pk)
+        self.assertIsNone(tarefas.reservar_proxima('worker-2'))
+
+        self.assertTrue(tarefas.executar(reservada))
+        self.assertEqual(EXECUCOES, ['a!'])
+        self.assertEqual(Tarefa.objects.get(pk=tarefa.pk).status, 'concluida')
+
+    def test_novas_tentativas_e_fila_de_mortas(self):
+        tarefa = tarefas.enfileirar('testes.falhar', max_tentativas=2)
+
+        self.assertEqual(tarefas.processar_disponiveis('worker-1'), 1)
+        tarefa.refresh_from_db()
+        self.assertEqual((tarefa.status, tarefa.tentativas), ('pendente', 1))
+        self.assertIn('API fora do ar', tarefa.ultimo_erro)
+        # Ainda dentro da espera: nada a executar
+        self.assertEqual(tarefas.processar_disponiveis('worker-1'), 0)
+
+        Tarefa.objects.filter(pk=tarefa.pk).update(executar_em=tarefa.criada_em)
+        tarefas.processar_disponiveis('worker-1')
+        tarefa.refresh_from_db()
+        self.assertEqual((tarefa.status, tarefa.tentativas), ('morta', 2))
+
+        self.assertEqual(tarefas.reenfileirar(Tarefa.objects.all()), 1)
+        self.assertEqual(Tarefa.objects.get(pk=tarefa.pk).status, 'pendente')
+
+
+# ============================================================================
+# CONSULTA DE CNPJ (CACHE E COALESCÊNCIA)
+# ============================================================================
+
+CACHES_EM_MEMORIA = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'testes-default'},
+    'vitrine': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'testes-vitrine'},
+    'resumos': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'testes-resumos'},
+    'cnpj': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'testes-cnpj'},
+}
+
+
+def resposta_receitaws(status_code=200, **dados):
+    return mock.Mock(status_code=status_code, json=mock.Mock(return_value=dados))
+
+
+@override_settings(CACHES=CACHES_EM_MEMORIA)
+class ConsultaCNPJTest(TestCase):
+    """A ReceitaWS é consultada uma vez por CNPJ; falhas transitórias não ficam no cache."""
+
+    CNPJ = '11.222.333/0001-81'
+
+    def setUp(self):
+        caches['cnpj'].clear()
+        # Disjuntor novo a cada teste (o estado é global ao processo)
+        desfazer = mock.patch.object(cnpj, '_disjuntor_api', None)
+        desfazer.start()
+        self.addCleanup(desfazer.stop)
+
+    def test_resultado_em_cache_e_metricas(self):
+        ok = resposta_receitaws(status='OK', nome='Cooperativa Açaí', situacao='ATIVA', uf='PA')
+        with mock.patch('plataforma_certificacao.cnpj.requests.Session.get', return_value=ok) as get:
+            self.assertEqual(consultar_cnpj(self.CNPJ)['razao_social'], 'Cooperativa Açaí')
+            resposta = self.client.get(reverse('validar_cnpj'), {'cnpj': self.CNPJ}).json()
+        self.assertEqual(get.call_count, 1)
+        self.assertTrue(resposta['valido'])
+        self.assertEqual(resposta['uf'], 'PA')
+        metricas = metricas_cnpj()
+        self.assertEqual((metricas['acertos'], metricas['falhas'], metricas['consultas_api']), (1, 1, 1))
+
+    def test_nao_encontrado_em_cache_e_erro_transitorio_nao(self):
+        with mock.patch('plataforma_certificacao.cnpj.requests.Session.get', return_value=resposta_receitaws(429)) as get:
+            for _ in range(2):
+                with self.assertRaises(ConsultaCNPJIndisponivel):
+                    consultar_cnpj(self.CNPJ)
+        self.assertEqual(get.call_count, 2)
+
+        erro = resposta_receitaws(status='ERROR', message='CNPJ inválido')
+        with mock.patch('plataforma_certificacao.cnpj.requests.Session.get', return_value=erro) as get:
+            self.assertFalse(consultar_cnpj(self.CNPJ)['encontrado'])
+            self.assertFalse(consultar_cnpj(self.CNPJ)['encontrado'])
+        self.assertEqual(get.call_count, 1)
+
+    def test_consultas_simultaneas_compartilham_uma_chamada(self):
+        chamada_iniciada, liberar = threading.Event(), threading.Event()
+
+        def api_lenta(*args, **kwargs):
+            chamada_iniciada.set()
+            liberar.wait(5)
+            return resposta_receitaws(status='OK', nome='Cooperativa')
+
+        resultados = []
+        with mock.patch('plataforma_certificacao.cnpj.requests.Session.get', side_effect=api_lenta) as get:
+            threads = [threading.Thread(target=lambda: resultados.append(consultar_cnpj(self.CNPJ)))]
+            threads[0].start()
+            chamada_iniciada.wait(5)
+            threads += [threading.Thread(target=lambda: resultados.append(consultar_cnpj(self.CNPJ))) for _ in range(3)]
+            for thread in threads[1:]:
+                thread.start()
+            limite = time.monotonic() + 5
+            while metricas_cnpj()['coalescidas'] < 3 and time.monotonic() < limite:
+                time.sleep(0.01)
+            liberar.set()
+            for thread in threads:
+                thread.join(5)
+
+        self.assertEqual(get.call_count, 1)
+        self.assertEqual([r['razao_social'] for r in resultados], ['Cooperativa'] * 4)
+
+    @override_settings(CNPJ_DISJUNTOR_FALHAS=3, CNPJ_DISJUNTOR_ESPERA=60)
+    def test_disjuntor_abre_falha_rapido_e_meio_abre(self):
+        with mock.patch('plataforma_certificacao.cnpj.requests.Session.get', return_value=resposta_receitaws(503)) as get:
+            for _ in range(3):
+                with self.assertRaises(ConsultaCNPJIndisponivel):
+                    consultar_cnpj(self.CNPJ)
+            with self.assertRaises(CircuitoAberto):
+                consultar_cnpj(self.CNPJ)
+        self.assertEqual(get.call_count, 3)
+        self.assertEqual(cnpj.disjuntor().estado, 'aberto')
+
+        # Passada a espera, uma consulta de teste vai à API e fecha o circuito
+        ok = resposta_receitaws(status='OK', nome='Cooperativa', situacao='ATIVA')
+        with mock.patch('plataforma_certificacao.cnpj.time.monotonic', return_value=time.monotonic() + 61), \
+                mock.patch('plataforma_certificacao.cnpj.requests.Session.get', return_value=ok) as get:
+            self.assertEqual(cnpj.disjuntor().estado, 'meio_aberto')
+            self.assertTrue(consultar_cnpj(self.CNPJ)['encontrado'])
+        self.assertEqual(get.call_count, 1)
+        self.assertEqual(cnpj.disjuntor().estado, 'fechado')
+
+    async def test_endpoint_assincrono_coalesce_e_usa_o_cache(self):
+        chamadas = []
+
+        async def receitaws(request):
+            chamadas.append(str(request.url))
+            await asyncio.sleep(0.05)
+            return httpx.Response(200, json={'status': 'OK', 'nome': 'Cooperativa Açaí', 'situacao': 'ATIVA'})
+
+        cliente = httpx.AsyncClient(transport=httpx.MockTransport(receitaws))
+        with mock.patch('plataforma_certificacao.cnpj._cliente_async', return_value=cliente):
+            resultados = await asyncio.gather(*[aconsultar_cnpj(self.CNPJ) for _ in range(20)])
+            resposta = await self.async_client.get(reverse('validar_cnpj'), {'cnpj': self.CNPJ})
+        await cliente.aclose()
+
+        self.assertEqual(chamadas, ['https://receitaws.com.br/v1/cnpj/11222333000181'])
+        self.assertEqual({r['razao_social'] for r in resultados}, {'Cooperativa Açaí'})
+        self.assertEqual(resposta.json()['razao_social'], 'Cooperativa Açaí')
+        # Resultado gravado pelo cliente assíncrono serve também o síncrono
+        with mock.patch('plataforma_certificacao.cnpj.requests.Session.get') as get:
+            self.assertTrue((await asyncio.to_thread(consultar_cnpj, self.CNPJ))['encontrado'])
+        get.assert_not_called()
+
+    def test_endpoint_no_wsgi_usa_a_sessao_sincrona(self):
+        # No WSGI cada requisição teria um event loop (e um cliente assíncrono) novo
+        ok = resposta_receitaws(status='OK', nome='Cooperativa', situacao='ATIVA')
+        with mock.patch('plataforma_certificacao.cnpj.requests.Session.get', return_value=ok) as get, \
+                mock.patch('plataforma_certificacao.cnpj._cliente_async') as cliente_async:
+            resposta = self.client.get(reverse('validar_cnpj'), {'cnpj': self.CNPJ})
+        self.assertEqual(resposta.json()['razao_social'], 'Cooperativa')
+        self.assertEqual(get.call_count, 1)
+        cliente_async.assert_not_called()
+
+
+@override_settings(CACHES=CACHES_EM_MEMORIA, MEDIA_ROOT=tempfile.mkdtemp(), CNPJ_MODO_DEGRADADO=True)
+class CNPJModoDegradadoTest(TestCase):
+    """Com a ReceitaWS fora, o CNPJ com dígitos válidos é aceito e verificado depois pela fila."""
+
+    def setUp(self):
+        caches['cnpj'].clear()
+        desfazer = mock.patch.object(cnpj, '_disjuntor_api', None)
+        desfazer.start()
+        self.addCleanup(desfazer.stop)
+        usuario = UsuarioBase.objects.create_user(
+            email='empresa@teste.com', password='senha-forte-123', nome='Empresa', tipo='empresa',
+        )
+        self.perfil = EmpresaProfile.objects.create(usuario=usuario, razao_social='Empresa')
+        for campo in ('documento_cnpj', 'documento_contrato_social', 'documento_alvara'):
+            getattr(self.perfil, campo).save(f'{campo}.pdf', ContentFile(b'%PDF-1.4'))
+        self.client.force_login(usuario)
+
+    def test_cnpj_aceito_e_verificacao_enfileirada(self):
+        with mock.patch('plataforma_certificacao.cnpj.requests.Session.get', side_effect=requests.ConnectionError):
+            response = self.client.post(reverse('config_perfil_empresa'), {
+                'cnpj': '11222333000181', 'razao_social': 'Empresa',
+            })
+        self.assertRedirects(response, reverse('home_empresa'), fetch_redirect_response=False)
+        self.perfil.refresh_from_db()
+        self.assertEqual(self.perfil.cnpj, '11222333000181')
+        self.assertIsNone(self.perfil.consulta_receita_em)
+        tarefa = Tarefa.objects.get(nome='cnpj.verificar_empresa')
+        self.assertEqual(tarefa.argumentos['args'], [self.perfil.pk])
+        self.assertEqual(tarefa.max_tentativas, 10)
+
+        # API de volta: o worker grava a situação cadastral
+        Tarefa.objects.filter(pk=tarefa.pk).update(executar_em=tarefa.criada_em)
+        ok = resposta_receitaws(status='OK', nome='Empresa', situacao='Baixada')
+        with mock.patch('plataforma_certificacao.cnpj.requests.Session.get', return_value=ok):
+            tarefas.processar_disponiveis('teste')
+        self.perfil.refresh_from_db()
+        self.assertEqual(self.perfil.situacao_receita, 'BAIXADA')
+        self.assertIsNotNone(self.perfil.consulta_receita_em)
+
+
+RECEITA_STUB = {
+    '11222333000181': {'encontrado': True, 'cnpj': '11.222.333/0001-81', 'razao_social': 'COOPERATIVA AÇAÍ', 'situacao': 'ATIVA'},
+    '44555666000181': {'encontrado': True, 'cnpj': '44.555.666/0001-81', 'razao_social': 'Castanhas Ltda', 'situacao': 'BAIXADA'},
+    '77888999000181': {'encontrado': True, 'cnpj': '77.888.999/0001-81', 'razao_social': 'Outra Empresa', 'situacao': 'ATIVA'},
+}
+
+
+def consulta_stub(cnpj):
+    """Registro local para o verificar_cnpjs (CNPJ_CONSULTA / --consulta)."""
+    return RECEITA_STUB.get(cnpj, {'encontrado': False, 'erro': 'CNPJ não encontrado'})
+
+
+class VerificarCNPJsTest(TestCase):
+    """verificar_cnpjs: só pendentes, grava a situação em lote e relata os problemas."""
+
+    def test_verifica_pendentes_e_relata(self):
+        empresas = {}
+        for i, (cnpj, razao, status) in enumerate([
+            ('11.222.333/0001-81', 'Cooperativa Acai', 'pendente'),
+            ('44555666000181', 'Castanhas Ltda', 'pendente'),
+            ('77888999000181', 'Empresa Cadastrada', 'pendente'),
+            ('11222333000182', 'Digitada Errado', 'pendente'),
+            ('11222333000181', 'Já Verificada', 'verificado'),
+        ]):
+            usuario = UsuarioBase.objects.create_user(
+                email=f'empresa{i}@teste.com', password='senha-forte-123', nome=razao, tipo='empresa',
+            )
+            empresas[razao] = EmpresaProfile.objects.create(
+                usuario=usuario, cnpj=cnpj, razao_social=razao, status_verificacao=status,
+            )
+
+        saida = StringIO()
+        with CaptureQueriesContext(connection) as consultas:
+            call_command(
+                'verificar_cnpjs', consulta='plataforma_certificacao.tests.consulta_stub',
+                por_minuto=0, threads=3, stdout=saida,
+            )
+
+        situacoes = dict(EmpresaProfile.objects.values_list('razao_social', 'situacao_receita'))
+        self.assertEqual(situacoes, {
+            'Cooperativa Acai': 'ATIVA', 'Castanhas Ltda': 'BAIXADA', 'Empresa Cadastrada': 'ATIVA',
+            'Digitada Errado': '', 'Já Verificada': '',
+        })
+        # Uma leitura e um UPDATE em lote
+        self.assertEqual(sum(q['sql'].startswith('UPDATE') for q in consultas.captured_queries), 1)
+        relatorio = saida.getvalue()
+        self.assertIn('Castanhas Ltda: Inativa (Receita: BAIXADA)', relatorio)
+        self.assertIn('Empresa Cadastrada: Razão social divergente (Receita: Outra Empresa)', relatorio)
+        self.assertIn('Digitada Errado: CNPJ inválido', relatorio)
+        self.assertNotIn('Cooperativa Acai:', relatorio)
+        self.assertIn('3 empresa(s) verificada(s); 3 problema(s)', relatorio)
+
+
+class ValidadoresDocumentoTest(TestCase):
+    """Dígitos verificadores de CPF e CNPJ (inclusive alfanumérico), sem rede."""
+
+    def test_cnpj_numerico_e_alfanumerico(self):
+        self.assertTrue(cnpj_valido('11.222.333/0001-81'))
+        self.assertTrue(cnpj_valido('12.ABC.345/01DE-35'))
+        self.assertFalse(cnpj_valido('11.222.333/0001-82'))
+        self.assertFalse(cnpj_valido('00.000.000/0000-00'))
+        self.assertEqual(
+            validar_cnpjs(['11222333000181', '12abc34501de35', '11222333000182', '', '11222333000181']),
+            [True, True, False, False, True],
+        )
+
+    def test_cpf(self):
+        self.assertTrue(cpf_valido('529.982.247-25'))
+        self.assertFalse(cpf_valido('529.982.247-24'))
+        self.assertFalse(cpf_valido('111.111.111-11'))
+
+    def test_cnpj_invalido_nao_consulta_a_api(self):
+        with mock.patch('plataforma_certificacao.cnpj.requests.Session.get') as get:
+            resposta = self.client.get(reverse('validar_cnpj'), {'cnpj': '11.222.333/0001-82'})
+            self.assertFalse(consultar_cnpj('11222333000182')['encontrado'])
+        self.assertEqual(resposta.status_code, 400)
+        get.assert_not_called()
+
+        form = CadastroProdutorForm(data={'cpf': '529.982.247-24'})
+        form.is_valid()
+        self.assertIn('cpf', form.errors)
+
+
+# ============================================================================
+# CHECKOUT
+# ============================================================================
+
+class CheckoutTest(TestCase):
+    """Pedido e itens gravados numa transação, em número fixo de consultas, sem duplicar no reenvio."""
+
+    @classmethod
+    def setUpTestData(cls):
+        produtor = UsuarioBase.objects.create_user(
+            email='produtor@teste.com', password='senha-forte-123', nome='Produtor', tipo='produtor',
+        )
+        cls.empresa = UsuarioBase.objects.create_user(
+            email='empresa@teste.com', password='senha-forte-123', nome='Empresa', tipo='empresa',
+        )
+        cls.produtos = [
+            Produtos.objects.create(nome=f'Produto {i}', preco='10.00', status_estoque='disponivel', usuario=produtor)
+            for i in range(12)
+        ]
+
+    def setUp(self):
+        self.client.force_login(self.empresa)
+
+    def encher_carrinho(self, quantidade_itens):
+        carrinho = Carrinho.objects.create(usuario=self.empresa)
+        for i, produto in enumerate(self.produtos[:quantidade_itens], start=1):
+            ItemCarrinho.objects.create(carrinho=carrinho, produto=produto, quantidade=i, preco_unitario='2.50')
+        return carrinho
+
+    def finalizar(self, chave):
+        return self.client.post(reverse('checkout'), {
+            'endereco': 'Rua A, 1', 'cidade': 'Belém', 'estado': 'PA', 'cep': '66000-000',
+            'telefone': '(91) 99999-9999', 'chave_idempotencia': chave,
+        })
+
+    def test_pedido_em_lote_e_reenvio_nao_duplica(self):
+        carrinho = self.encher_carrinho(3)
+        resposta = self.finalizar('chave-1')
+        pedido = Pedido.objects.get()
+        self.assertRedirects(
+            resposta, reverse('payments:criar_sessao', args=[pedido.pk]), fetch_redirect_response=False,
+        )
+        self.assertEqual(str(pedido.total), '15.00')  # (1 + 2 + 3) x 2,50
+        self.assertEqual(sorted(pedido.itens.values_list('quantidade', 'subtotal')), [
+            (1, pedido.total / 6), (2, pedido.total / 3), (3, pedido.total / 2),
+        ])
+        carrinho.refresh_from_db()
+        self.assertFalse(carrinho.ativo)
+
+        # Duplo envio do mesmo formulário: mesmo pedido, nenhum novo
+        resposta = self.finalizar('chave-1')
+        self.assertRedirects(
+            resposta, reverse('payments:criar_sessao', args=[pedido.pk]), fetch_redirect_response=False,
+        )
+        self.assertEqual(Pedido.objects.count(), 1)
+
+    def test_consultas_nao_crescem_com_os_itens(self):
+        por_checkout = []
+        for quantidade_itens in (2, 12):
+            self.encher_carrinho(quantidade_itens)
+            with CaptureQueriesContext(connection) as consultas:
+                self.finalizar(f'chave-{quantidade_itens}')
+            por_checkout.append(len(consultas.captured_queries))
+        self.assertEqual(por_checkout[0], por_checkout[1])
+        self.assertEqual(Pedido.objects.get(chave_idempotencia='chave-12').itens.count(), 12)
+
+    def test_totais_do_carrinho_numa_consulta(self):
+        carrinho_empresa = Carrinho.objects.get(pk=self.encher_carrinho(4).pk)
+        with self.assertNumQueries(1):
+            self.assertEqual(carrinho.totais(carrinho_empresa), {'total': Decimal('25.00'), 'quantidade_itens': 10})
+            self.assertEqual(carrinho_empresa.get_total(), Decimal('25.00'))
+            self.assertEqual(carrinho_empresa.get_quantidade_itens(), 10)
+
+        vazio = Carrinho.objects.create(usuario=self.empresa, ativo=False)
+        anotados = {c.pk: c for c in carrinho.anotar_totais(Carrinho.objects.all())}
+        with self.assertNumQueries(0):
+            self.assertEqual(anotados[carrinho_empresa.pk].get_quantidade_itens(), 10)
+            self.assertEqual(anotados[vazio.pk].get_total(), Decimal('0.00'))
+
+
+class BackendsCarrinhoTest(TestCase):
+    """Os dois backends de carrinho têm o mesmo comportamento; o de sessão só grava no checkout."""
+
+    @classmethod
+    def setUpTestData(cls):
+        produtor = UsuarioBase.objects.create_user(
+            email='produtor@teste.com', password='senha-forte-123', nome='Produtor', tipo='produtor',
+        )
+        cls.empresa = UsuarioBase.objects.create_user(
+            email='empresa@teste.com', password='senha-forte-123', nome='Empresa', tipo='empresa',
+        )
+        cls.produtos = [
+            Produtos.objects.create(nome=f'Produto {i}', preco='4.00', status_estoque='disponivel', usuario=produtor)
+            for i in range(3)
+        ]
+
+    def montar_e_fechar(self):
+        """Monta o carrinho pelas views e fecha o pedido. Retorna as gravações nas tabelas de carrinho antes do checkout."""
+        self.client.force_login(self.empresa)
+        gravacoes = []
+
+        def registrar_gravacoes(execute, sql, params, many, context):
+            # execute_wrapper: o test client zera connection.queries a cada requisição
+            if sql.startswith(('INSERT', 'UPDATE', 'DELETE')) and 'Carrinho' in sql:
+                gravacoes.append(sql)
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(registrar_gravacoes):
+            for produto in self.produtos + self.produtos[:1]:
+                self.client.get(reverse('adicionar_ao_carrinho', args=[produto.pk]))
+            itens = {item.produto.pk: item for item in self.client.get(reverse('ver_carrinho')).context['itens']}
+            self.client.post(
+                reverse('atualizar_quantidade_carrinho', args=[itens[self.produtos[1].pk].pk]), {'quantidade': 5},
+            )
+            self.client.get(reverse('remover_do_carrinho', args=[itens[self.produtos[2].pk].pk]))
+            resposta = self.client.get(reverse('ver_carrinho'))
+        self.assertEqual(resposta.context['total'], Decimal('28.00'))  # (2 + 5) x 4,00
+        self.assertEqual(resposta.context['quantidade_itens'], 7)
+
+        self.client.post(reverse('checkout'), {
+            'endereco': 'Rua A, 1', 'cidade': 'Belém', 'estado': 'PA', 'cep': '66000-000',
+            'telefone': '(91) 99999-9999', 'chave_idempotencia': 'chave',
+        })
+        pedido = Pedido.objects.get(usuario=self.empresa)
+        self.assertEqual(pedido.total, Decimal('28.00'))
+        self.assertEqual(sorted(pedido.itens.values_list('quantidade', flat=True)), [2, 5])
+        self.assertEqual(self.client.get(reverse('ver_carrinho')).context['itens'], [])
+        return gravacoes
+
+    @override_settings(CARRINHO_BACKEND='plataforma_certificacao.carrinho.CarrinhoBanco')
+    def test_backend_banco(self):
+        self.assertGreater(len(self.montar_e_fechar()), 0)
+
+    @override_settings(CARRINHO_BACKEND='plataforma_certificacao.carrinho.CarrinhoSessao')
+    def test_backend_sessao_nao_grava_o_carrinho_antes_do_checkout(self):
+        self.assertEqual(self.montar_e_fechar(), [])
+
+    def test_backend_banco_le_o_carrinho_uma_vez(self):
+        backend = carrinho.CarrinhoBanco(mock.Mock(user=self.empresa))
+        backend.adicionar(self.produtos[0], 2)
+
+        backend = carrinho.CarrinhoBanco(mock.Mock(user=self.empresa))
+        with self.assertNumQueries(2):  # carrinho com os totais + itens
+            self.assertEqual(backend.totais()['total'], Decimal('8.00'))
+            self.assertEqual(len(backend.itens()), 1)
+            self.assertEqual(backend.totais()['quantidade_itens'], 2)
+
+        # Alteração pelo mesmo backend: os totais guardados são descartados
+        backend.adicionar(self.produtos[1], 1)
+        self.assertEqual(backend.totais(), {'total': Decimal('12.00'), 'quantidade_itens': 3})
+
+
+class CarrinhoEmLoteTest(TestCase):
+    """carrinho_adicionar_varios: validação numa consulta, upsert em lote e totais na resposta."""
+
+    @classmethod
+    def setUpTestData(cls):
+        produtor = UsuarioBase.objects.create_user(
+            email='produtor@teste.com', password='senha-forte-123', nome='Produtor', tipo='produtor',
+        )
+        cls.empresa = UsuarioBase.objects.create_user(
+            email='empresa@teste.com', password='senha-forte-123', nome='Empresa', tipo='empresa',
+        )
+        cls.produtos = [
+            Produtos.objects.create(
+                nome=f'Produto {i}', preco='2.50', status_estoque='disponivel', quantidade_estoque=10, usuario=produtor,
+            )
+            for i in range(3)
+        ]
+
+    def enviar(self, itens):
+        return self.client.post(
+            reverse('carrinho_adicionar_varios'), json.dumps({'itens': itens}), content_type='application/json',
+        )
+
+    def test_lote_inclui_e_substitui_quantidades(self):
+        self.client.force_login(self.empresa)
+        primeiro, segundo, terceiro = self.produtos
+        self.client.get(reverse('adicionar_ao_carrinho', args=[primeiro.pk]))
+
+        with CaptureQueriesContext(connection) as consultas:
+            resposta = self.enviar([
+                [primeiro.pk, 4], {'produto_id': segundo.pk, 'quantidade': 2}, [terceiro.pk, 1], [terceiro.pk, 2],
+            ])
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(resposta.json()['total'], '22.50')  # (4 + 2 + 3) x 2,50
+        self.assertEqual(resposta.json()['quantidade_itens'], 9)
+        carrinho = Carrinho.objects.get(usuario=self.empresa, ativo=True)
+        self.assertEqual(
+            dict(carrinho.itens.values_list('produto_id', 'quantidade')),
+            {primeiro.pk: 4, segundo.pk: 2, terceiro.pk: 3},
+        )
+        gravacoes = [q['sql'] for q in consultas.captured_queries if q['sql'].startswith('INSERT INTO "ItemCarrinho"')]
+        self.assertEqual(len(gravacoes), 1)
+
+    def test_linha_invalida_nao_grava_nada(self):
+        self.client.force_login(self.empresa)
+        resposta = self.enviar([[self.produtos[0].pk, 1], [self.produtos[1].pk, 11], [999999, 1]])
+        self.assertEqual(resposta.status_code, 400)
+        self.assertEqual(len(resposta.json()['itens_invalidos']), 2)
+        self.assertFalse(ItemCarrinho.objects.exists())
+        self.assertEqual(self.enviar('nada').status_code, 400)
+
+    def test_valores_fora_do_tipo_ou_do_limite_sao_erros_de_linha(self):
+        self.client.force_login(self.empresa)
+        sem_controle = self.produtos[2]
+        Produtos.objects.filter(pk=sem_controle.pk).update(quantidade_estoque=None)
+        primeiro = self.produtos[0].pk
+
+        resposta = self.enviar([
+            [primeiro, 1.9], [primeiro, True], [True, 1], ['1', 1], [primeiro],
+            [10 ** 30, 1], [primeiro, 10 ** 30], [sem_controle.pk, 10 ** 9],
+        ])
+        self.assertEqual(resposta.status_code, 400)
+        self.assertEqual(len(resposta.json()['itens_invalidos']), 8)
+
+        resposta = self.enviar([[sem_controle.pk, MAXIMO_QUANTIDADE_POR_LINHA], [sem_controle.pk, 1]])
+        self.assertEqual(resposta.status_code, 400)
+        self.assertFalse(ItemCarrinho.objects.exists())
+
+    @override_settings(CARRINHO_BACKEND='plataforma_certificacao.carrinho.CarrinhoSessao')
+    def test_lote_no_backend_de_sessao(self):
+        self.client.force_login(self.empresa)
+        resposta = self.enviar([[self.produtos[0].pk, 3]])
+        self.assertEqual(resposta.json()['total'], '7.50')
+        self.assertFalse(ItemCarrinho.objects.exists())
+
+
+# ============================================================================
+# ESTOQUE E RESERVAS
+# ============================================================================
+
+ENTREGA = {
+    'endereco_entrega': 'Rua A, 1', 'cidade_entrega': 'Belém', 'estado_entrega': 'PA',
+    'cep_entrega': '66000-000', 'telefone_contato': '(91) 99999-9999',
+}
+
+
+def comprador_com_carrinho(indice, produto, quantidade):
+    empresa = UsuarioBase.objects.create_user(
+        email=f'comprador{indice}@teste.com', password='senha-forte-123', nome=f'Comprador {indice}', tipo='empresa',
+    )
+    carrinho = Carrinho.objects.create(usuario=empresa)
+    ItemCarrinho.objects.create(carrinho=carrinho, produto=produto, quantidade=quantidade, preco_unitario='10.00')
+    return empresa
+
+
+class ReservaEstoqueTest(TestCase):
+    """O checkout reserva as unidades; a falta de estoque desfaz o pedido; reservas vencidas voltam ao estoque."""
+
+    def setUp(self):
+        produtor = UsuarioBase.objects.create_user(
+            email='produtor@teste.com', password='senha-forte-123', nome='Produtor', tipo='produtor',
+        )
+        self.produto = Produtos.objects.create(
+            nome='Castanha', preco='10.00', status_estoque='disponivel', usuario=produtor, quantidade_estoque=5,
+        )
+
+    def test_reserva_falta_de_estoque_e_liberacao(self):
+        pedido, _criado = fazer_pedido(comprador_com_carrinho(1, self.produto, 3), 'chave', **ENTREGA)
+        self.produto.refresh_from_db()
+        self.assertEqual(self.produto.quantidade_estoque, 2)
+        self.assertEqual(list(pedido.reservas.values_list('quantidade', 'status')), [(3, 'ativa')])
+
+        outro = comprador_com_carrinho(2, self.produto, 3)
+        with self.assertRaises(EstoqueInsuficiente):
+            fazer_pedido(outro, 'chave', **ENTREGA)
+        self.assertFalse(Pedido.objects.filter(usuario=outro).exists())
+        self.assertTrue(Carrinho.objects.get(usuario=outro).ativo)
+
+        # Prazo de pagamento vencido: pedido cancelado e unidades de volta
+        ReservaEstoque.objects.update(expira_em=timezone.now())
+        call_command('liberar_reservas', stdout=StringIO())
+        self.produto.refresh_from_db()
+        pedido.refresh_from_db()
+        self.assertEqual(self.produto.quantidade_estoque, 5)
+        self.assertEqual(pedido.status, 'cancelado')
+        call_command('liberar_reservas', stdout=StringIO())
+        self.produto.refresh_from_db()
+        self.assertEqual(self.produto.quantidade_estoque, 5)
+
+    def test_produto_esgotado_sai_da_vitrine_busca_e_facetas(self):
+        def a_venda():
+            faceta = ContagemFaceta.objects.filter(faceta='produtor', valor=str(self.produto.usuario_id)).first()
+            return (
+                self.produto in pagina_vitrine()[0],
+                busca.buscar_produtos('castanha') == [self.produto],
+                faceta.total if faceta else 0,
+            )
+
+        self.assertEqual(a_venda(), (True, True, 1))
+        with self.captureOnCommitCallbacks(execute=True):
+            fazer_pedido(comprador_com_carrinho(1, self.produto, 5), 'chave', **ENTREGA)
+        self.assertEqual(a_venda(), (False, False, 0))
+
+        ReservaEstoque.objects.update(expira_em=timezone.now())
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('liberar_reservas', stdout=StringIO())
+        self.assertEqual(a_venda(), (True, True, 1))
+
+
+class ReservaEstoqueConcorrenciaTest(TransactionTestCase):
+    """Muitos checkouts simultâneos do mesmo produto não vendem mais do que o estoque."""
+
+    def test_sem_venda_acima_do_estoque(self):
+        produtor = UsuarioBase.objects.create_user(
+            email='produtor@teste.com', password='senha-forte-123', nome='Produtor', tipo='produtor',
+        )
+        produto = Produtos.objects.create(
+            nome='Açaí', preco='10.00', status_estoque='disponivel', usuario=produtor, quantidade_estoque=7,
+        )
+        compradores = [comprador_com_carrinho(i, produto, 2) for i in range(12)]
+        largada = threading.Barrier(len(compradores))
+        resultados = []
+
+        def comprar(comprador):
+            try:
+                largada.wait(5)
+                while True:
+                    try:
+                        fazer_pedido(comprador, f'chave-{comprador.pk}', **ENTREGA)
+                        resultados.append('pedido')
+                        return
+                    except EstoqueInsuficiente:
+                        resultados.append('sem estoque')
+                        return
+                    except OperationalError:
+                        # SQLite dos testes trava o banco inteiro na escrita: tenta de novo
+                        time.sleep(0.01)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=comprar, args=(comprador,)) for comprador in compradores]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(30)
+
+        produto.refresh_from_db()
+        self.assertEqual(resultados.count('pedido'), 3)  # 7 unidades, 2 por pedido
+        self.assertEqual(resultados.count('sem estoque'), 9)
+        self.assertEqual(produto.quantidade_estoque, 1)
+        self.assertEqual(Pedido.objects.count(), 3)
+        self.assertEqual(sum(ReservaEstoque.objects.values_list('quantidade', flat=True)), 6)
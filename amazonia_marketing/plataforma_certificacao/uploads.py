@@ -0,0 +1,270 @@
+"""
+Upload em partes (retomável) de documentos de certificação.
+
+Conexões lentas ou instáveis não precisam recomeçar o envio do zero, e cada
+requisição ocupa o servidor só pelo tempo de uma parte:
+
+1. iniciar: o cliente informa nome e tamanho total; a sessão (UploadEmPartes)
+   define o tamanho de cada parte e quantas são;
+2. parte N: o corpo da requisição é gravado em fluxo em
+   tmp_uploads/partes/<sessão>/<N> (reenviar a mesma parte substitui);
+   o tamanho é conferido a cada parte e o tipo real do arquivo (assinatura
+   dos primeiros bytes) na parte 0, contra ALLOWED_UPLOAD_MIME_TYPES;
+3. status: lista as partes já recebidas, para o cliente retomar só o que falta;
+4. concluir: as partes são lidas em sequência direto para o armazenamento
+   deduplicado (armazenamento.py) e o documento é anexado a uma nova
+   certificação. O arquivo nunca é montado inteiro em memória.
+
+Sessões abandonadas são descartadas por: python manage.py limpar_uploads
+"""
+
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.base import File
+from django.db import transaction
+from django.utils import timezone
+
+from .armazenamento import PASTA_TEMPORARIA, TAMANHO_BLOCO, armazenamento
+from .models import Certificacoes, UploadEmPartes
+
+
+PASTA_PARTES = f'{PASTA_TEMPORARIA}/partes'
+
+# Tipo esperado para cada extensão aceita
+EXTENSOES_MIME = {
+    'pdf': 'application/pdf',
+    'doc': 'application/msword',
+    'docx': 'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+    'jpg': 'image/jpeg',
+    'jpeg': 'image/jpeg',
+    'png': 'image/png',
+}
+
+# Assinaturas (magic bytes) do início de cada tipo.
+# DOCX é um ZIP: a assinatura não distingue de outros ZIPs.
+ASSINATURAS = [
+    (b'%PDF-', 'application/pdf'),
+    (b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1', 'application/msword'),
+    (b'PK\x03\x04', 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'),
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+]
+TAMANHO_ASSINATURA = max(len(assinatura) for assinatura, _tipo in ASSINATURAS)
+
+
+class UploadInvalido(ValueError):
+    """Sessão, parte ou arquivo recusado (mensagem exibível ao usuário)."""
+
+
+def detectar_tipo(inicio):
+    """Tipo MIME pela assinatura dos primeiros bytes, ou None se desconhecido."""
+    for assinatura, tipo in ASSINATURAS:
+        if inicio.startswith(assinatura):
+            return tipo
+    return None
+
+
+def tipo_esperado(nome_arquivo):
+    """Tipo MIME aceito para a extensão do arquivo, ou None se a extensão não é permitida."""
+    extensao = os.path.splitext(nome_arquivo)[1].lower().lstrip('.')
+    tipo = EXTENSOES_MIME.get(extensao)
+    if extensao not in settings.ALLOWED_UPLOAD_EXTENSIONS or tipo not in settings.ALLOWED_UPLOAD_MIME_TYPES:
+        return None
+    return tipo
+
+
+def pasta_da_sessao(sessao):
+    return armazenamento.path(f'{PASTA_PARTES}/{sessao.pk}')
+
+
+def caminho_da_parte(sessao, numero):
+    return os.path.join(pasta_da_sessao(sessao), str(numero))
+
+
+def tamanho_da_parte(sessao, numero):
+    """Tamanho exato esperado para a parte (a última pode ser menor)."""
+    if numero < sessao.total_partes - 1:
+        return sessao.tamanho_parte
+    return sessao.tamanho_total - sessao.tamanho_parte * (sessao.total_partes - 1)
+
+
+# ============================================================================
+# ETAPAS DO UPLOAD
+# ============================================================================
+
+def iniciar(usuario, nome_arquivo, tamanho_total):
+    """Abre uma sessão de upload depois de validar extensão e tamanho declarados."""
+    nome_arquivo = os.path.basename(nome_arquivo or '').strip()
+    if not nome_arquivo or tipo_esperado(nome_arquivo) is None:
+        permitidas = ', '.join(settings.ALLOWED_UPLOAD_EXTENSIONS)
+        raise UploadInvalido(f'Tipo de arquivo não permitido. Extensões aceitas: {permitidas}.')
+    try:
+        tamanho_total = int(tamanho_total)
+    except (TypeError, ValueError):
+        raise UploadInvalido('Tamanho do arquivo inválido.')
+    if tamanho_total <= 0:
+        raise UploadInvalido('Tamanho do arquivo inválido.')
+    if tamanho_total > settings.UPLOAD_DOCUMENTO_MAX_SIZE:
+        limite_mb = settings.UPLOAD_DOCUMENTO_MAX_SIZE // (1024 * 1024)
+        raise UploadInvalido(f'O arquivo excede o limite de {limite_mb}MB.')
+
+    return UploadEmPartes.objects.create(
+        usuario=usuario,
+        nome_arquivo=nome_arquivo[:255],
+        tamanho_total=tamanho_total,
+        tamanho_parte=settings.UPLOAD_PARTE_TAMANHO,
+    )
+
+
+def gravar_parte(sessao, numero, fluxo):
+    """
+    Grava a parte lendo o fluxo em blocos. A parte só passa a contar como
+    recebida (rename atômico) depois de conferidos o tamanho e, na parte 0,
+    o tipo real do arquivo.
+    """
+    if sessao.status != 'recebendo':
+        raise UploadInvalido('Este upload já foi concluído.')
+    if not 0 <= numero < sessao.total_partes:
+        raise UploadInvalido(f'Parte inexistente: o upload tem {sessao.total_partes} parte(s), numeradas a partir de 0.')
+
+    esperado = tamanho_da_parte(sessao, numero)
+    pasta = pasta_da_sessao(sessao)
+    os.makedirs(pasta, exist_ok=True)
+    descritor, temporario = tempfile.mkstemp(dir=pasta, suffix='.tmp')
+    try:
+        recebido = 0
+        inicio = b''
+        with os.fdopen(descritor, 'wb') as destino:
+            while True:
+                bloco = fluxo.read(TAMANHO_BLOCO)
+                if not bloco:
+                    break
+                recebido += len(bloco)
+                if recebido > esperado:
+                    raise UploadInvalido(f'A parte {numero} excede o tamanho esperado ({esperado} bytes).')
+                if numero == 0 and len(inicio) < TAMANHO_ASSINATURA:
+                    inicio += bloco[:TAMANHO_ASSINATURA - len(inicio)]
+                destino.write(bloco)
+        if recebido != esperado:
+            raise UploadInvalido(f'A parte {numero} chegou incompleta ({recebido} de {esperado} bytes).')
+
+        campos = {'atualizado_em': timezone.now()}
+        if numero == 0:
+            tipo = detectar_tipo(inicio)
+            if tipo is None or tipo != tipo_esperado(sessao.nome_arquivo):
+                raise UploadInvalido('O conteúdo do arquivo não corresponde a um tipo permitido.')
+            campos['tipo_mime'] = tipo
+
+        os.replace(temporario, caminho_da_parte(sessao, numero))
+        temporario = None
+    finally:
+        if temporario is not None:
+            os.remove(temporario)
+
+    UploadEmPartes.objects.filter(pk=sessao.pk).update(**campos)
+
+
+def partes_recebidas(sessao):
+    """Números das partes já gravadas por completo, em ordem."""
+    pasta = pasta_da_sessao(sessao)
+    if not os.path.isdir(pasta):
+        return []
+    recebidas = []
+    with os.scandir(pasta) as entradas:
+        for entrada in entradas:
+            if not entrada.name.isdigit():
+                continue
+            numero = int(entrada.name)
+            if numero < sessao.total_partes and entrada.stat().st_size == tamanho_da_parte(sessao, numero):
+                recebidas.append(numero)
+    return sorted(recebidas)
+
+
+def situacao(sessao):
+    """Dados da sessão para o cliente retomar o envio."""
+    recebidas = partes_recebidas(sessao) if sessao.status == 'recebendo' else []
+    return {
+        'id': str(sessao.pk),
+        'status': sessao.status,
+        'nome_arquivo': sessao.nome_arquivo,
+        'tamanho_total': sessao.tamanho_total,
+        'tamanho_parte': sessao.tamanho_parte,
+        'total_partes': sessao.total_partes,
+        'partes_recebidas': recebidas,
+        'certificacao': sessao.certificacao_id,
+    }
+
+
+class PartesEncadeadas(File):
+    """Arquivo lido em sequência a partir das partes, sem ser montado em memória ou em disco."""
+
+    def __init__(self, caminhos, nome, tamanho):
+        super().__init__(None, nome)
+        self.caminhos = caminhos
+        self.size = tamanho
+
+    def chunks(self, chunk_size=None):
+        chunk_size = chunk_size or self.DEFAULT_CHUNK_SIZE
+        for caminho in self.caminhos:
+            with open(caminho, 'rb') as parte:
+                while True:
+                    bloco = parte.read(chunk_size)
+                    if not bloco:
+                        break
+                    yield bloco
+
+
+def concluir(sessao, produto, texto_autodeclaracao=''):
+    """
+    Junta as partes no documento de uma nova certificação pendente do produto.
+    As partes temporárias são apagadas depois do commit.
+    """
+    with transaction.atomic():
+        sessao = UploadEmPartes.objects.select_for_update().get(pk=sessao.pk)
+        if sessao.status != 'recebendo':
+            raise UploadInvalido('Este upload já foi concluído.')
+
+        faltando = sorted(set(range(sessao.total_partes)) - set(partes_recebidas(sessao)))
+        if faltando:
+            raise UploadInvalido(f'Ainda faltam {len(faltando)} parte(s): {faltando[:20]}.')
+
+        documento = PartesEncadeadas(
+            [caminho_da_parte(sessao, numero) for numero in range(sessao.total_partes)],
+            sessao.nome_arquivo,
+            sessao.tamanho_total,
+        )
+        certificacao = Certificacoes.objects.create(
+            produto=produto,
+            texto_autodeclaracao=texto_autodeclaracao or None,
+            documento=documento,
+            status_certificacao='pendente',
+            data_envio=timezone.now().date(),
+        )
+        sessao.status = 'concluido'
+        sessao.certificacao = certificacao
+        sessao.save(update_fields=['status', 'certificacao', 'atualizado_em'])
+
+        pasta = pasta_da_sessao(sessao)
+        transaction.on_commit(lambda: shutil.rmtree(pasta, ignore_errors=True))
+    return certificacao
+
+
+def descartar_expiradas(validade=None):
+    """
+    Apaga as sessões sem partes novas há mais de `validade` (timedelta;
+    padrão UPLOAD_SESSAO_VALIDADE) e suas partes. Retorna quantas foram descartadas.
+    """
+    if validade is None:
+        validade = timedelta(seconds=settings.UPLOAD_SESSAO_VALIDADE)
+    limite = timezone.now() - validade
+    descartadas = 0
+    expiradas = UploadEmPartes.objects.filter(status='recebendo', atualizado_em__lt=limite)
+    for sessao in expiradas.iterator():
+        shutil.rmtree(pasta_da_sessao(sessao), ignore_errors=True)
+        sessao.delete()
+        descartadas += 1
+    return descartadas
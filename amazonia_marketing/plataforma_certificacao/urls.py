@@ -7,6 +7,9 @@ from django.conf.urls.static import static
 urlpatterns = [   
     path('', views.home_publica, name='home_publica'), # Tela inicial pública
     path('home/', views.home_publica, name='home'),
+    path('vitrine/pagina/', views.vitrine_pagina, name='vitrine_pagina'), # Rolagem infinita da vitrine
+    path('vitrine/filtros/', views.vitrine_filtrada, name='vitrine_filtrada'), # Vitrine com facetas
+    path('busca/', views.buscar_produtos, name='buscar_produtos'), # Busca de produtos
     
     # Rotas de Autenticação e Cadastro
     path('registration/login/', views.login_usuarios, name='login'),
@@ -25,6 +28,10 @@ urlpatterns = [
     path('cadastro_produto/', views.cadastro_produto, name='cadastro_produto'),
     path('produtor/certificado/', views.enviar_autodeclaracao, name='enviar_autodeclaracao'),
     path('produtor/certificado-multiplo/', views.enviar_autodeclaracao_multipla, name='enviar_autodeclaracao_multipla'),
+    path('produtor/uploads/', views.upload_iniciar, name='upload_iniciar'),
+    path('produtor/uploads/<uuid:upload_id>/', views.upload_status, name='upload_status'),
+    path('produtor/uploads/<uuid:upload_id>/partes/<int:numero>/', views.upload_parte, name='upload_parte'),
+    path('produtor/uploads/<uuid:upload_id>/concluir/', views.upload_concluir, name='upload_concluir'),
     path('produtor/deletar/<int:produto_id>', views.deletar_produto, name='deletar_produto'),
     path('produtor/configuracoes/', views.config_perfil_produtor, name='config_perfil_produtor'),
     
@@ -51,6 +58,7 @@ urlpatterns = [
     # Rotas de Carrinho e Checkout
     path('carrinho/', views.ver_carrinho, name='ver_carrinho'),
     path('carrinho/adicionar/<int:produto_id>/', views.adicionar_ao_carrinho, name='adicionar_ao_carrinho'),
+    path('carrinho/adicionar-varios/', views.carrinho_adicionar_varios, name='carrinho_adicionar_varios'),
     path('carrinho/remover/<int:item_id>/', views.remover_do_carrinho, name='remover_do_carrinho'),
     path('carrinho/atualizar/<int:item_id>/', views.atualizar_quantidade_carrinho, name='atualizar_quantidade_carrinho'),
     path('checkout/', views.checkout, name='checkout'),
@@ -0,0 +1,119 @@
+"""
+Validação local (sem rede) de CPF e CNPJ pelos dígitos verificadores.
+
+Usada pelos formulários de cadastro e antes de qualquer consulta à ReceitaWS
+(cnpj.py e views de CNPJ): número digitado errado é recusado na hora,
+sem esperar a API.
+
+CNPJ alfanumérico (Receita Federal, a partir de julho/2026): as 12 primeiras
+posições podem conter letras A-Z. No cálculo, cada caractere vale
+ord(caractere) - 48 (0-9 continuam valendo 0-9; A = 17 ... Z = 42);
+os dois dígitos verificadores continuam numéricos. CNPJs só com números
+são um caso particular do mesmo cálculo.
+"""
+
+import re
+
+
+_FORMATACAO = re.compile(r'[.\-/\s]')
+_FORMATO_CNPJ = re.compile(r'[0-9A-Z]{12}[0-9]{2}')
+_FORMATO_CPF = re.compile(r'[0-9]{11}')
+
+PESOS_CNPJ = (6, 5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2)
+PESOS_CPF = (11, 10, 9, 8, 7, 6, 5, 4, 3, 2)
+
+
+def normalizar_cnpj(valor):
+    """Remove pontuação e espaços; letras em maiúsculas (CNPJ alfanumérico)."""
+    return _FORMATACAO.sub('', valor or '').upper()
+
+
+def normalizar_cpf(valor):
+    return _FORMATACAO.sub('', valor or '')
+
+
+def _digito_verificador(valores, pesos):
+    resto = sum(valor * peso for valor, peso in zip(valores, pesos)) % 11
+    return 0 if resto < 2 else 11 - resto
+
+
+def cnpj_valido(valor):
+    """True se o CNPJ (numérico ou alfanumérico, com ou sem máscara) tem os dígitos verificadores corretos."""
+    cnpj = normalizar_cnpj(valor)
+    if not _FORMATO_CNPJ.fullmatch(cnpj) or len(set(cnpj)) == 1:
+        return False
+    valores = [ord(caractere) - 48 for caractere in cnpj]
+    primeiro = _digito_verificador(valores[:12], PESOS_CNPJ[1:])
+    segundo = _digito_verificador(valores[:12] + [primeiro], PESOS_CNPJ)
+    return valores[12] == primeiro and valores[13] == segundo
+
+
+def cpf_valido(valor):
+    """True se o CPF (com ou sem máscara) tem os dígitos verificadores corretos."""
+    cpf = normalizar_cpf(valor)
+    # Sequências repetidas (111.111.111-11) passam no cálculo mas não são CPFs
+    if not _FORMATO_CPF.fullmatch(cpf) or len(set(cpf)) == 1:
+        return False
+    valores = [int(digito) for digito in cpf]
+    primeiro = _digito_verificador(valores[:9], PESOS_CPF[1:])
+    segundo = _digito_verificador(valores[:9] + [primeiro], PESOS_CPF)
+    return valores[9] == primeiro and valores[10] == segundo
+
+
+# ============================================================================
+# VALIDAÇÃO EM LOTE (LISTAS IMPORTADAS)
+# ============================================================================
+
+# Contribuição de cada caractere em cada posição (valor * peso), pré-calculada:
+# no lote, a soma vira 12 consultas a tabela por CNPJ
+_CARACTERES_CNPJ = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+_TABELA_PRIMEIRO = [
+    {caractere: (ord(caractere) - 48) * peso for caractere in _CARACTERES_CNPJ} for peso in PESOS_CNPJ[1:]
+]
+_TABELA_SEGUNDO = [
+    {caractere: (ord(caractere) - 48) * peso for caractere in _CARACTERES_CNPJ} for peso in PESOS_CNPJ[:12]
+]
+
+
+def _resto_para_digito(resto):
+    return 0 if resto < 2 else 11 - resto
+
+
+def _cnpj_normalizado_valido(cnpj):
+    if not _FORMATO_CNPJ.fullmatch(cnpj) or len(set(cnpj)) == 1:
+        return False
+    primeiro = _resto_para_digito(
+        sum(tabela[caractere] for tabela, caractere in zip(_TABELA_PRIMEIRO, cnpj)) % 11
+    )
+    # O 2º dígito soma o 1º com peso 2 (último peso)
+    segundo = _resto_para_digito(
+        (sum(tabela[caractere] for tabela, caractere in zip(_TABELA_SEGUNDO, cnpj)) + primeiro * PESOS_CNPJ[-1]) % 11
+    )
+    return cnpj[12] == str(primeiro) and cnpj[13] == str(segundo)
+
+
+def validar_cnpjs(valores):
+    """
+    Valida uma lista de CNPJs de uma vez (ex.: planilha importada).
+    Retorna uma lista de bool na mesma ordem. Valores repetidos são calculados uma vez.
+    """
+    resultados = {}
+    saida = []
+    for valor in valores:
+        cnpj = normalizar_cnpj(valor)
+        if cnpj not in resultados:
+            resultados[cnpj] = _cnpj_normalizado_valido(cnpj)
+        saida.append(resultados[cnpj])
+    return saida
+
+
+def validar_cpfs(valores):
+    """Mesma ideia de validar_cnpjs, para CPFs."""
+    resultados = {}
+    saida = []
+    for valor in valores:
+        cpf = normalizar_cpf(valor)
+        if cpf not in resultados:
+            resultados[cpf] = cpf_valido(cpf)
+        saida.append(resultados[cpf])
+    return saida
@@ -1,12 +1,14 @@
 from django.shortcuts import render, redirect
 from django.contrib.auth import get_user_model, login as auth_login, logout as auth_logout
 from django.contrib.auth.decorators import login_required, user_passes_test
-from django.http import JsonResponse
+from django.core.handlers.asgi import ASGIRequest
+from django.http import Http404, JsonResponse
 from django.views.decorators.csrf import csrf_exempt
+from asgiref.sync import sync_to_async
 import json
 from .models import (
     UsuariosLegado, Produtos, Certificacoes, ProdutorProfile, EmpresaProfile,
-    Carrinho, ItemCarrinho, Pedido, ItemPedido, UsuarioBase
+    Pedido, UsuarioBase, UploadEmPartes
 )
 
 # Importar autenticação do Django e redriecionamento
@@ -41,6 +43,7 @@ Produtor = ProdutorProfile
 EmpresaProdutor = EmpresaProfile
 from allauth.socialaccount.models import SocialApp
 from django.contrib.sites.shortcuts import get_current_site
+from django.db import transaction
 from django.db.utils import OperationalError, ProgrammingError
 # Importar decoradores customizados de segurança
 from .decorators import (
@@ -51,10 +54,24 @@ from .decorators import (
     owns_certificacao,
     get_usuario_session
 )
+from .catalogo import pagina_vitrine_renderizada, renderizar_cards, facetas_em_cache, CursorInvalido
+from .facetas import facetas_para_template, filtros_da_requisicao
+from . import busca, uploads
+from .estatisticas import estatisticas_painel_admin, estatisticas_usuario, resumo_produtor
+from .contadores import registrar_transicao
+from .documentos import DOCUMENTOS_EMPRESA, registrar_upload, situacao_documentos
+from .carrinho import MAXIMO_LINHAS_POR_LOTE, QuantidadeIndisponivel, obter_carrinho, validar_linhas
+from .estoque import EstoqueInsuficiente
+from .pedidos import CarrinhoVazio, fazer_pedido
+from .cnpj import (
+    ConsultaCNPJIndisponivel, aconsultar_cnpj, agendar_verificacao, consultar_cnpj, situacao_do_resultado,
+)
+from .validadores import cnpj_valido, normalizar_cnpj
 # ==============================================================================
-# Requisições HTTP para API de CNPJ
-import requests
 import re
+import uuid
+from urllib.parse import urlencode
+from django.conf import settings
 from django.utils import timezone
 
 # ==============================================================================
@@ -91,21 +108,66 @@ def home_publica(request):
     View da página inicial (Vitrine).
     Acessível para qualquer pessoa (logada ou não)
     """
-    # Filtra apenas produtos disponíveis no estoque
-    produtos = Produtos.objects.filter(status_estoque='disponivel')
-    
-    # Filtrando apenas os produtos com selo aprovado pelo ID
-    ids_com_selo = Certificacoes.objects.filter(status_certificacao='aprovado').values_list('produto_id', flat=True)
+    # Primeira página da vitrine: produtos disponíveis com o selo calculado no banco,
+    # servida do cache enquanto nenhum produto/certificação mudar.
+    # As próximas páginas são carregadas sob demanda (rolagem infinita) via vitrine_pagina.
+    vitrine_html, proximo_cursor = pagina_vitrine_renderizada(request)
     
-    # Marcando os produtos que tem selo antes de enviar para o front
-    for p in produtos:
-        if p.id_produto in ids_com_selo:
-            p.tem_selo = True # Criamos esse atributo na memória (não vai pro banco)
-        else:
-            p.tem_selo = False
-            
     # Entregamos a lista processada para o template desenhar.
-    return render(request, 'home.html', {'produtos': produtos})
+    return render(request, 'home.html', {
+        'vitrine_html': vitrine_html,
+        'proximo_cursor': proximo_cursor,
+    })
+
+
+def vitrine_pagina(request):
+    """
+    API da rolagem infinita da vitrine.
+    Recebe o cursor da última página exibida e devolve o HTML dos próximos cards
+    junto com o cursor seguinte (null quando o catálogo acabou).
+    """
+    filtros = filtros_da_requisicao(request.GET)
+    try:
+        html, proximo_cursor = pagina_vitrine_renderizada(request, request.GET.get('cursor'), filtros)
+    except CursorInvalido as e:
+        return JsonResponse({'erro': str(e)}, status=400)
+    
+    return JsonResponse({'html': html, 'proximo_cursor': proximo_cursor})
+
+
+def vitrine_filtrada(request):
+    """
+    Vitrine com filtros por faceta: estado (UF), selo, faixa de preço e produtor.
+    As contagens das facetas são pré-calculadas (facetas.py) e as páginas filtradas
+    também ficam no cache, então a resposta não depende do tamanho do catálogo.
+    """
+    filtros = filtros_da_requisicao(request.GET)
+    vitrine_html, proximo_cursor = pagina_vitrine_renderizada(request, filtros=filtros)
+    
+    return render(request, 'home.html', {
+        'vitrine_html': vitrine_html,
+        'proximo_cursor': proximo_cursor,
+        'facetas': facetas_para_template(facetas_em_cache(), filtros),
+        'filtros_querystring': urlencode(filtros),
+    })
+
+
+def buscar_produtos(request):
+    """
+    Busca de produtos da vitrine por nome, descrição, cidade/estado do produtor e selo.
+    Usa o índice invertido de busca.py (ranqueado, por prefixo e sem acentos).
+    """
+    termo = request.GET.get('q', '').strip()
+    if not termo:
+        return redirect('home_publica')
+    
+    produtos = busca.buscar_produtos(termo)
+    
+    return render(request, 'home.html', {
+        'vitrine_html': renderizar_cards(request, produtos),
+        'termo_busca': termo,
+        'total_resultados': len(produtos),
+    })
 
 def get_user_tipo(user):
     """
@@ -169,48 +231,43 @@ def redirecionar_por_tipo(user):
 
 def _validar_cnpj_api_interno(cnpj):
     """
-    Função auxiliar: Valida CNPJ usando API pública do ReceitaWS.
+    Função auxiliar: Valida CNPJ usando API pública do ReceitaWS (via cnpj.py, com cache).
     Retorna dict com sucesso e dados ou None se inválido.
     Sistema rigoroso contra perfis falsos.
     """
     # Remove formatação do CNPJ
-    cnpj_numeros = ''.join(filter(str.isdigit, cnpj))
+    cnpj_numeros = normalizar_cnpj(cnpj)
     
     if len(cnpj_numeros) != 14:
         return {'sucesso': False, 'erro': 'CNPJ deve ter 14 dígitos'}
     
+    # Dígitos verificadores conferidos localmente, antes de consultar a API
+    if not cnpj_valido(cnpj_numeros):
+        return {'sucesso': False, 'erro': 'CNPJ inválido: dígitos verificadores não conferem'}
+    
     try:
-        # API pública gratuita da ReceitaWS
-        url = f'https://receitaws.com.br/v1/cnpj/{cnpj_numeros}'
-        response = requests.get(url, timeout=10)
-        
-        if response.status_code == 200:
-            dados = response.json()
-            
-            # Verifica se o CNPJ existe e está ativo
-            if dados.get('status') == 'OK':
-                return {
-                    'sucesso': True,
-                    'razao_social': dados.get('nome', ''),
-                    'nome_fantasia': dados.get('fantasia', ''),
-                    'cnpj': dados.get('cnpj', ''),
-                    'endereco': f"{dados.get('logradouro', '')}, {dados.get('numero', '')}",
-                    'cidade': dados.get('municipio', ''),
-                    'estado': dados.get('uf', ''),
-                    'cep': dados.get('cep', ''),
-                    'telefone': dados.get('telefone', ''),
-                    'email': dados.get('email', ''),
-                    'situacao': dados.get('situacao', '')
-                }
-            else:
-                return {'sucesso': False, 'erro': 'CNPJ não encontrado na Receita Federal'}
-        else:
-            return {'sucesso': False, 'erro': 'Erro ao consultar API da Receita Federal'}
-            
-    except requests.exceptions.Timeout:
-        return {'sucesso': False, 'erro': 'Tempo limite de consulta excedido'}
-    except Exception as e:
-        return {'sucesso': False, 'erro': f'Erro ao validar CNPJ: {str(e)}'}
+        dados = consultar_cnpj(cnpj_numeros)
+    except ConsultaCNPJIndisponivel as e:
+        # API fora ou circuito aberto: nada se sabe sobre o CNPJ (ver modo degradado)
+        return {'sucesso': False, 'erro': str(e), 'indisponivel': True}
+    
+    # Verifica se o CNPJ existe na Receita Federal
+    if not dados['encontrado']:
+        return {'sucesso': False, 'erro': 'CNPJ não encontrado na Receita Federal'}
+    
+    return {
+        'sucesso': True,
+        'razao_social': dados['razao_social'],
+        'nome_fantasia': dados['nome_fantasia'],
+        'cnpj': dados['cnpj'],
+        'endereco': f"{dados['logradouro']}, {dados['numero']}",
+        'cidade': dados['municipio'],
+        'estado': dados['uf'],
+        'cep': dados['cep'],
+        'telefone': dados['telefone'],
+        'email': dados['email'],
+        'situacao': dados['situacao'],
+    }
 
 
 # Função para fazer login no sistema
@@ -474,6 +531,8 @@ def user_is_admin(view_func):
 # --- As Telas Protegidas ---
 
 # --- DASHBOARD DO PRODUTOR ---
+PRODUTOS_NO_PAINEL = 12  # Produtos recentes exibidos no painel
+
 @login_required(login_url='login')
 @user_is_produtor
 
@@ -489,30 +548,19 @@ def home_produtor(request):
         return redirect('login')
     
     # PROTEÇÃO CONTRA IDOR: Filtra APENAS produtos do usuário logado
-    produtos = Produtos.objects.filter(usuario=request.user)
-    
-    # Buscar certificações do produtor
-    certificacoes_pendentes = Certificacoes.objects.filter(
-        produto__usuario=request.user,
-        status_certificacao='pendente'
-    ).count()
-    
-    certificacoes_aprovadas = Certificacoes.objects.filter(
-        produto__usuario=request.user,
-        status_certificacao='aprovado'
-    ).count()
+    # Só os mais recentes: a lista completa fica em "Meus Anúncios"
+    produtos = Produtos.objects.filter(usuario=request.user)[:PRODUTOS_NO_PAINEL]
     
-    certificacoes_rejeitadas = Certificacoes.objects.filter(
-        produto__usuario=request.user,
-        status_certificacao='reprovado'
-    ).count()
+    # Contadores e última atividade (uma consulta, em cache por produtor)
+    resumo = resumo_produtor(request.user)
     
     context = {
         'produtos': produtos,
-        'total_produtos': produtos.count(),
-        'certificacoes_pendentes': certificacoes_pendentes,
-        'certificacoes_aprovadas': certificacoes_aprovadas,
-        'certificacoes_rejeitadas': certificacoes_rejeitadas,
+        'total_produtos': resumo['total_produtos'],
+        'certificacoes_pendentes': resumo['certificacoes_pendentes'],
+        'certificacoes_aprovadas': resumo['certificacoes_aprovadas'],
+        'certificacoes_rejeitadas': resumo['certificacoes_rejeitadas'],
+        'ultima_atividade': resumo['ultima_atividade'],
         'usuario_nome': request.user.nome,
     }
     
@@ -626,7 +674,9 @@ def enviar_autodeclaracao(request):
                 admin_responsavel=None,  # Ninguém auditou ainda
             )
             
-            nova_certificacao.save()
+            # Certificação e contador de pendentes (signal) na mesma transação
+            with transaction.atomic():
+                nova_certificacao.save()
             messages.success(request, 'Documento enviado com sucesso! Aguardo a análise do auditor')            
             return redirect('home_produtor')
         else:
@@ -644,6 +694,80 @@ def enviar_autodeclaracao(request):
     
     return render(request, 'enviar_autodeclaracao.html', contexto)
 
+
+# --- Upload em partes (retomável) de documentos grandes de certificação ---
+# API JSON usada pelo navegador para enviar o documento principal em partes
+# (ver uploads.py). CSRF pelo cabeçalho X-CSRFToken.
+
+@login_required(login_url='login')
+@user_is_produtor
+def upload_iniciar(request):
+    """POST nome_arquivo, tamanho -> sessão de upload com o tamanho e a quantidade de partes."""
+    if request.method != 'POST':
+        return JsonResponse({'erro': 'Método não permitido.'}, status=405)
+    try:
+        sessao = uploads.iniciar(request.user, request.POST.get('nome_arquivo'), request.POST.get('tamanho'))
+    except uploads.UploadInvalido as e:
+        return JsonResponse({'erro': str(e)}, status=400)
+    return JsonResponse(uploads.situacao(sessao), status=201)
+
+
+@login_required(login_url='login')
+@user_is_produtor
+def upload_status(request, upload_id):
+    """GET -> partes já recebidas, para o cliente retomar o envio."""
+    # PROTEÇÃO CONTRA IDOR: apenas sessões do usuário logado
+    sessao = get_object_or_404(UploadEmPartes, pk=upload_id, usuario=request.user)
+    return JsonResponse(uploads.situacao(sessao))
+
+
+@login_required(login_url='login')
+@user_is_produtor
+def upload_parte(request, upload_id, numero):
+    """
+    PUT com o conteúdo binário da parte no corpo (application/octet-stream).
+    O corpo é lido em fluxo direto para o disco (request.body nunca é acessado).
+    """
+    if request.method not in ('PUT', 'POST'):
+        return JsonResponse({'erro': 'Método não permitido.'}, status=405)
+    sessao = get_object_or_404(UploadEmPartes, pk=upload_id, usuario=request.user)
+
+    # Recusa antes de ler o corpo quando o tamanho declarado já não confere
+    try:
+        declarado = int(request.META.get('CONTENT_LENGTH') or 0)
+    except ValueError:
+        declarado = 0
+    if declarado > sessao.tamanho_parte:
+        return JsonResponse({'erro': f'Cada parte deve ter no máximo {sessao.tamanho_parte} bytes.'}, status=413)
+
+    try:
+        uploads.gravar_parte(sessao, numero, request)
+    except uploads.UploadInvalido as e:
+        return JsonResponse({'erro': str(e)}, status=400)
+    return JsonResponse({'parte': numero, 'recebida': True})
+
+
+@login_required(login_url='login')
+@user_is_produtor
+def upload_concluir(request, upload_id):
+    """POST produto_id, texto_autodeclaracao -> cria a certificação com o documento montado."""
+    if request.method != 'POST':
+        return JsonResponse({'erro': 'Método não permitido.'}, status=405)
+    sessao = get_object_or_404(UploadEmPartes, pk=upload_id, usuario=request.user)
+
+    # PROTEÇÃO CONTRA IDOR: o produto precisa ser do produtor logado
+    produto = Produtos.objects.filter(
+        id_produto=request.POST.get('produto_id') or None, usuario=request.user
+    ).first()
+    if produto is None:
+        return JsonResponse({'erro': 'Selecione um produto seu para enviar a certificação.'}, status=400)
+
+    try:
+        certificacao = uploads.concluir(sessao, produto, request.POST.get('texto_autodeclaracao', ''))
+    except uploads.UploadInvalido as e:
+        return JsonResponse({'erro': str(e)}, status=400)
+    return JsonResponse({'certificacao': certificacao.id_certificacao, 'status': 'pendente'}, status=201)
+
 # ---  Função para o produtor adicionar produtos ---
 @login_required(login_url='login')
 @user_is_produtor
@@ -729,98 +853,31 @@ def home_empresa(request):
         }
     )
     
-    # Verificar documentos pendentes e se os arquivos existem
-    docs_pendentes = []
-    doc_cnpj_existe = False
-    contrato_social_existe = False
-    alvara_existe = False
+    # Situação dos documentos: apenas metadados do banco, sem acessar o storage
+    # (a existência dos arquivos é conferida pela reconciliação: verificar_documentos)
+    situacao = situacao_documentos(perfil)
+    docs_pendentes = [rotulo for campo, rotulo in DOCUMENTOS_EMPRESA if not situacao[campo]]
     
-    # Verificar CNPJ
-    if perfil.documento_cnpj:
-        try:
-            # Verifica se o arquivo existe no filesystem
-            if perfil.documento_cnpj.storage.exists(perfil.documento_cnpj.name):
-                doc_cnpj_existe = True
-            else:
-                # Campo preenchido mas arquivo não existe - limpar
-                perfil.documento_cnpj = None
-                perfil.save()
-        except Exception:
-            perfil.documento_cnpj = None
-            perfil.save()
-    
-    if not perfil.documento_cnpj:
-        docs_pendentes.append('Documento CNPJ (Cartão CNPJ)')
-    
-    # Verificar Contrato Social
-    if perfil.documento_contrato_social:
-        try:
-            if perfil.documento_contrato_social.storage.exists(perfil.documento_contrato_social.name):
-                contrato_social_existe = True
-            else:
-                perfil.documento_contrato_social = None
-                perfil.save()
-        except Exception:
-            perfil.documento_contrato_social = None
-            perfil.save()
-    
-    if not perfil.documento_contrato_social:
-        docs_pendentes.append('Contrato Social')
-    
-    # Verificar Alvará de Funcionamento
-    if perfil.documento_alvara:
-        try:
-            if perfil.documento_alvara.storage.exists(perfil.documento_alvara.name):
-                alvara_existe = True
-            else:
-                perfil.documento_alvara = None
-                perfil.save()
-        except Exception:
-            perfil.documento_alvara = None
-            perfil.save()
-    
-    if not perfil.documento_alvara:
-        docs_pendentes.append('Alvará de Funcionamento')
-    
-    # Métricas da empresa (exemplo: produtos cadastrados, pedidos, etc)
-    # Aqui você pode adicionar mais métricas conforme necessidade
-    total_produtos = Produtos.objects.filter(usuario=request.user).count()
-    
-    # Verificações de certificados (caso a empresa também tenha produtos)
-    certificacoes_pendentes = Certificacoes.objects.filter(
-        produto__usuario=request.user,
-        status_certificacao='pendente'
-    ).count()
-    
-    certificacoes_aprovadas = Certificacoes.objects.filter(
-        produto__usuario=request.user,
-        status_certificacao='aprovado'
-    ).count()
+    # Métricas da empresa: produtos e certificações (caso a empresa também tenha produtos)
+    estatisticas = estatisticas_usuario(request.user)
     
     # Calcular progresso de documentação
-    docs_enviados = 0
-    if perfil.documento_cnpj:
-        docs_enviados += 1
-    if perfil.documento_contrato_social:
-        docs_enviados += 1
-    if perfil.documento_alvara:
-        docs_enviados += 1
-    
-    progresso = int((docs_enviados / 3) * 100)
+    docs_enviados = len(DOCUMENTOS_EMPRESA) - len(docs_pendentes)
+    progresso = int((docs_enviados / len(DOCUMENTOS_EMPRESA)) * 100)
     
     contexto = {
         'perfil': perfil,
         'docs_pendentes': docs_pendentes,
         'total_docs_pendentes': len(docs_pendentes),
         'perfil_completo': len(docs_pendentes) == 0 and perfil.cnpj and perfil.razao_social,
-        'total_produtos': total_produtos,
-        'certificacoes_pendentes': certificacoes_pendentes,
-        'certificacoes_aprovadas': certificacoes_aprovadas,
+        'total_produtos': estatisticas['total_produtos'],
+        'certificacoes_pendentes': estatisticas['certificacoes_pendentes'],
+        'certificacoes_aprovadas': estatisticas['certificacoes_aprovadas'],
         'usuario_nome': request.user.nome,
         'progresso': progresso,
-        'doc_cnpj_existe': doc_cnpj_existe,
-        'contrato_social_existe': contrato_social_existe,
-        'alvara_existe': alvara_existe,
+        'doc_cnpj_existe': situacao['documento_cnpj'],
+        'contrato_social_existe': situacao['documento_contrato_social'],
+        'alvara_existe': situacao['documento_alvara'],
     }
     
     return render(request, 'home_empresa.html', contexto)
@@ -838,42 +895,29 @@ def home_admin(request):
     PROTEÇÃO: @login_required + @user_is_admin garante acesso apenas a auditores.
     """
     
-    # ===== ESTATÍSTICAS DE CERTIFICAÇÕES =====
-    todas_certificacoes = Certificacoes.objects.select_related('produto', 'produto__usuario').all()
+    # ===== ESTATÍSTICAS (contadores materializados, uma consulta) =====
+    certificacoes, empresas = estatisticas_painel_admin()
     
-    total_certificacoes = todas_certificacoes.count()
-    cert_pendentes = todas_certificacoes.filter(status_certificacao='pendente').count()
-    cert_aprovadas = todas_certificacoes.filter(status_certificacao='aprovado').count()
-    cert_rejeitadas = todas_certificacoes.filter(status_certificacao='rejeitado').count()
+    certificacoes_recentes = Certificacoes.objects.select_related(
+        'produto', 'produto__usuario'
+    ).filter(status_certificacao='pendente').order_by('-data_envio')[:10]
     
-    certificacoes_recentes = todas_certificacoes.filter(
-        status_certificacao='pendente'
-    ).order_by('-data_envio')[:10]
-    
-    # ===== ESTATÍSTICAS DE EMPRESAS =====
-    todas_empresas = EmpresaProdutor.objects.select_related('usuario').all()
-    
-    total_empresas = todas_empresas.count()
-    emp_pendentes = todas_empresas.filter(status_verificacao='pendente').count()
-    emp_verificadas = todas_empresas.filter(status_verificacao='verificado').count()
-    emp_rejeitadas = todas_empresas.filter(status_verificacao='rejeitado').count()
-    
-    empresas_recentes = todas_empresas.filter(
+    empresas_recentes = EmpresaProdutor.objects.select_related('usuario').filter(
         status_verificacao='pendente'
     ).order_by('-data_criacao')[:10]
     
     context = {
         # Certificações
-        'total_certificacoes': total_certificacoes,
-        'pendentes': cert_pendentes,
-        'aprovadas': cert_aprovadas,
-        'rejeitadas': cert_rejeitadas,
+        'total_certificacoes': certificacoes['total'],
+        'pendentes': certificacoes['pendentes'],
+        'aprovadas': certificacoes['aprovadas'],
+        'rejeitadas': certificacoes['reprovadas'],
         'certificacoes_recentes': certificacoes_recentes,
         # Empresas
-        'total_empresas': total_empresas,
-        'emp_pendentes': emp_pendentes,
-        'emp_verificadas': emp_verificadas,
-        'emp_rejeitadas': emp_rejeitadas,
+        'total_empresas': empresas['total'],
+        'emp_pendentes': empresas['pendentes'],
+        'emp_verificadas': empresas['verificadas'],
+        'emp_rejeitadas': empresas['rejeitadas'],
         'empresas_recentes': empresas_recentes,
         'usuario_nome': request.user.nome,
     }
@@ -925,18 +969,26 @@ def admin_responder_certificacoes(request, certificacao_id):
     if request.method == 'POST':
         acao = request.POST.get('acao') # Captura qual botão foi clicado (Aprovar/Rejeitar)
         
-        if acao == 'aprovar':
-            certificacao.status_certificacao = 'aprovado'
-            messages.success(request, f'Certificação APROVADA para o produto {certificacao.produto.nome}!')
-        elif acao == 'rejeitar':
-            # Usando 'reprovado' conforme seu código anterior
-            certificacao.status_certificacao = 'reprovado'
-            messages.warning(request, f'Certificação REJEITADA para o produto {certificacao.produto.nome}.')
-        
-        # Registrando o rastro da auditoria (Quem e Quando)
-        certificacao.admin_responsavel = request.user
-        certificacao.data_resposta = datetime.now().date()
-        certificacao.save()
+        with transaction.atomic():
+            # Trava a linha: duas respostas simultâneas não contam a mesma transição duas vezes
+            certificacao = Certificacoes.objects.select_for_update().select_related('produto').get(
+                pk=certificacao.pk
+            )
+            status_anterior = certificacao.status_certificacao
+            
+            if acao == 'aprovar':
+                certificacao.status_certificacao = 'aprovado'
+                messages.success(request, f'Certificação APROVADA para o produto {certificacao.produto.nome}!')
+            elif acao == 'rejeitar':
+                # Usando 'reprovado' conforme seu código anterior
+                certificacao.status_certificacao = 'reprovado'
+                messages.warning(request, f'Certificação REJEITADA para o produto {certificacao.produto.nome}.')
+            
+            # Registrando o rastro da auditoria (Quem e Quando)
+            certificacao.admin_responsavel = request.user
+            certificacao.data_resposta = datetime.now().date()
+            certificacao.save()
+            registrar_transicao('certificacao', status_anterior, certificacao.status_certificacao)
         
     
     return redirect('admin_visualizar_certificacoes')
@@ -1177,11 +1229,13 @@ def enviar_autodeclaracao_multipla(request):
 # VALIDADOR DE CNPJ COM API PÚBLICA
 # ============================================================================
 
-def validar_cnpj_api(request):
+async def validar_cnpj_api(request):
     """
     API endpoint para validar CNPJ usando API pública (ReceitaWS).
     Retorna dados da empresa se CNPJ for válido.
     Endpoint para chamadas AJAX do formulário.
+    View assíncrona: no ASGI, a espera pela ReceitaWS não ocupa uma thread.
+    No WSGI, usa a consulta síncrona (cnpj.consultar_cnpj).
     """
     cnpj = request.GET.get('cnpj', '').strip()
     
@@ -1189,62 +1243,36 @@ def validar_cnpj_api(request):
         return JsonResponse({'valido': False, 'erro': 'CNPJ não fornecido'}, status=400)
     
     # Remove formatação
-    cnpj_numeros = ''.join(filter(str.isdigit, cnpj))
+    cnpj_numeros = normalizar_cnpj(cnpj)
     
     if len(cnpj_numeros) != 14:
         return JsonResponse({'valido': False, 'erro': 'CNPJ deve ter 14 dígitos'}, status=400)
     
+    # Dígitos verificadores conferidos localmente, antes de consultar a API
+    if not cnpj_valido(cnpj_numeros):
+        return JsonResponse({'valido': False, 'erro': 'CNPJ inválido: dígitos verificadores não conferem'}, status=400)
+    
+    # Consulta a Receita Federal (resultado em cache por cnpj.py)
     try:
-        # Consulta API pública da Receita Federal
-        url = f'https://www.receitaws.com.br/v1/cnpj/{cnpj_numeros}'
-        response = requests.get(url, timeout=10)
-        
-        if response.status_code == 200:
-            dados = response.json()
-            
-            # Verifica se houve erro na API
-            if dados.get('status') == 'ERROR':
-                return JsonResponse({
-                    'valido': False,
-                    'erro': f"CNPJ não encontrado ou inválido: {dados.get('message', 'Erro desconhecido')}"
-                })
-            
-            # Sucesso - retorna dados formatados
-            return JsonResponse({
-                'valido': True,
-                'razao_social': dados.get('nome', ''),
-                'nome_fantasia': dados.get('fantasia', ''),
-                'cnpj': dados.get('cnpj', ''),
-                'situacao': dados.get('situacao', ''),
-                'logradouro': dados.get('logradouro', ''),
-                'numero': dados.get('numero', ''),
-                'municipio': dados.get('municipio', ''),
-                'uf': dados.get('uf', ''),
-                'cep': dados.get('cep', ''),
-                'telefone': dados.get('telefone', ''),
-                'email': dados.get('email', ''),
-            })
+        if isinstance(request, ASGIRequest):
+            dados = await aconsultar_cnpj(cnpj_numeros)
         else:
-            return JsonResponse({
-                'valido': False,
-                'erro': f'Erro ao consultar API (Status {response.status_code})'
-            })
-            
-    except requests.exceptions.Timeout:
-        return JsonResponse({
-            'valido': False,
-            'erro': 'Tempo limite excedido - API não respondeu'
-        })
-    except requests.RequestException as e:
+            # WSGI: a view roda num event loop criado e descartado a cada requisição,
+            # então o cliente assíncrono (um por loop) nunca seria reaproveitado.
+            # Usa a sessão síncrona, com pool de conexões compartilhado.
+            dados = await sync_to_async(consultar_cnpj)(cnpj_numeros)
+    except ConsultaCNPJIndisponivel as e:
+        return JsonResponse({'valido': False, 'erro': str(e)})
+    
+    if not dados['encontrado']:
         return JsonResponse({
             'valido': False,
-            'erro': f'Erro de conexão: {str(e)}'
-        })
-    except Exception as e:
-        return JsonResponse({
-            'valido': False,
-            'erro': f'Erro inesperado: {str(e)}'
+            'erro': f"CNPJ não encontrado ou inválido: {dados['erro']}"
         })
+    
+    # Sucesso - retorna dados formatados
+    resposta = {campo: valor for campo, valor in dados.items() if campo != 'encontrado'}
+    return JsonResponse({'valido': True, **resposta})
 
 
 # ============================================================================
@@ -1259,16 +1287,15 @@ def ver_carrinho(request):
         messages.error(request, 'Apenas empresas podem comprar produtos.')
         return redirect('home')
     
-    carrinho, created = Carrinho.objects.get_or_create(usuario=request.user, ativo=True)
-    itens = carrinho.itens.all().select_related('produto')
-    total = carrinho.get_total()
-    quantidade_itens = carrinho.get_quantidade_itens()
+    # Backend de CARRINHO_BACKEND (banco ou sessão, ver carrinho.py)
+    carrinho = obter_carrinho(request)
+    totais = carrinho.totais()
     
     context = {
         'carrinho': carrinho,
-        'itens': itens,
-        'total': total,
-        'quantidade_itens': quantidade_itens,
+        'itens': carrinho.itens(),
+        'total': totais['total'],
+        'quantidade_itens': totais['quantidade_itens'],
     }
     
     return render(request, 'carrinho.html', context)
@@ -1286,22 +1313,19 @@ def adicionar_ao_carrinho(request, produto_id):
     """
     produto = get_object_or_404(Produtos, id_produto=produto_id)
     
-    if produto.status_estoque != 'disponivel':
+    if not produto.a_venda:
         messages.error(request, 'Este produto não está disponível no momento.')
         return redirect('listagem_produtos')
     
     # Segurança: Carrinho sempre associado ao usuário logado
-    carrinho, created = Carrinho.objects.get_or_create(usuario=request.user, ativo=True)
-    
-    item, created = ItemCarrinho.objects.get_or_create(
-        carrinho=carrinho,
-        produto=produto,
-        defaults={'preco_unitario': produto.preco, 'quantidade': 1}
-    )
+    try:
+        _quantidade, created = obter_carrinho(request).adicionar(produto)
+    except QuantidadeIndisponivel as e:
+        # Estoque controlado: o checkout recusaria mais unidades do que existem
+        messages.error(request, str(e))
+        return redirect('ver_carrinho')
     
     if not created:
-        item.quantidade += 1
-        item.save()
         messages.success(request, f'Quantidade de {produto.nome} atualizada no carrinho!')
     else:
         messages.success(request, f'{produto.nome} adicionado ao carrinho!')
@@ -1309,6 +1333,48 @@ def adicionar_ao_carrinho(request, produto_id):
     return redirect('ver_carrinho')
 
 
+@login_required(login_url='login')
+@user_is_empresa
+def carrinho_adicionar_varios(request):
+    """
+    Pedido B2B em lote: POST JSON {"itens": [[produto_id, quantidade], ...]}
+    (ou [{"produto_id": ..., "quantidade": ...}, ...]). Define a quantidade de
+    cada produto no carrinho. Tudo ou nada: com qualquer linha inválida nada é gravado.
+    CSRF pelo cabeçalho X-CSRFToken.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'erro': 'Método não permitido.'}, status=405)
+    try:
+        itens = json.loads(request.body)['itens']
+        if not isinstance(itens, list):
+            raise TypeError('itens deve ser uma lista')
+        pares = [
+            (item['produto_id'], item['quantidade']) if isinstance(item, dict) else item
+            for item in itens
+        ]
+    except (ValueError, KeyError, TypeError):
+        return JsonResponse({'erro': 'Envie {"itens": [[produto_id, quantidade], ...]}.'}, status=400)
+    if not pares:
+        return JsonResponse({'erro': 'Nenhum item enviado.'}, status=400)
+    if len(pares) > MAXIMO_LINHAS_POR_LOTE:
+        return JsonResponse({'erro': f'No máximo {MAXIMO_LINHAS_POR_LOTE} itens por envio.'}, status=400)
+
+    # Disponibilidade e estoque de todas as linhas numa consulta (carrinho.py)
+    linhas, erros = validar_linhas(pares)
+    if erros:
+        return JsonResponse({'erro': 'Itens inválidos.', 'itens_invalidos': erros}, status=400)
+
+    carrinho = obter_carrinho(request)
+    carrinho.definir_quantidades(linhas)
+    totais = carrinho.totais()
+    return JsonResponse({
+        'sucesso': True,
+        'itens_gravados': len(linhas),
+        'total': f"{totais['total']:.2f}",
+        'quantidade_itens': totais['quantidade_itens'],
+    })
+
+
 @login_required(login_url='login')
 @user_is_empresa
 def remover_do_carrinho(request, item_id):
@@ -1317,10 +1383,10 @@ def remover_do_carrinho(request, item_id):
     PROTEÇÃO: @login_required + @user_is_empresa
     IDOR Prevention: Valida que o item pertence ao carrinho do usuário logado.
     """
-    # IDOR Protection: Filtra apenas itens do carrinho do usuário logado
-    item = get_object_or_404(ItemCarrinho, pk=item_id, carrinho__usuario=request.user)
-    produto_nome = item.produto.nome
-    item.delete()
+    # IDOR Protection: o backend só enxerga o carrinho do usuário logado
+    produto_nome = obter_carrinho(request).remover(item_id)
+    if produto_nome is None:
+        raise Http404('Item não encontrado no carrinho')
     
     messages.success(request, f'{produto_nome} removido do carrinho!')
     return redirect('ver_carrinho')
@@ -1335,15 +1401,18 @@ def atualizar_quantidade_carrinho(request, item_id):
         return redirect('home')
     
     if request.method == 'POST':
-        item = get_object_or_404(ItemCarrinho, pk=item_id, carrinho__usuario=request.user)
         nova_quantidade = int(request.POST.get('quantidade', 1))
+        try:
+            encontrado = obter_carrinho(request).atualizar(item_id, nova_quantidade)
+        except QuantidadeIndisponivel as e:
+            messages.error(request, str(e))
+            return redirect('ver_carrinho')
+        if not encontrado:
+            raise Http404('Item não encontrado no carrinho')
         
         if nova_quantidade > 0:
-            item.quantidade = nova_quantidade
-            item.save()
             messages.success(request, 'Quantidade atualizada!')
         else:
-            item.delete()
             messages.success(request, 'Item removido do carrinho!')
     
     return redirect('ver_carrinho')
@@ -1355,17 +1424,11 @@ def atualizar_quantidade_carrinho(request, item_id):
 @user_is_empresa
 def checkout(request):
     """View para página de checkout"""
-    carrinho = get_object_or_404(Carrinho, usuario=request.user, ativo=True)
-    itens = carrinho.itens.all().select_related('produto')
-    
-    if not itens:
-        messages.warning(request, 'Seu carrinho está vazio!')
-        return redirect('home_publica')
-    
-    subtotal = carrinho.get_total()
     frete = 0  # Frete grátis para este exemplo
-    total = subtotal + frete
+    carrinho = obter_carrinho(request)
     
+    # O POST vem antes de buscar o carrinho: o reenvio de um pedido já feito
+    # (carrinho já desativado) é resolvido pela chave de idempotência
     if request.method == 'POST':
         # Validação dos dados de entrega
         endereco = request.POST.get('endereco', '').strip()
@@ -1377,38 +1440,44 @@ def checkout(request):
         if not all([endereco, cidade, estado, cep, telefone]):
             messages.error(request, 'Por favor, preencha todos os campos obrigatórios.')
         else:
-            # Criar pedido
-            pedido = Pedido.objects.create(
-                usuario=request.user,
-                total=total,
-                endereco_entrega=endereco,
-                cidade_entrega=cidade,
-                estado_entrega=estado,
-                cep_entrega=cep,
-                telefone_contato=telefone,
-                metodo_pagamento='cartao_credito',
-                status='pendente',
-                observacoes=request.POST.get('observacoes', '')
-            )
-            
-            # Criar itens do pedido
-            for item in itens:
-                ItemPedido.objects.create(
-                    pedido=pedido,
-                    produto=item.produto,
-                    quantidade=item.quantidade,
-                    preco_unitario=item.preco_unitario,
-                    subtotal=item.get_subtotal()
+            # Carrinho da sessão só vai para o banco agora (carrinho.py)
+            carrinho.persistir()
+            # Pedido, itens e desativação do carrinho numa transação (pedidos.py)
+            try:
+                pedido, _criado = fazer_pedido(
+                    request.user,
+                    request.POST.get('chave_idempotencia', '')[:64],
+                    frete=frete,
+                    endereco_entrega=endereco,
+                    cidade_entrega=cidade,
+                    estado_entrega=estado,
+                    cep_entrega=cep,
+                    telefone_contato=telefone,
+                    metodo_pagamento='cartao_credito',
+                    observacoes=request.POST.get('observacoes', ''),
                 )
-            
-            # Limpar carrinho
-            carrinho.ativo = False
-            carrinho.save()
+            except CarrinhoVazio:
+                messages.warning(request, 'Seu carrinho está vazio!')
+                return redirect('home_publica')
+            except EstoqueInsuficiente as e:
+                messages.error(request, f'{e} Ajuste as quantidades e tente novamente.')
+                return redirect('ver_carrinho')
+            carrinho.esvaziar()
             
             # Redirecionar para sessão de pagamento Stripe
             return redirect('payments:criar_sessao', pedido_id=pedido.pk)
     
+    itens = carrinho.itens()
+    
+    if not itens:
+        messages.warning(request, 'Seu carrinho está vazio!')
+        return redirect('home_publica')
+    
+    subtotal = carrinho.totais()['total']
+    total = subtotal + frete
+    
     context = {
+        'chave_idempotencia': request.POST.get('chave_idempotencia') or uuid.uuid4().hex,
         'carrinho': carrinho,
         'itens': itens,
         'subtotal': subtotal,
@@ -1440,23 +1509,32 @@ def enviar_autodeclaracao_multipla(request):
             messages.error(request, 'Selecione pelo menos um produto.')
             return redirect('enviar_autodeclaracao_multipla')
         
+        if not arquivo1:
+            messages.error(request, 'Envie pelo menos o documento principal.')
+            return redirect('enviar_autodeclaracao_multipla')
+        
         # Criar certificação para cada produto selecionado
+        # (tudo ou nada: certificações e contador de pendentes na mesma transação)
         count = 0
-        for produto_id in produtos_ids:
-            try:
-                produto = Produtos.objects.get(id_produto=produto_id, usuario=request.user)
-                
-                # Criar certificação
-                cert = Certificacoes.objects.create(
-                    produto=produto,
-                    texto_autodeclaracao=texto,
-                    arquivo_autodeclaracao=arquivo1 or arquivo2 or arquivo3,
-                    status_certificacao='pendente',
-                    data_envio=datetime.now().date()
-                )
-                count += 1
-            except Produtos.DoesNotExist:
-                continue
+        with transaction.atomic():
+            for produto_id in produtos_ids:
+                try:
+                    produto = Produtos.objects.get(id_produto=produto_id, usuario=request.user)
+                    
+                    # Criar certificação
+                    cert = Certificacoes.objects.create(
+                        produto=produto,
+                        texto_autodeclaracao=texto,
+                        # O mesmo upload em N certificações: o storage deduplicado grava o arquivo uma vez
+                        documento=arquivo1,
+                        documento_2=arquivo2,
+                        documento_3=arquivo3,
+                        status_certificacao='pendente',
+                        data_envio=datetime.now().date()
+                    )
+                    count += 1
+                except Produtos.DoesNotExist:
+                    continue
         
         if count > 0:
             messages.success(request, f'{count} autodeclaração(ões) enviada(s) com sucesso!')
@@ -1534,7 +1612,10 @@ def config_perfil_empresa(request):
     )
     
     if request.method == 'POST':
+        # O form.is_valid() já copia o CNPJ novo para a instância
+        cnpj_anterior = perfil.cnpj
         form = EditarPerfilEmpresaForm(request.POST, request.FILES, instance=perfil)
+        verificar_depois = False
         
         # DEBUG: Mostrar erros do formulário
         if not form.is_valid():
@@ -1561,10 +1642,12 @@ def config_perfil_empresa(request):
             cnpj = form.cleaned_data.get('cnpj', '')
             
             # Validar CNPJ na API da Receita Federal (sistema rigoroso)
-            if cnpj and cnpj != perfil.cnpj:  # Só valida se mudou o CNPJ
+            if cnpj and cnpj != cnpj_anterior:  # Só valida se mudou o CNPJ
                 resultado_api = _validar_cnpj_api_interno(cnpj)
                 
                 if resultado_api['sucesso']:
+                    perfil.situacao_receita = situacao_do_resultado({'encontrado': True, **resultado_api})
+                    perfil.consulta_receita_em = timezone.now()
                     # Preenche dados automaticamente da Receita Federal
                     perfil.razao_social = resultado_api.get('razao_social', perfil.razao_social)
                     perfil.nome_fantasia = resultado_api.get('nome_fantasia', perfil.nome_fantasia)
@@ -1586,6 +1669,17 @@ def config_perfil_empresa(request):
                         request, 
                         f'CNPJ validado com sucesso! Dados preenchidos automaticamente da Receita Federal.'
                     )
+                elif resultado_api.get('indisponivel') and settings.CNPJ_MODO_DEGRADADO:
+                    # Modo degradado: dígitos verificadores já conferidos; a consulta
+                    # à Receita fica na fila até a API voltar
+                    perfil.situacao_receita = ''
+                    perfil.consulta_receita_em = None
+                    verificar_depois = True
+                    messages.warning(
+                        request,
+                        'A consulta à Receita Federal está indisponível no momento. '
+                        'O CNPJ foi aceito e será verificado automaticamente em breve.'
+                    )
                 else:
                     messages.error(request, f'Erro na validação: {resultado_api.get("erro")}')
                     return render(request, 'empresa_config_perfil.html', {'form': form, 'perfil': perfil})
@@ -1601,6 +1695,14 @@ def config_perfil_empresa(request):
             perfil_atualizado.data_atualizacao = timezone.now()
             perfil_atualizado.save()
             
+            if verificar_depois:
+                agendar_verificacao(perfil_atualizado.pk)
+            
+            # Metadados (tamanho, hash) calculados do próprio upload, para o dashboard não consultar o storage
+            for campo, _rotulo in DOCUMENTOS_EMPRESA:
+                if campo in request.FILES:
+                    registrar_upload(perfil_atualizado, campo, request.FILES[campo])
+            
             # Se todos os documentos foram enviados, marca como pendente de verificação
             if (perfil_atualizado.documento_cnpj and 
                 perfil_atualizado.documento_contrato_social and 
@@ -1623,36 +1725,16 @@ def config_perfil_empresa(request):
             }
         )
     
-    # Verificar se os arquivos existem fisicamente
-    doc_cnpj_existe = False
-    contrato_social_existe = False
-    alvara_existe = False
-    
-    if perfil.documento_cnpj:
-        try:
-            doc_cnpj_existe = perfil.documento_cnpj.storage.exists(perfil.documento_cnpj.name)
-        except Exception:
-            pass
-    
-    if perfil.documento_contrato_social:
-        try:
-            contrato_social_existe = perfil.documento_contrato_social.storage.exists(perfil.documento_contrato_social.name)
-        except Exception:
-            pass
-    
-    if perfil.documento_alvara:
-        try:
-            alvara_existe = perfil.documento_alvara.storage.exists(perfil.documento_alvara.name)
-        except Exception:
-            pass
+    # Situação dos arquivos pelos metadados do banco (sem acessar o storage)
+    situacao = situacao_documentos(perfil)
     
     return render(request, 'empresa_config_perfil.html', {
         'form': form, 
         'perfil': perfil,
         'documentos_completos': bool(perfil.documento_cnpj and perfil.documento_contrato_social and perfil.documento_alvara),
-        'doc_cnpj_existe': doc_cnpj_existe,
-        'contrato_social_existe': contrato_social_existe,
-        'alvara_existe': alvara_existe,
+        'doc_cnpj_existe': situacao['documento_cnpj'],
+        'contrato_social_existe': situacao['documento_contrato_social'],
+        'alvara_existe': situacao['documento_alvara'],
     })
 
 
@@ -1744,10 +1826,14 @@ def detalhe_empresa(request, empresa_id):
         motivo = request.POST.get('motivo', '').strip()
         
         if acao == 'aprovar':
-            empresa.status_verificacao = 'verificado'
-            empresa.data_verificacao = timezone.now()
-            empresa.observacoes_verificacao = ''
-            empresa.save()
+            with transaction.atomic():
+                empresa = EmpresaProdutor.objects.select_for_update().get(pk=empresa.pk)
+                status_anterior = empresa.status_verificacao
+                empresa.status_verificacao = 'verificado'
+                empresa.data_verificacao = timezone.now()
+                empresa.observacoes_verificacao = ''
+                empresa.save()
+                registrar_transicao('empresa', status_anterior, empresa.status_verificacao)
             messages.success(request, f'✅ Empresa {empresa.razao_social} verificada com sucesso!')
             return redirect('lista_empresas_verificadas')
             
@@ -1756,10 +1842,14 @@ def detalhe_empresa(request, empresa_id):
                 messages.error(request, 'Por favor, informe o motivo da reprovação.')
                 return render(request, 'admin_detalhe_empresa.html', {'empresa': empresa})
             
-            empresa.status_verificacao = 'rejeitado'
-            empresa.data_verificacao = timezone.now()
-            empresa.observacoes_verificacao = motivo
-            empresa.save()
+            with transaction.atomic():
+                empresa = EmpresaProdutor.objects.select_for_update().get(pk=empresa.pk)
+                status_anterior = empresa.status_verificacao
+                empresa.status_verificacao = 'rejeitado'
+                empresa.data_verificacao = timezone.now()
+                empresa.observacoes_verificacao = motivo
+                empresa.save()
+                registrar_transicao('empresa', status_anterior, empresa.status_verificacao)
             # TODO: Enviar email para a empresa com o motivo da reprovação
             messages.warning(request, f'❌ Empresa {empresa.razao_social} rejeitada. Motivo: {motivo}')
             return redirect('lista_empresas_rejeitadas')